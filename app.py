@@ -3,17 +3,38 @@ Vehicle Parking Management System - Main Flask Application
 Complete system with Vehicle Counting using Line Crossing Detection
 """
 
-from flask import Flask, render_template, jsonify, request, redirect, url_for, Response, send_from_directory
+from flask import Flask, render_template, jsonify, request, redirect, url_for, Response, send_from_directory, stream_with_context, make_response
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.utils import secure_filename
 from database import db, VehicleCategory, VehicleEntry, VehicleExit, ParkingSlot, ParkingAllocation, SystemConfig, DailyStats
-from detection_service import VehicleDetectionService
+from inference_server import (create_detection_service, AdmissionQueue, MicroBatcher, QueueFullError,
+                              RemoteDetectionService, parse_address)
 from vehicle_counter import VehicleCounter
+from counting_zones import parse_zones
+from counter_state import CounterStateStore
+from camera_registry import CameraRegistry, CameraPipeline, parse_cameras
+from pipeline_workers import ProcessCameraPipeline
+from pipeline_service import PipelineServiceClient
+from inference_scheduler import create_inference_scheduler, lane_limits
+from frame_ring import FrameRing, ring_name
+from log_queries import (LogFilters, filtered_entries_query, filtered_exits_query,
+                         archived_entries_select, archived_exits_select, entries_select, exits_select, split_exit_row,
+                         KeysetPagination, get_log_categories)
+from export_service import EXPORT_FORMATS, stream_export, pa as pyarrow_available
+from stats_cache import dashboard_cache
+from occupancy_forecast import OccupancyForecaster
+from live_updates import live_broker, DatabaseChangeWatcher
+from config_manager import ConfigCache, validate_config_value
+from structured_logging import log_event, setup_logging_from_config, parse_module_levels
+from metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select
+from concurrent.futures import ThreadPoolExecutor
 import os
 from pathlib import Path
 import cv2
+import logging
+import numpy as np
 import threading
 import time
 import uuid
@@ -37,196 +58,320 @@ db.init_app(app)
 # Ensure upload folder exists
 Path(app.config['UPLOAD_FOLDER']).mkdir(exist_ok=True)
 
+# Publishes database-driven live updates (started on first subscriber)
+database_watcher = DatabaseChangeWatcher(app, live_broker, dashboard_cache)
+
+# Hot-reloaded system_config values (started on first use)
+config_cache = ConfigCache(app)
+
+logger = logging.getLogger('app')
+
+# Annotated copies of a multi-image upload are encoded in parallel
+annotation_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='annotate')
+
 # Global variables
-camera_feed = None
+camera_registry = None
 camera_lock = threading.Lock()
 detection_service_global = None
-vehicle_counter_global = None
+inference_backend = None
+upload_queue = None
+inference_lock = threading.Lock()
+occupancy_forecaster = None
+forecast_lock = threading.Lock()
+counter_stores = {}
 
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-class CameraFeed:
-    """Camera feed handler with counting"""
-    
-    def __init__(self, camera_id=0):
-        self.camera_id = camera_id
-        self.camera = None
-        self.is_running = False
-        self.frame = None
-        
-    def start(self):
-        """Start camera capture"""
-        if self.camera is None or not self.camera.isOpened():
-            self.camera = cv2.VideoCapture(self.camera_id)
-            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            self.camera.set(cv2.CAP_PROP_FPS, 30)
-        
-        if self.camera.isOpened():
-            self.is_running = True
-            print("📹 Camera started successfully")
-            return True
-        else:
-            print("❌ Failed to start camera")
-            return False
-    
-    def stop(self):
-        """Stop camera capture"""
-        self.is_running = False
-        if self.camera:
-            self.camera.release()
-            self.camera = None
-        print("📹 Camera stopped")
-    
-    def get_frame(self):
-        """Get current frame from camera"""
-        if self.camera and self.camera.isOpened():
-            success, frame = self.camera.read()
-            if success:
-                self.frame = frame
-                return frame
-        return None
-    
-    def get_frame_with_counting(self, detection_service, vehicle_counter):
-        """Get frame with detection and counting overlay"""
-        frame = self.get_frame()
-        if frame is None:
-            return None
-        
-        try:
-            # Run detection
-            detections = detection_service.detect_vehicles(frame)
-            
-            # Update vehicle counter with detections
-            vehicle_counter.update(detections, frame.shape)
-            
-            # Draw counting visualization
-            frame = vehicle_counter.draw_on_frame(frame)
-            
-            # Add timestamp
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            cv2.putText(frame, timestamp, (10, frame.shape[0] - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            return frame
-            
-        except Exception as e:
-            print(f"❌ Detection/Counting error: {e}")
-            return frame
+def get_config_cache():
+    """Get the config cache, loading it and starting hot reload on first use"""
+    config_cache.start()
+    return config_cache
 
-def get_camera_feed():
-    """Get or create camera feed instance"""
-    global camera_feed
-    if camera_feed is None:
-        camera_feed = CameraFeed(camera_id=0)
-        camera_feed.start()
-    return camera_feed
+def get_pipeline_service_address():
+    """
+    Address of the pipeline service this process should use ('' = run pipelines in-process)
+    
+    Set by the production entry point for its HTTP workers (app.config), or
+    for every process via PIPELINE_SERVICE in system_config.
+    """
+    return app.config.get('PIPELINE_SERVICE') or get_config_cache().get('PIPELINE_SERVICE', '')
 
 def get_detection_service():
     """Get or create detection service instance"""
     global detection_service_global
     if detection_service_global is None:
-        model_path = os.path.join(basedir, 'best.pt')
-        if os.path.exists(model_path):
-            detection_service_global = VehicleDetectionService(model_path, confidence_threshold=0.5)
+        address = get_pipeline_service_address()
+        if address:
+            # HTTP worker: the model lives in the pipeline service
+            detection_service_global = RemoteDetectionService(address)
             detection_service_global.load_model()
-            print("✅ Detection service loaded")
         else:
-            print(f"⚠️  Warning: Model not found at {model_path}")
+            detection_service_global = load_detection_service(get_config_cache())
     return detection_service_global
 
-def get_vehicle_counter():
-    """Get or create vehicle counter instance"""
-    global vehicle_counter_global
-    if vehicle_counter_global is None:
-        # Line at center (0.5), LEFT=OUT, RIGHT=IN
-        vehicle_counter_global = VehicleCounter(
-            line_position=0.5,
-            direction_mapping={'LEFT': 'OUT', 'RIGHT': 'IN'}
-        )
-        print("✅ Vehicle counter initialized")
-    return vehicle_counter_global
-
-def generate_frames():
-    """Generate frames for video streaming with counting"""
-    camera = get_camera_feed()
-    detection_service = get_detection_service()
-    vehicle_counter = get_vehicle_counter()
+def load_detection_service(config):
+    """Load the model in-process (or connect to INFERENCE_SERVER), following DETECTION_CONFIDENCE"""
+    model_path = os.path.join(basedir, 'best.pt')
+    if not (config.get('INFERENCE_SERVER', '') or os.path.exists(model_path)):
+        print(f"⚠️  Warning: Model not found at {model_path}")
+        return None
     
-    while True:
+    detection_service = create_detection_service(model_path, config)
+    detection_service.load_model()
+    config.subscribe(
+        lambda key, old, new: setattr(detection_service, 'confidence_threshold',
+                                      config.get_float(key, 0.5)),
+        keys=['DETECTION_CONFIDENCE']
+    )
+    print("✅ Detection service loaded")
+    return detection_service
+
+def create_inference_backend(detection_service):
+    """
+    Shared inference queue for camera frames and uploaded images
+    
+    A local model is fed through a MicroBatcher, so frames from several
+    cameras and uploads share batched inference calls instead of racing on
+    the model; the inference server already batches, so remote services
+    take requests directly.
+    
+    Returns:
+        MicroBatcher, RemoteDetectionService or None without a model
+    """
+    if detection_service is None:
+        return None
+    if isinstance(detection_service, RemoteDetectionService):
+        return detection_service
+    
+    batcher = MicroBatcher(detection_service)
+    batcher.start()
+    return batcher
+
+def get_inference_backend():
+    """Get or create this process's shared inference queue"""
+    global inference_backend
+    with inference_lock:
+        if inference_backend is None:
+            inference_backend = create_inference_backend(get_detection_service())
+    return inference_backend
+
+def create_frame_detector(backend):
+    """Detection function shared by all camera pipelines (frames are skipped while the queue is full)"""
+    if backend is None:
+        return None
+    if isinstance(backend, RemoteDetectionService):
+        return backend.detect_vehicles
+    
+    def detect(frame):
         try:
-            if detection_service and vehicle_counter:
-                frame = camera.get_frame_with_counting(detection_service, vehicle_counter)
-            else:
-                frame = camera.get_frame()
-            
-            if frame is None:
-                time.sleep(0.1)
-                continue
-            
-            # Encode frame to JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                continue
-            
-            frame_bytes = buffer.tobytes()
+            return backend.detect(frame, timeout=30)
+        except QueueFullError:
+            return []
+    return detect
+
+def get_upload_queue():
+    """Get or create the admission-controlled queue for uploaded images (None without a model)"""
+    global upload_queue
+    backend = get_inference_backend()
+    if backend is None:
+        return None
+    with inference_lock:
+        if upload_queue is None:
+            config = get_config_cache()
+            upload_queue = AdmissionQueue(backend, max_pending=config.get_int('DETECTION_QUEUE_SIZE', 16))
+            config.subscribe(
+                lambda key, old, new: setattr(upload_queue, 'max_pending', config.get_int(key, 16)),
+                keys=['DETECTION_QUEUE_SIZE']
+            )
+    return upload_queue
+
+def get_occupancy_forecaster():
+    """Get or create the occupancy forecaster, following FORECAST_HALF_LIFE_WEEKS and FORECAST_REFRESH_SECONDS"""
+    global occupancy_forecaster
+    with forecast_lock:
+        if occupancy_forecaster is None:
+            config = get_config_cache()
+            occupancy_forecaster = OccupancyForecaster()
             
-            # Yield frame in multipart format
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            def apply_settings(key=None, old=None, new=None):
+                occupancy_forecaster.half_life_weeks = config.get_float('FORECAST_HALF_LIFE_WEEKS', 8.0)
+                occupancy_forecaster.refresh_interval = config.get_float('FORECAST_REFRESH_SECONDS', 300.0)
+                occupancy_forecaster.cached_key = None
             
-            time.sleep(0.03)  # ~30 FPS
+            apply_settings()
+            config.subscribe(apply_settings, keys=['FORECAST_HALF_LIFE_WEEKS', 'FORECAST_REFRESH_SECONDS'])
+    return occupancy_forecaster
+
+def get_occupancy_forecast():
+    """
+    Get the occupancy forecast, never failing the caller
+
+    Returns:
+        dict: Forecast, or {'available': False, 'reason': ...} when it cannot be built
+    """
+    try:
+        return get_occupancy_forecaster().forecast()
+    except Exception as e:
+        db.session.rollback()
+        log_event(logger, logging.ERROR, 'forecast.failed', f"❌ Occupancy forecast failed: {e}",
+                  rate_limit=300)
+        return {'available': False, 'reason': f'Forecast unavailable: {e}'}
+
+def load_counting_zones(config):
+    """Parse COUNTING_ZONES (None = default centre line)"""
+    try:
+        return parse_zones(config.get('COUNTING_ZONES', '')) or None
+    except ValueError as e:
+        log_event(logger, logging.ERROR, 'counter.invalid_zones', f"❌ Invalid COUNTING_ZONES: {e}")
+        return None
+
+def create_vehicle_counter(camera):
+    """Create a camera's counter, restore its counts and follow zone edits"""
+    config = get_config_cache()
+    
+    # Line at center (0.5), LEFT=OUT, RIGHT=IN, unless lines/zones are configured
+    vehicle_counter = VehicleCounter(
+        line_position=camera['line_position'],
+        direction_mapping={'LEFT': 'OUT', 'RIGHT': 'IN'},
+        camera_id=camera['id'],
+        zones=camera['zones'] or load_counting_zones(config)
+    )
+    start_counter_persistence(vehicle_counter, config)
+    
+    # Cameras with their own zones in CAMERAS ignore COUNTING_ZONES
+    if not camera['zones']:
+        config.subscribe(
+            lambda key, old, new: vehicle_counter.set_zones(load_counting_zones(config)),
+            keys=['COUNTING_ZONES']
+        )
+    print(f"✅ Vehicle counter initialized for {camera['id']}")
+    return vehicle_counter
+
+def start_counter_persistence(vehicle_counter, config):
+    """Restore the counter's counts from the database and keep logging its events"""
+    try:
+        store = CounterStateStore(
+            app, vehicle_counter,
+            flush_interval=config.get_float('COUNTER_FLUSH_INTERVAL', 1.0),
+            checkpoint_interval=config.get_float('COUNTER_CHECKPOINT_INTERVAL', 30.0)
+        )
+        store.start()
+        counter_stores[vehicle_counter.camera_id] = store
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'counter.persistence_failed',
+                  f"❌ Counter persistence unavailable, counts will not survive a restart: {e}",
+                  camera=vehicle_counter.camera_id)
+
+def create_camera_registry(config, detect):
+    """
+    Build this site's camera pipelines (not started)
+    
+    Args:
+        config: ConfigCache
+        detect: Shared detection function for thread pipelines (see create_frame_detector)
+    
+    Returns:
+        CameraRegistry
+    """
+    try:
+        cameras = parse_cameras(config.get('CAMERAS', ''))
+    except ValueError as e:
+        log_event(logger, logging.ERROR, 'camera.invalid_cameras', f"❌ Invalid CAMERAS: {e}")
+        cameras = parse_cameras('')
+    
+    if (config.get('PIPELINE_MODE', 'thread') or 'thread') == 'process':
+        # Each camera runs (and loads its own counter/model) in a worker process
+        model_path = os.path.join(basedir, 'best.pt')
+        pipelines = [ProcessCameraPipeline(camera, model_path) for camera in cameras]
+    else:
+        # Cameras share one model, so they share its INFERENCE_BUDGET_FPS by activity
+        scheduler = create_inference_scheduler(config)
+        pipelines = [
+            CameraPipeline(
+                camera['id'], camera['source'], create_vehicle_counter(camera), detect=detect,
+                stall_timeout=config.get_float('CAMERA_STALL_TIMEOUT', 5.0),
+                max_backoff=config.get_float('CAMERA_RECONNECT_MAX_BACKOFF', 30.0),
+                frame_ring=(FrameRing(ring_name(camera['id']), create=True)
+                            if camera['share_frames'] else None),
+                lane=scheduler.add_lane(camera['id'], *lane_limits(config, camera))
+            )
+            for camera in cameras
+        ]
+    return CameraRegistry(pipelines)
+
+def get_camera_registry():
+    """Get or create the camera pipelines (started on first use)"""
+    global camera_registry
+    with camera_lock:
+        if camera_registry is None:
+            config = get_config_cache()
+            address = get_pipeline_service_address()
+            if address:
+                # HTTP worker: cameras and counters live in the pipeline service
+                camera_registry = PipelineServiceClient(address).create_registry()
+                description = f"via pipeline service {address}"
+            else:
+                camera_registry = create_camera_registry(config, create_frame_detector(get_inference_backend()))
+                description = config.get('PIPELINE_MODE', 'thread') or 'thread'
             
-        except Exception as e:
-            print(f"❌ Frame generation error: {e}")
-            time.sleep(0.1)
+            camera_registry.add_listener(publish_vehicle_counts)
+            camera_registry.start()
+            print(f"📹 Camera pipelines started ({description}): {', '.join(camera_registry.camera_ids())}")
+    return camera_registry
+
+def get_vehicle_counter(camera_id=None):
+    """Get a camera's vehicle counter (default camera if camera_id is None)"""
+    pipeline = get_camera_registry().get(camera_id)
+    return pipeline.counter if pipeline else None
+
+def publish_vehicle_counts(camera_id=None, event=None):
+    """Push site-wide and per-camera counts to live subscribers"""
+    if camera_registry is None:
+        return
+    live_broker.publish('vehicle_counts', camera_registry.site.get_counts())
+    for pipeline_id in ([camera_id] if camera_id else camera_registry.camera_ids()):
+        live_broker.publish(f'vehicle_counts/{pipeline_id}', camera_registry.get(pipeline_id).get_counts())
+
+def generate_frames(pipeline):
+    """Generate MJPEG parts from a camera pipeline (frames are encoded once for all viewers)"""
+    seq = 0
+    while True:
+        seq, frame_bytes = pipeline.wait_for_jpeg(seq, timeout=1.0)
+        if frame_bytes is None:
+            continue
+        
+        # Yield frame in multipart format
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
 # ==================== WEB ROUTES ====================
 
 @app.route('/')
 def dashboard():
     """Main dashboard"""
-    parking = ParkingSlot.query.first()
-    today = date.today()
-    
-    # Count entries by category for today
-    entries_today = db.session.query(
-        VehicleEntry.display_category,
-        func.count(VehicleEntry.id).label('count')
-    ).filter(
-        func.date(VehicleEntry.entry_datetime) == today
-    ).group_by(VehicleEntry.display_category).all()
-    
-    entries_by_category = {cat: count for cat, count in entries_today}
-    
-    # Count currently IN vehicles by category
-    currently_in = db.session.query(
-        VehicleEntry.display_category,
-        func.count(VehicleEntry.id).label('count')
-    ).filter(
-        VehicleEntry.status == 'IN'
-    ).group_by(VehicleEntry.display_category).all()
-    
-    currently_in_by_category = {cat: count for cat, count in currently_in}
-    
-    # Get recent entries
-    recent_entries = VehicleEntry.query.order_by(
-        VehicleEntry.entry_datetime.desc()
-    ).limit(10).all()
-    
-    return render_template('dashboard.html',
-                         parking=parking,
-                         entries_by_category=entries_by_category,
-                         currently_in_by_category=currently_in_by_category,
-                         recent_entries=recent_entries,
-                         today=today)
+    snapshot = dashboard_cache.get()
+    
+    response = make_response(render_template('dashboard.html',
+                         parking=snapshot.parking,
+                         entries_by_category=snapshot.entries_by_category,
+                         currently_in_by_category=snapshot.currently_in_by_category,
+                         recent_entries=snapshot.recent_entries,
+                         today=snapshot.today))
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/video_feed')
-def video_feed():
-    """Video streaming route for live feed with counting"""
-    return Response(generate_frames(),
+@app.route('/video_feed/<camera_id>')
+def video_feed(camera_id=None):
+    """Video streaming route for live feed with counting (default camera without an ID)"""
+    pipeline = get_camera_registry().get(camera_id)
+    if pipeline is None:
+        return jsonify({'success': False, 'message': f'Unknown camera: {camera_id}'}), 404
+    
+    return Response(generate_frames(pipeline),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/entries')
@@ -234,87 +379,92 @@ def entries():
     """Vehicle entries log"""
     page = request.args.get('page', 1, type=int)
     per_page = 50
-    
-    category_filter = request.args.get('category', '')
-    status_filter = request.args.get('status', '')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    
-    query = VehicleEntry.query
-    
-    if category_filter:
-        query = query.filter(VehicleEntry.display_category == category_filter)
-    
-    if status_filter:
-        query = query.filter(VehicleEntry.status == status_filter)
-    
-    if date_from:
-        date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-        query = query.filter(VehicleEntry.entry_datetime >= date_from_obj)
-    
-    if date_to:
-        date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-        query = query.filter(VehicleEntry.entry_datetime < date_to_obj)
-    
-    pagination = query.order_by(VehicleEntry.entry_datetime.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    categories = db.session.query(VehicleEntry.display_category).distinct().all()
-    categories = [c[0] for c in categories]
+    after = request.args.get('after')
+    before = request.args.get('before')
+    
+    filters = LogFilters.from_args(request.args)
+    
+    # Date ranges reaching into archived months also read those partitions
+    archived = archived_entries_select(filters)
+    if archived is None:
+        query = filtered_entries_query(filters)
+        datetime_column, id_column = VehicleEntry.entry_datetime, VehicleEntry.id
+    else:
+        query = archived
+        datetime_column, id_column = archived.selected_columns.entry_datetime, archived.selected_columns.id
+    
+    try:
+        pagination = KeysetPagination(
+            query, datetime_column, id_column,
+            key_func=lambda entry: (entry.entry_datetime, entry.id),
+            per_page=per_page, after=after, before=before, page=page
+        )
+    except ValueError:
+        return redirect(url_for('entries', **filters.as_dict()))
     
     return render_template('entries.html',
                          entries=pagination.items,
                          pagination=pagination,
-                         categories=categories,
-                         filters={
-                             'category': category_filter,
-                             'status': status_filter,
-                             'date_from': date_from,
-                             'date_to': date_to
-                         })
+                         categories=get_log_categories(),
+                         filters=filters.as_dict())
 
 @app.route('/exits')
 def exits():
     """Vehicle exits log"""
     page = request.args.get('page', 1, type=int)
     per_page = 50
+    after = request.args.get('after')
+    before = request.args.get('before')
+    
+    filters = LogFilters.from_args(request.args)
+    
+    archived = archived_exits_select(filters)
+    if archived is None:
+        query = filtered_exits_query(filters)
+        datetime_column, id_column = VehicleExit.exit_datetime, VehicleExit.id
+        row_factory = None
+    else:
+        query = archived
+        datetime_column, id_column = archived.selected_columns.exit_datetime, archived.selected_columns.id
+        row_factory = split_exit_row
+    
+    try:
+        pagination = KeysetPagination(
+            query, datetime_column, id_column,
+            key_func=lambda item: (item[0].exit_datetime, item[0].id),
+            per_page=per_page, after=after, before=before, row_factory=row_factory, page=page
+        )
+    except ValueError:
+        return redirect(url_for('exits', **filters.as_dict(include_status=False)))
     
-    category_filter = request.args.get('category', '')
-    date_from = request.args.get('date_from', '')
-    date_to = request.args.get('date_to', '')
-    
-    query = db.session.query(VehicleExit, VehicleEntry).join(
-        VehicleEntry, VehicleExit.entry_id == VehicleEntry.id
-    )
+    return render_template('exits.html',
+                         exits=pagination.items,
+                         pagination=pagination,
+                         categories=get_log_categories(),
+                         filters=filters.as_dict(include_status=False))
+
+@app.route('/export/<log_type>')
+def export_logs(log_type):
+    """Stream the entry or exit log as CSV or Parquet (same filters as the log views)"""
+    if log_type not in ('entries', 'exits'):
+        return jsonify({'success': False, 'message': 'Unknown log type'}), 404
     
-    if category_filter:
-        query = query.filter(VehicleEntry.display_category == category_filter)
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Invalid export format'}), 400
     
-    if date_from:
-        date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-        query = query.filter(VehicleExit.exit_datetime >= date_from_obj)
+    if export_format == 'parquet' and pyarrow_available is None:
+        return jsonify({'success': False, 'message': 'Parquet export requires pyarrow'}), 400
     
-    if date_to:
-        date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-        query = query.filter(VehicleExit.exit_datetime < date_to_obj)
+    filters = LogFilters.from_args(request.args)
+    if log_type == 'exits':
+        filters.status = ''
     
-    pagination = query.order_by(VehicleExit.exit_datetime.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    filename = f"{log_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
     
-    categories = db.session.query(VehicleEntry.display_category).distinct().all()
-    categories = [c[0] for c in categories]
-    
-    return render_template('exits.html',
-                         exits=pagination.items,
-                         pagination=pagination,
-                         categories=categories,
-                         filters={
-                             'category': category_filter,
-                             'date_from': date_from,
-                             'date_to': date_to
-                         })
+    return Response(stream_with_context(stream_export(log_type, filters, export_format)),
+                    mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 @app.route('/parking')
 def parking():
@@ -346,45 +496,46 @@ def analytics():
     end_date = date.today()
     start_date = end_date - timedelta(days=days)
     
-    daily_entries = db.session.query(
-        func.date(VehicleEntry.entry_datetime).label('date'),
-        VehicleEntry.display_category,
-        func.count(VehicleEntry.id).label('count')
-    ).filter(
-        func.date(VehicleEntry.entry_datetime) >= start_date
+    # Same partition-aware selects as the log views, so archived months still count
+    filters = LogFilters(date_from=start_date.isoformat())
+    entries = entries_select(filters).subquery()
+    exits = exits_select(filters).subquery()
+    entry_date = func.date(entries.c.entry_datetime)
+    
+    daily_entries = db.session.execute(select(
+        entry_date.label('date'),
+        entries.c.display_category,
+        func.count().label('count')
     ).group_by(
-        func.date(VehicleEntry.entry_datetime),
-        VehicleEntry.display_category
-    ).all()
+        entry_date,
+        entries.c.display_category
+    )).all()
     
-    category_distribution = db.session.query(
-        VehicleEntry.display_category,
-        func.count(VehicleEntry.id).label('count')
-    ).filter(
-        func.date(VehicleEntry.entry_datetime) >= start_date
-    ).group_by(VehicleEntry.display_category).all()
+    category_distribution = db.session.execute(select(
+        entries.c.display_category,
+        func.count().label('count')
+    ).group_by(entries.c.display_category)).all()
     
-    peak_hours = db.session.query(
-        func.strftime('%H', VehicleEntry.entry_datetime).label('hour'),
-        func.count(VehicleEntry.id).label('count')
-    ).filter(
-        func.date(VehicleEntry.entry_datetime) >= start_date
-    ).group_by('hour').all()
+    peak_hours = db.session.execute(select(
+        func.strftime('%H', entries.c.entry_datetime).label('hour'),
+        func.count().label('count')
+    ).group_by('hour')).all()
     
-    avg_duration = db.session.query(
-        VehicleExit.duration_minutes
-    ).filter(
-        func.date(VehicleExit.exit_datetime) >= start_date,
-        VehicleExit.duration_minutes.isnot(None)
-    ).all()
+    avg_duration_minutes = db.session.execute(select(
+        func.avg(exits.c.duration_minutes)
+    ).where(
+        exits.c.duration_minutes.isnot(None)
+    )).scalar() or 0
     
-    avg_duration_minutes = sum([d[0] for d in avg_duration]) / len(avg_duration) if avg_duration else 0
+    # Next day's hourly occupancy and time-to-full (cached until new rows or the next hour)
+    forecast = get_occupancy_forecast()
     
     return render_template('analytics.html',
                          daily_entries=daily_entries,
                          category_distribution=category_distribution,
                          peak_hours=peak_hours,
                          avg_duration_minutes=avg_duration_minutes,
+                         forecast=forecast,
                          days=days,
                          start_date=start_date,
                          end_date=end_date)
@@ -422,105 +573,264 @@ def update_parking_capacity():
         'message': 'Invalid capacity value'
     }), 400
 
+def validate_structured_config(key, value):
+    """
+    Parse JSON, address and per-module level settings the way their consumers will
+    
+    Raises:
+        ValueError: If the value would be rejected (or silently ignored) by its consumer
+    """
+    if key == 'COUNTING_ZONES':
+        parse_zones(value)
+    elif key == 'CAMERAS':
+        parse_cameras(value)
+    elif key in ('INFERENCE_SERVER', 'PIPELINE_SERVICE') and value:
+        try:
+            parse_address(value)
+        except ValueError:
+            raise ValueError(f"{key} must be 'host:port' or 'unix:/path/to.sock'")
+    elif key == 'LOG_LEVELS':
+        items = [item for item in value.split(',') if item.strip()]
+        if len(parse_module_levels(value)) != len(items):
+            raise ValueError("LOG_LEVELS must be 'module=LEVEL,...' with valid level names")
+
+@app.route('/settings/update_config', methods=['POST'])
+def update_config():
+    """Update a system config value (applied live by running services)"""
+    key = request.form.get('key', '').strip()
+    value = request.form.get('value', '').strip()
+    
+    if not key or not SystemConfig.query.filter_by(config_key=key).first():
+        return jsonify({
+            'success': False,
+            'message': 'Unknown config key'
+        }), 400
+    
+    # Running services parse these values on reload, so bad input is rejected before it is stored
+    config = get_config_cache()
+    try:
+        value = validate_config_value(key, value, config.values)
+        validate_structured_config(key, value)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    config.set(key, value)
+    
+    return jsonify({
+        'success': True,
+        'message': f'{key} updated to {value}'
+    })
+
 # ==================== API ENDPOINTS ====================
 
 @app.route('/api/vehicle-counts')
 def api_vehicle_counts():
-    """Get current vehicle counts from counter"""
-    vehicle_counter = get_vehicle_counter()
+    """Get site-wide vehicle counts (all cameras)"""
+    registry = get_camera_registry()
+    counts = registry.site.get_counts()
     
-    if vehicle_counter:
-        counts = vehicle_counter.get_counts()
-        
-        # Get parking info
-        parking = ParkingSlot.query.first()
-        total_capacity = parking.total_capacity if parking else 100
-        
-        parking_info = vehicle_counter.get_parking_availability(total_capacity)
-        
-        return jsonify({
-            'success': True,
-            'counts': counts,
-            'parking': parking_info
-        })
+    # Get parking info
+    parking = ParkingSlot.query.first()
+    total_capacity = parking.total_capacity if parking else 100
+    
+    parking_info = registry.site.get_parking_availability(total_capacity)
     
-    return jsonify({'success': False, 'message': 'Counter not available'}), 500
+    return jsonify({
+        'success': True,
+        'counts': counts,
+        'parking': parking_info
+    })
 
-@app.route('/api/reset-counts', methods=['POST'])
-def api_reset_counts():
-    """Reset vehicle counts"""
-    vehicle_counter = get_vehicle_counter()
+@app.route('/api/vehicle-counts/<camera_id>')
+def api_camera_vehicle_counts(camera_id):
+    """Get current vehicle counts from one camera's counter"""
+    pipeline = get_camera_registry().get(camera_id)
     
-    if vehicle_counter:
-        vehicle_counter.reset_counts()
-        return jsonify({'success': True, 'message': 'Counts reset successfully'})
+    if pipeline is None:
+        return jsonify({'success': False, 'message': f'Unknown camera: {camera_id}'}), 404
+    
+    parking = ParkingSlot.query.first()
+    total_capacity = parking.total_capacity if parking else 100
     
-    return jsonify({'success': False, 'message': 'Counter not available'}), 500
+    return jsonify({
+        'success': True,
+        'camera_id': camera_id,
+        'counts': pipeline.get_counts(),
+        'parking': pipeline.get_parking_availability(total_capacity),
+        'health': pipeline.get_health()
+    })
 
-@app.route('/api/detect-image', methods=['POST'])
-def detect_image():
-    """Detect vehicles in uploaded image"""
-    if 'image' not in request.files:
-        return jsonify({'success': False, 'message': 'No image provided'}), 400
+@app.route('/api/cameras')
+def api_cameras():
+    """List configured cameras with their health"""
+    registry = get_camera_registry()
+    return jsonify({
+        'success': True,
+        'default_camera': registry.default_camera_id,
+        'cameras': registry.get_health()
+    })
+
+@app.route('/api/live')
+def api_live():
+    """Server-sent events with counts, parking status and latest entries"""
+    database_watcher.start()
+    get_camera_registry()
+    publish_vehicle_counts()
     
-    file = request.files['image']
+    return Response(live_broker.stream(),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: per-stage latencies and pipeline counters"""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/reset-counts', methods=['POST'])
+@app.route('/api/reset-counts/<camera_id>', methods=['POST'])
+def api_reset_counts(camera_id=None):
+    """Reset vehicle counts (every camera without an ID)"""
+    registry = get_camera_registry()
+    
+    if camera_id is None:
+        for pipeline_id in registry.camera_ids():
+            registry.get(pipeline_id).reset_counts()
+        return jsonify({'success': True, 'message': 'Counts reset successfully'})
     
-    if file.filename == '':
-        return jsonify({'success': False, 'message': 'No image selected'}), 400
+    pipeline = registry.get(camera_id)
+    if pipeline is None:
+        return jsonify({'success': False, 'message': f'Unknown camera: {camera_id}'}), 404
     
-    if file and allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
-        try:
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4()}_{filename}"
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(filepath)
-            
-            detection_service = get_detection_service()
-            if not detection_service:
-                return jsonify({'success': False, 'message': 'Detection service not available'}), 500
-            
-            image = cv2.imread(filepath)
+    pipeline.reset_counts()
+    return jsonify({'success': True, 'message': f'Counts reset for {camera_id}'})
+
+def decode_upload(file):
+    """Decode an uploaded image from the request stream in memory (None if unreadable)"""
+    data = np.frombuffer(file.stream.read(), dtype=np.uint8)
+    if data.size == 0:
+        return None
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+def detect_uploads(files, queue):
+    """
+    Detect vehicles in uploaded images
+    
+    Images are decoded in memory and detected through the shared inference
+    queue in one go (so a batch shares inference calls); annotated copies
+    are written in the background.
+    
+    Args:
+        files: Uploaded FileStorage objects
+        queue: AdmissionQueue with slots reserved for the files
+    
+    Returns:
+        list: One result dict per file
+    """
+    results = []
+    images = []
+    for file in files:
+        result = {'filename': file.filename}
+        image = None
+        if not allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
+            result.update(success=False, message='Invalid file type')
+        else:
+            image = decode_upload(file)
             if image is None:
-                return jsonify({'success': False, 'message': 'Failed to read image'}), 400
-            
-            detections = detection_service.detect_vehicles(image)
+                result.update(success=False, message='Failed to read image')
+        results.append(result)
+        images.append(image)
+    
+    readable = [index for index, image in enumerate(images) if image is not None]
+    all_detections = queue.detect([images[index] for index in readable])
+    
+    detection_service = get_detection_service()
+    writes = []
+    for index, detections in zip(readable, all_detections):
+        name = Path(secure_filename(files[index].filename)).stem
+        annotated_filename = f"annotated_{uuid.uuid4()}_{name}.jpg"
+        writes.append((index, annotated_filename, annotation_writer.submit(
+            detection_service.save_detection_image, images[index], detections,
+            filepath=os.path.join(app.config['UPLOAD_FOLDER'], annotated_filename))))
+        results[index].update(
+            success=True,
+            detections=detections,
+            total_detections=len(detections)
+        )
+    
+    # URLs are only handed out for files already on disk, so any worker can serve them
+    for index, annotated_filename, write in writes:
+        results[index]['annotated_image_url'] = f'/uploads/{annotated_filename}' if write.result() else None
+    return results
+
+def queue_full_response():
+    """429 response telling the client to retry"""
+    return jsonify({'success': False, 'message': 'Detection queue is full, retry shortly'}), 429, {'Retry-After': '1'}
+
+@app.route('/api/detect-image', methods=['POST'])
+def detect_image():
+    """Detect vehicles in uploaded image"""
+    queue = get_upload_queue()
+    if queue is None:
+        return jsonify({'success': False, 'message': 'Detection service not available'}), 500
+    
+    try:
+        # Admit before reading the body, so a saturated server sheds bursts cheaply
+        with queue.reserve(1):
+            if 'image' not in request.files:
+                return jsonify({'success': False, 'message': 'No image provided'}), 400
             
-            if len(detections) > 0:
-                colors = {
-                    'Bus': (0, 255, 255),
-                    'Car': (0, 255, 0),
-                    '2-Wheeler': (255, 0, 0),
-                    'Truck': (0, 165, 255)
-                }
-                
-                for det in detections:
-                    bbox = det['bbox']
-                    x1, y1, x2, y2 = map(int, bbox)
-                    category = det['display_category']
-                    confidence = det['confidence']
-                    color = colors.get(category, (255, 255, 255))
-                    
-                    cv2.rectangle(image, (x1, y1), (x2, y2), color, 3)
-                    label = f"{category} {confidence:.2f}"
-                    cv2.putText(image, label, (x1, y1 - 10),
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+            file = request.files['image']
             
-            annotated_filename = f"annotated_{unique_filename}"
-            annotated_filepath = os.path.join(app.config['UPLOAD_FOLDER'], annotated_filename)
-            cv2.imwrite(annotated_filepath, image)
+            if file.filename == '':
+                return jsonify({'success': False, 'message': 'No image selected'}), 400
             
-            return jsonify({
-                'success': True,
-                'detections': detections,
-                'total_detections': len(detections),
-                'annotated_image_url': f'/uploads/{annotated_filename}'
-            })
+            result = detect_uploads([file], queue)[0]
+            if not result['success']:
+                return jsonify({'success': False, 'message': result['message']}), 400
             
-        except Exception as e:
-            print(f"Error detecting image: {e}")
-            return jsonify({'success': False, 'message': str(e)}), 500
+            return jsonify(result)
+    
+    except QueueFullError:
+        return queue_full_response()
+    except Exception as e:
+        print(f"Error detecting image: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/detect-images', methods=['POST'])
+def detect_images():
+    """Detect vehicles in several uploaded images ('images' form field) in one request"""
+    queue = get_upload_queue()
+    if queue is None:
+        return jsonify({'success': False, 'message': 'Detection service not available'}), 500
+    if queue.pending >= queue.max_pending:
+        return queue_full_response()
+    
+    files = [file for file in request.files.getlist('images') if file.filename]
+    if not files:
+        return jsonify({'success': False, 'message': 'No images provided'}), 400
+    if len(files) > queue.max_pending:
+        return jsonify({'success': False,
+                        'message': f'Too many images (at most {queue.max_pending} per request)'}), 413
+    
+    try:
+        with queue.reserve(len(files)):
+            results = detect_uploads(files, queue)
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'total_images': len(results),
+            'total_detections': sum(result.get('total_detections', 0) for result in results)
+        })
     
-    return jsonify({'success': False, 'message': 'Invalid file type'}), 400
+    except QueueFullError:
+        return queue_full_response()
+    except Exception as e:
+        print(f"Error detecting images: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/detect-video', methods=['POST'])
 def detect_video():
@@ -558,13 +868,6 @@ def detect_video():
             frames_processed = 0
             frame_skip = 5
             
-            colors = {
-                'Bus': (0, 255, 255),
-                'Car': (0, 255, 0),
-                '2-Wheeler': (255, 0, 0),
-                'Truck': (0, 165, 255)
-            }
-            
             while cap.isOpened():
                 ret, frame = cap.read()
                 if not ret:
@@ -575,18 +878,7 @@ def detect_video():
                 if frames_processed % frame_skip == 0:
                     detections = detection_service.detect_vehicles(frame)
                     all_detections.extend(detections)
-                    
-                    for det in detections:
-                        bbox = det['bbox']
-                        x1, y1, x2, y2 = map(int, bbox)
-                        category = det['display_category']
-                        confidence = det['confidence']
-                        color = colors.get(category, (255, 255, 255))
-                        
-                        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                        label = f"{category} {confidence:.2f}"
-                        cv2.putText(frame, label, (x1, y1 - 10),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                    frame = detection_service.annotate_detections(frame, detections)
                 
                 out.write(frame)
             
@@ -644,37 +936,36 @@ def api_latest_entries():
         'confidence': entry.detection_confidence
     } for entry in entries])
 
+@app.route('/api/occupancy-forecast')
+def api_occupancy_forecast():
+    """Get the hourly occupancy forecast and time-to-full for the next day"""
+    return jsonify(get_occupancy_forecast())
+
 @app.route('/api/stats')
 def api_stats():
-    """Get dashboard statistics"""
-    today = date.today()
-    
-    total_entries_today = VehicleEntry.query.filter(
-        func.date(VehicleEntry.entry_datetime) == today
-    ).count()
-    
-    total_exits_today = VehicleExit.query.filter(
-        func.date(VehicleExit.exit_datetime) == today
-    ).count()
-    
-    currently_in = VehicleEntry.query.filter(
-        VehicleEntry.status == 'IN'
-    ).count()
-    
-    parking = ParkingSlot.query.first()
+    """Get dashboard statistics (supports If-None-Match for cheap polling)"""
+    snapshot = dashboard_cache.get()
+    
+    if snapshot.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        parking = snapshot.parking
+        response = jsonify({
+            'today': {
+                'total_entries': snapshot.total_entries_today,
+                'total_exits': snapshot.total_exits_today,
+                'currently_in': snapshot.currently_in
+            },
+            'parking': {
+                'total_capacity': parking.total_capacity if parking else 0,
+                'occupied_count': parking.occupied_count if parking else 0,
+                'available_count': parking.available_count if parking else 0
+            }
+        })
     
-    return jsonify({
-        'today': {
-            'total_entries': total_entries_today,
-            'total_exits': total_exits_today,
-            'currently_in': currently_in
-        },
-        'parking': {
-            'total_capacity': parking.total_capacity if parking else 0,
-            'occupied_count': parking.occupied_count if parking else 0,
-            'available_count': parking.available_count if parking else 0
-        }
-    })
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response
 
 # ==================== ERROR HANDLERS ====================
 
@@ -705,4 +996,6 @@ if __name__ == '__main__':
     print("\n⚠️  Press CTRL+C to stop the server")
     print("=" * 70 + "\n")
     
+    setup_logging_from_config(get_config_cache())
+    
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
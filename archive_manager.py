@@ -0,0 +1,294 @@
+"""
+Archive Manager
+Moves old entry/exit log rows into monthly archive partitions
+"""
+
+import argparse
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import Table, Column, MetaData, Index, String, Float, DateTime, select, insert, delete, exists, and_, inspect
+from sqlalchemy.exc import OperationalError
+from database import db, create_db_app, VehicleEntry, VehicleExit, ArchivePartition
+
+ENTRIES_TABLE = VehicleEntry.__tablename__
+EXITS_TABLE = VehicleExit.__tablename__
+
+# Column used to assign rows to monthly partitions
+PARTITION_DATETIME_COLUMNS = {
+    ENTRIES_TABLE: 'entry_datetime',
+    EXITS_TABLE: 'exit_datetime'
+}
+
+# Archived exits carry a copy of the entry fields the exit log displays,
+# so archived exits can be listed without joining across partitions
+EXIT_ENTRY_COLUMNS = [
+    ('display_category', String(50)),
+    ('original_class', String(50)),
+    ('entry_datetime', DateTime),
+    ('entry_gate_id', String(50)),
+    ('detection_confidence', Float)
+]
+
+# Engines whose partition registry is known to exist
+_registry_checked = set()
+
+# Partition tables are created on demand and are not part of db.metadata,
+# so db.create_all() / db.drop_all() never touch them
+_archive_metadata = MetaData()
+
+def partition_table_name(base_table, year, month):
+    """Name of the archive partition for a base table and month"""
+    return f"{base_table}_{year:04d}_{month:02d}"
+
+def month_bounds(year, month):
+    """Get [start, end) datetimes of a calendar month"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def get_partition_table(base_table, year, month):
+    """
+    Get the Table object for an archive partition
+
+    Args:
+        base_table: 'vehicle_entries' or 'vehicle_exits'
+        year: Partition year
+        month: Partition month
+
+    Returns:
+        sqlalchemy.Table: Partition table (not necessarily created yet)
+    """
+    name = partition_table_name(base_table, year, month)
+    table = _archive_metadata.tables.get(name)
+    if table is not None:
+        return table
+
+    source = db.metadata.tables[base_table]
+    columns = [
+        Column(col.name, col.type, primary_key=col.primary_key, nullable=col.nullable)
+        for col in source.columns
+    ]
+    if base_table == EXITS_TABLE:
+        columns += [Column(col_name, col_type) for col_name, col_type in EXIT_ENTRY_COLUMNS]
+
+    datetime_column = PARTITION_DATETIME_COLUMNS[base_table]
+    return Table(name, _archive_metadata, *columns,
+                 Index(f'ix_{name}_{datetime_column}', datetime_column))
+
+def ensure_partition_registry():
+    """Create the partition registry if missing (databases initialized before archiving existed)"""
+    url = str(db.engine.url)
+    if url in _registry_checked:
+        return
+    try:
+        ArchivePartition.__table__.create(db.engine, checkfirst=True)
+    except OperationalError:
+        # Another process created it between the check and the CREATE
+        if not inspect(db.engine).has_table(ArchivePartition.__tablename__):
+            raise
+    _registry_checked.add(url)
+
+def ensure_archive_schema():
+    """Create the partition registry and hot-table indexes if missing"""
+    ensure_partition_registry()
+    for model in (VehicleEntry, VehicleExit):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def drop_archive_partitions():
+    """Drop every archive partition table (used when reinitializing the database)"""
+    pattern = re.compile(rf"({'|'.join(PARTITION_DATETIME_COLUMNS)})_\d{{4}}_\d{{2}}")
+    for name in inspect(db.engine).get_table_names():
+        if pattern.fullmatch(name):
+            Table(name, MetaData()).drop(db.engine)
+    _archive_metadata.clear()
+
+def partitions_for_range(base_table, start=None, end=None):
+    """
+    Get archive partitions overlapping a datetime range
+
+    Args:
+        base_table: 'vehicle_entries' or 'vehicle_exits'
+        start: Inclusive lower bound (None = unbounded)
+        end: Exclusive upper bound (None = unbounded)
+
+    Returns:
+        list: Partition tables, oldest first
+    """
+    ensure_partition_registry()
+    query = ArchivePartition.query.filter(
+        ArchivePartition.base_table == base_table,
+        ArchivePartition.row_count > 0
+    )
+    if start is not None:
+        query = query.filter(ArchivePartition.max_datetime >= start)
+    if end is not None:
+        query = query.filter(ArchivePartition.min_datetime < end)
+
+    partitions = query.order_by(ArchivePartition.year, ArchivePartition.month).all()
+    return [get_partition_table(base_table, p.year, p.month) for p in partitions]
+
+class ParkingArchiver:
+    """Move closed visits older than the retention window into monthly partitions"""
+
+    def __init__(self, retention_days=90, batch_size=2000):
+        """
+        Initialize archiver
+
+        Args:
+            retention_days: Days of history kept in the hot tables
+            batch_size: Entries moved per transaction
+        """
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self._created_tables = set()
+
+    def archive(self, now=None):
+        """
+        Archive all closed visits whose exit is older than the retention window
+
+        An entry is only archived together with its exit, and vehicles that are
+        still IN stay in the hot tables regardless of age.
+
+        Args:
+            now: Reference time (defaults to utcnow, matching the column defaults)
+
+        Returns:
+            dict: Summary with moved row counts and touched partitions
+        """
+        ensure_partition_registry()
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        summary = {'cutoff': cutoff, 'entries': 0, 'exits': 0, 'partitions': set()}
+
+        while True:
+            entry_ids = self._next_batch(cutoff)
+            if not entry_ids:
+                break
+
+            moved_entries, moved_exits, touched = self._move_batch(entry_ids)
+            summary['entries'] += moved_entries
+            summary['exits'] += moved_exits
+            summary['partitions'].update(touched)
+
+        return summary
+
+    def _next_batch(self, cutoff):
+        """Get ids of the next batch of archivable entries"""
+        recent_exit = exists().where(and_(
+            VehicleExit.entry_id == VehicleEntry.id,
+            VehicleExit.exit_datetime >= cutoff
+        ))
+
+        rows = db.session.execute(
+            select(VehicleEntry.id).where(
+                VehicleEntry.entry_datetime < cutoff,
+                VehicleEntry.status == 'OUT',
+                ~recent_exit
+            ).order_by(VehicleEntry.id).limit(self.batch_size)
+        ).all()
+
+        return [row[0] for row in rows]
+
+    def _move_batch(self, entry_ids):
+        """Copy one batch of entries (and their exits) into partitions and delete them"""
+        entries_table = VehicleEntry.__table__
+        exits_table = VehicleExit.__table__
+
+        entry_rows = db.session.execute(
+            select(entries_table).where(entries_table.c.id.in_(entry_ids))
+        ).mappings().all()
+
+        exit_rows = db.session.execute(
+            select(
+                exits_table,
+                entries_table.c.display_category,
+                entries_table.c.original_class,
+                entries_table.c.entry_datetime,
+                entries_table.c.gate_id.label('entry_gate_id'),
+                entries_table.c.detection_confidence
+            ).join(
+                entries_table, exits_table.c.entry_id == entries_table.c.id
+            ).where(exits_table.c.entry_id.in_(entry_ids))
+        ).mappings().all()
+
+        touched = set()
+        try:
+            touched.update(self._insert_partitioned(ENTRIES_TABLE, entry_rows))
+            touched.update(self._insert_partitioned(EXITS_TABLE, exit_rows))
+
+            db.session.execute(delete(exits_table).where(exits_table.c.entry_id.in_(entry_ids)))
+            db.session.execute(delete(entries_table).where(entries_table.c.id.in_(entry_ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return len(entry_rows), len(exit_rows), touched
+
+    def _insert_partitioned(self, base_table, rows):
+        """Insert rows into their monthly partitions and update the registry"""
+        datetime_column = PARTITION_DATETIME_COLUMNS[base_table]
+
+        by_month = {}
+        for row in rows:
+            row_datetime = row[datetime_column]
+            by_month.setdefault((row_datetime.year, row_datetime.month), []).append(dict(row))
+
+        touched = []
+        for (year, month), month_rows in by_month.items():
+            table = get_partition_table(base_table, year, month)
+            if table.name not in self._created_tables:
+                table.create(db.session.connection(), checkfirst=True)
+                self._created_tables.add(table.name)
+
+            db.session.execute(insert(table), month_rows)
+
+            datetimes = [r[datetime_column] for r in month_rows]
+            self._update_registry(base_table, table.name, year, month,
+                                  len(month_rows), min(datetimes), max(datetimes))
+            touched.append(table.name)
+
+        return touched
+
+    def _update_registry(self, base_table, table_name, year, month, added, min_dt, max_dt):
+        """Incrementally update partition statistics"""
+        partition = ArchivePartition.query.filter_by(table_name=table_name).first()
+        if partition is None:
+            partition = ArchivePartition(
+                base_table=base_table,
+                table_name=table_name,
+                year=year,
+                month=month,
+                row_count=0,
+                min_datetime=min_dt,
+                max_datetime=max_dt
+            )
+            db.session.add(partition)
+
+        partition.row_count = (partition.row_count or 0) + added
+        partition.min_datetime = min(partition.min_datetime, min_dt)
+        partition.max_datetime = max(partition.max_datetime, max_dt)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive old vehicle entry/exit logs')
+    parser.add_argument('--days', type=int, default=90, help='Days of history kept in hot tables')
+    parser.add_argument('--batch-size', type=int, default=2000, help='Entries moved per transaction')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("ARCHIVING ENTRY/EXIT LOGS")
+    print("=" * 70)
+
+    app = create_db_app(__name__)
+    with app.app_context():
+        ensure_archive_schema()
+        archiver = ParkingArchiver(retention_days=args.days, batch_size=args.batch_size)
+        summary = archiver.archive()
+
+    print(f"\n📦 Cutoff: {summary['cutoff'].isoformat()}")
+    print(f"   Entries archived: {summary['entries']}")
+    print(f"   Exits archived: {summary['exits']}")
+    for name in sorted(summary['partitions']):
+        print(f"   → {name}")
+    print("\n✅ Archiving complete")
@@ -0,0 +1,515 @@
+"""
+Batch Ingest
+Offline vehicle detection over folders of archived images with parallel decoding, batched inference and resumable output
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import re
+import signal
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import cv2
+import numpy as np
+from sqlalchemy import insert, inspect
+from sqlalchemy.exc import OperationalError
+from database import db, create_db_app, ImageDetection, IngestCheckpoint
+from detection_service import VehicleDetectionService
+from structured_logging import log_event
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger('batch_ingest')
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+OUTPUT_FORMATS = ('db', 'jsonl', 'parquet')
+
+_GLOB_MAGIC = re.compile(r'[*?[]')
+
+def split_source(source):
+    """
+    Split a directory or glob into (root directory, pattern)
+
+    'snapshots' -> ('snapshots', None); 'snapshots/2024-*/**/*.jpg' ->
+    ('snapshots', '2024-*/**/*.jpg'). Patterns are matched with fnmatch
+    against paths relative to the root, so '*' also crosses directories.
+    """
+    parts = Path(source).parts
+    for index, part in enumerate(parts):
+        if _GLOB_MAGIC.search(part):
+            return str(Path(*parts[:index])) if index else '.', '/'.join(parts[index:])
+    return source, None
+
+def _matches(relative_path, pattern):
+    if pattern is None:
+        return True
+    # '**/' also matches no directory at all, as in glob
+    return fnmatch.fnmatch(relative_path, pattern) or (
+        pattern.startswith('**/') and fnmatch.fnmatch(relative_path, pattern[3:]))
+
+def iter_image_paths(root, pattern=None, after=None):
+    """
+    Yield image paths under root in a stable order
+
+    Each directory is listed and sorted on its own (memory stays bounded by
+    the largest directory, not the archive), and the walk order equals the
+    order of the relative path components, so everything up to a checkpoint
+    is skipped without listing the subtrees before it.
+
+    Args:
+        root: Directory to walk
+        pattern: Optional fnmatch pattern for paths relative to root
+        after: Relative path (posix) of the last image already processed
+
+    Yields:
+        tuple: (absolute path, relative posix path)
+    """
+    after_parts = tuple(after.split('/')) if after else None
+
+    def walk(directory, relative_parts, after_parts):
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError as e:
+            log_event(logger, logging.WARNING, 'ingest.unreadable_directory',
+                      f"⚠️  Cannot list {directory}: {e}", path=directory)
+            return
+
+        for entry in entries:
+            parts = relative_parts + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if after_parts is None:
+                    yield from walk(entry.path, parts, None)
+                    continue
+                prefix = after_parts[:len(parts)]
+                if parts == prefix:
+                    yield from walk(entry.path, parts, after_parts)
+                elif parts > prefix:
+                    yield from walk(entry.path, parts, None)
+            elif after_parts is None or parts > after_parts:
+                if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                relative_path = '/'.join(parts)
+                if _matches(relative_path, pattern):
+                    yield entry.path, relative_path
+
+    yield from walk(root, (), after_parts)
+
+def read_image(path):
+    """
+    Read and decode one image (runs in the decode pool; OpenCV releases the GIL)
+
+    Returns:
+        tuple: (image or None if unreadable, file modification time)
+    """
+    try:
+        image_time = datetime.fromtimestamp(os.stat(path).st_mtime)
+        # np.fromfile + imdecode also handles non-ASCII paths on Windows
+        image = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return image, image_time
+    except (OSError, cv2.error):
+        return None, None
+
+def iter_decoded(paths, workers=8, prefetch=64):
+    """
+    Decode images in a thread pool, keeping prefetch images in flight
+
+    Results come back in input order, so checkpoints stay exact.
+
+    Yields:
+        tuple: (absolute path, relative path, image or None, image time)
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='decode') as pool:
+        pending = deque()
+        try:
+            for path, relative_path in paths:
+                pending.append((path, relative_path, pool.submit(read_image, path)))
+                if len(pending) >= prefetch:
+                    path, relative_path, future = pending.popleft()
+                    yield (path, relative_path) + future.result()
+            while pending:
+                path, relative_path, future = pending.popleft()
+                yield (path, relative_path) + future.result()
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+def _write_json_atomic(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def ensure_ingest_schema():
+    """Create the image detection and ingest checkpoint tables if missing"""
+    for model in (ImageDetection, IngestCheckpoint):
+        try:
+            model.__table__.create(db.engine, checkfirst=True)
+        except OperationalError:
+            if not inspect(db.engine).has_table(model.__tablename__):
+                raise
+
+def detection_rows(results):
+    """Flatten image results into one dict per detection"""
+    for result in results:
+        for det in result.get('detections', ()):
+            x1, y1, x2, y2 = det['bbox']
+            yield {
+                'image_path': result['path'],
+                'image_time': result['image_time'],
+                'image_width': result['width'],
+                'image_height': result['height'],
+                'class_id': det['class_id'],
+                'original_class': det['original_class'],
+                'display_category': det['display_category'],
+                'confidence': det['confidence'],
+                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                'parking_applicable': det['parking_applicable']
+            }
+
+class DatabaseSink:
+    """Insert detections into image_detections; checkpoints commit in the same transaction"""
+
+    def __init__(self, job):
+        self.job = job
+        self.rows = []
+        ensure_ingest_schema()
+
+    def load_checkpoint(self):
+        record = IngestCheckpoint.query.filter_by(job=self.job).first()
+        return json.loads(record.state) if record else None
+
+    def discard(self):
+        """Drop this job's previous output and checkpoint (fresh run)"""
+        ImageDetection.query.filter_by(job=self.job).delete()
+        IngestCheckpoint.query.filter_by(job=self.job).delete()
+        db.session.commit()
+
+    def write(self, results):
+        self.rows.extend(dict(row, job=self.job) for row in detection_rows(results))
+
+    def commit(self, checkpoint):
+        if self.rows:
+            db.session.execute(insert(ImageDetection.__table__), self.rows)
+        record = IngestCheckpoint.query.filter_by(job=self.job).first()
+        if record is None:
+            record = IngestCheckpoint(job=self.job, state='')
+            db.session.add(record)
+        record.state = json.dumps(checkpoint)
+        db.session.commit()
+        self.rows = []
+
+    def close(self):
+        db.session.remove()
+
+class JsonlSink:
+    """
+    Append one JSON line per image
+
+    The checkpoint records the output size; a resumed run truncates lines
+    written after it, so no image is ever written twice.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = f"{path}.checkpoint.json"
+        self.file = None
+
+    def load_checkpoint(self):
+        checkpoint = _read_json(self.checkpoint_path)
+        if checkpoint is not None and os.path.exists(self.path):
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(checkpoint['output_offset'])
+            self.file.seek(0, os.SEEK_END)
+        return checkpoint
+
+    def discard(self):
+        for path in (self.path, self.checkpoint_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def write(self, results):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        for result in results:
+            record = dict(result, image_time=result['image_time'].isoformat() if result['image_time'] else None)
+            self.file.write(json.dumps(record).encode() + b'\n')
+
+    def commit(self, checkpoint):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        _write_json_atomic(self.checkpoint_path, dict(checkpoint, output_offset=self.file.tell()))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class ParquetSink:
+    """
+    Write detections as Parquet part files, one per checkpoint
+
+    Parts are renamed into place before the checkpoint that lists them is
+    written; parts past the checkpoint are deleted on resume.
+    """
+
+    def __init__(self, directory):
+        if pa is None:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_path = self.directory / '_checkpoint.json'
+        self.schema = pa.schema([
+            ('image_path', pa.string()), ('image_time', pa.timestamp('us')), ('image_width', pa.int64()),
+            ('image_height', pa.int64()), ('class_id', pa.int64()), ('original_class', pa.string()),
+            ('display_category', pa.string()), ('confidence', pa.float64()), ('x1', pa.float64()),
+            ('y1', pa.float64()), ('x2', pa.float64()), ('y2', pa.float64()), ('parking_applicable', pa.bool_())
+        ])
+        self.columns = {name: [] for name in self.schema.names}
+        self.parts = 0
+
+    def _part_path(self, index):
+        return self.directory / f'part-{index:05d}.parquet'
+
+    def load_checkpoint(self):
+        checkpoint = _read_json(self.checkpoint_path)
+        if checkpoint is not None:
+            self.parts = checkpoint['parts']
+            for path in self.directory.glob('part-*.parquet'):
+                if int(path.stem.split('-')[1]) >= self.parts:
+                    path.unlink()
+        return checkpoint
+
+    def discard(self):
+        for path in list(self.directory.glob('part-*.parquet')) + [self.checkpoint_path]:
+            if path.exists():
+                path.unlink()
+
+    def write(self, results):
+        for row in detection_rows(results):
+            for name, values in self.columns.items():
+                values.append(row[name])
+
+    def commit(self, checkpoint):
+        if self.columns['image_path']:
+            table = pa.table({name: pa.array(values, type=self.schema.field(name).type)
+                              for name, values in self.columns.items()}, schema=self.schema)
+            path = self._part_path(self.parts)
+            temp_path = path.with_suffix('.tmp')
+            pq.write_table(table, temp_path, compression='snappy')
+            os.replace(temp_path, path)
+            self.parts += 1
+            for values in self.columns.values():
+                values.clear()
+        _write_json_atomic(self.checkpoint_path, dict(checkpoint, parts=self.parts))
+
+    def close(self):
+        pass
+
+class BatchIngest:
+    """Walk, decode, detect and write an image archive, committing a checkpoint every N images"""
+
+    def __init__(self, detection_service, sink, batch_size=16, decode_workers=8, checkpoint_every=5000):
+        """
+        Initialize ingest
+
+        Args:
+            detection_service: Loaded VehicleDetectionService
+            sink: DatabaseSink, JsonlSink or ParquetSink
+            batch_size: Images per inference call
+            decode_workers: Decode threads
+            checkpoint_every: Images between checkpoints (bounds work lost on a crash)
+        """
+        self.detection_service = detection_service
+        self.sink = sink
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.checkpoint_every = checkpoint_every
+
+    def run(self, source, restart=False, limit=None, progress_every=1000):
+        """
+        Process every image in source, resuming from the sink's checkpoint
+
+        Args:
+            source: Directory or glob
+            restart: Discard earlier output and start over
+            limit: Stop after this many images (this run)
+            progress_every: Images between progress lines
+
+        Returns:
+            dict: Totals for the whole job (including earlier runs)
+        """
+        root, pattern = split_source(source)
+        if restart:
+            self.sink.discard()
+        checkpoint = self.sink.load_checkpoint()
+        if checkpoint is not None and checkpoint['source'] != source:
+            raise ValueError(f"Checkpoint is for {checkpoint['source']!r}, not {source!r} (use --restart)")
+
+        totals = {key: (checkpoint or {}).get(key, 0) for key in ('images', 'failed', 'detections')}
+        last_path = checkpoint['last_path'] if checkpoint else None
+        if last_path:
+            print(f"↩️  Resuming after {last_path} ({totals['images']} images done)")
+
+        paths = iter_image_paths(root, pattern, after=last_path)
+        decoded = iter_decoded(paths, self.decode_workers, prefetch=self.batch_size * 4)
+
+        batch = []
+        since_checkpoint = 0
+        processed = 0
+        started = time.monotonic()
+        timings = {'decode_wait': 0.0, 'inference': 0.0, 'write': 0.0}
+
+        def flush_batch():
+            nonlocal since_checkpoint, last_path
+            readable = [item for item in batch if item[2] is not None]
+            start = time.perf_counter()
+            all_detections = self.detection_service.detect_vehicles_batch([item[2] for item in readable])
+            timings['inference'] += time.perf_counter() - start
+
+            by_path = {item[0]: detections for item, detections in zip(readable, all_detections)}
+            results = []
+            for path, relative_path, image, image_time in batch:
+                result = {'path': path, 'image_time': image_time}
+                if image is None:
+                    result['error'] = 'unreadable'
+                    totals['failed'] += 1
+                    log_event(logger, logging.WARNING, 'ingest.unreadable_image',
+                              f"⚠️  Cannot decode {path}", rate_limit=10, path=path)
+                else:
+                    result.update(width=image.shape[1], height=image.shape[0], detections=by_path[path])
+                    totals['detections'] += len(by_path[path])
+                results.append(result)
+            totals['images'] += len(batch)
+            since_checkpoint += len(batch)
+            last_path = batch[-1][1]
+            batch.clear()
+
+            start = time.perf_counter()
+            self.sink.write(results)
+            timings['write'] += time.perf_counter() - start
+
+        def commit():
+            nonlocal since_checkpoint
+            start = time.perf_counter()
+            self.sink.commit(dict(totals, source=source, last_path=last_path,
+                                  updated_at=datetime.now().isoformat()))
+            timings['write'] += time.perf_counter() - start
+            since_checkpoint = 0
+
+        try:
+            wait_start = time.perf_counter()
+            for item in decoded:
+                timings['decode_wait'] += time.perf_counter() - wait_start
+                batch.append(item)
+                processed += 1
+                if len(batch) >= self.batch_size:
+                    flush_batch()
+                    if since_checkpoint >= self.checkpoint_every:
+                        commit()
+                if processed % progress_every == 0:
+                    rate = processed / (time.monotonic() - started)
+                    print(f"📊 {totals['images']} images ({rate:.0f}/s), {totals['detections']} detections, "
+                          f"{totals['failed']} unreadable")
+                if limit and processed >= limit:
+                    break
+                wait_start = time.perf_counter()
+        finally:
+            # Whatever finished inference is committed, including on Ctrl+C
+            if batch:
+                flush_batch()
+            if since_checkpoint:
+                commit()
+            decoded.close()
+            self.sink.close()
+
+        elapsed = time.monotonic() - started
+        print(f"\n✅ {processed} images this run in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f}/s)")
+        print(f"   Job totals: {totals['images']} images, {totals['detections']} detections, "
+              f"{totals['failed']} unreadable")
+        print(f"   Time: waiting for decode {timings['decode_wait']:.1f}s, inference {timings['inference']:.1f}s, "
+              f"writing {timings['write']:.1f}s")
+        return totals
+
+def create_sink(output_format, output=None, job=None):
+    """
+    Create the output sink
+
+    Args:
+        output_format: 'db', 'jsonl' or 'parquet'
+        output: JSONL file or Parquet directory
+        job: Job name for database output
+
+    Returns:
+        DatabaseSink, JsonlSink or ParquetSink
+    """
+    if output_format == 'db':
+        return DatabaseSink(job)
+    if not output:
+        raise ValueError(f"--output is required for {output_format} output")
+    if output_format == 'jsonl':
+        return JsonlSink(output)
+    if output_format == 'parquet':
+        return ParquetSink(output)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Detect vehicles in a folder of images (resumable)')
+    parser.add_argument('source', help="Directory or glob, e.g. 'snapshots/2024-*/**/*.jpg'")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='db', help='Output format')
+    parser.add_argument('--output', help='JSONL file or Parquet directory')
+    parser.add_argument('--job', help='Job name for database output (default: the source)')
+    parser.add_argument('--model', default='best.pt')
+    parser.add_argument('--confidence', type=float, default=0.5)
+    parser.add_argument('--runtime', default='pytorch')
+    parser.add_argument('--precision', default='fp32')
+    parser.add_argument('--batch-size', type=int, default=16, help='Images per inference call')
+    parser.add_argument('--decode-workers', type=int, default=os.cpu_count() or 4, help='Decode threads')
+    parser.add_argument('--checkpoint-every', type=int, default=5000, help='Images between checkpoints')
+    parser.add_argument('--limit', type=int, help='Stop after this many images')
+    parser.add_argument('--restart', action='store_true', help='Discard earlier output and start over')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("BATCH IMAGE INGEST")
+    print("=" * 70)
+
+    service = VehicleDetectionService(args.model, confidence_threshold=args.confidence, runtime=args.runtime,
+                                      precision=args.precision, metrics_source='batch_ingest')
+    if not service.load_model():
+        raise SystemExit(1)
+
+    # Finish the current batch and checkpoint on SIGTERM as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    app = create_db_app()
+    with app.app_context():
+        sink = create_sink(args.format, args.output, args.job or args.source)
+        ingest = BatchIngest(service, sink, batch_size=args.batch_size, decode_workers=args.decode_workers,
+                             checkpoint_every=args.checkpoint_every)
+        try:
+            ingest.run(args.source, restart=args.restart, limit=args.limit)
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopped; run the same command again to resume")
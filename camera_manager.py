@@ -4,28 +4,86 @@ Handles IP camera connections and frame capture
 """
 
 import cv2
+import logging
 import threading
 import queue
+import random
 import time
 from datetime import datetime
+from metrics import (stage_timer, FRAMES_TOTAL, FRAMES_DROPPED, CAPTURE_FAILURES, FRAME_QUEUE_DEPTH,
+                     CAMERA_UP, CAMERA_RECONNECTS, CAMERA_FRAME_AGE)
+from structured_logging import log_event
+
+logger = logging.getLogger('camera_manager')
+
+# Camera health states
+HEALTH_CONNECTING = 'connecting'      # opened, waiting for the first frame
+HEALTH_HEALTHY = 'healthy'            # frames arriving
+HEALTH_STALLED = 'stalled'            # no frame within stall_timeout
+HEALTH_RECONNECTING = 'reconnecting'  # reopening the stream (with backoff)
+HEALTH_STOPPED = 'stopped'
 
 class CameraManager:
     """Manages camera connection and frame capture"""
     
-    def __init__(self, camera_url, camera_id='CAMERA_1'):
+    def __init__(self, camera_url, camera_id='CAMERA_1', capture_factory=None,
+                 frame_interval=0.03, drop_frames=True, stall_timeout=5.0,
+                 initial_backoff=1.0, max_backoff=30.0, auto_reconnect=True, frame_ring=None):
         """
         Initialize camera manager
         
         Args:
-            camera_url: RTSP URL or camera index (0 for webcam)
+            camera_url: RTSP URL, video file or camera index (0 for webcam)
             camera_id: Identifier for this camera
+            capture_factory: Callable opening a capture for a URL (default cv2.VideoCapture)
+            frame_interval: Sleep between reads in seconds (~30 FPS by default)
+            drop_frames: Drop the oldest frame when consumers fall behind;
+                         False blocks capture instead (used for replay)
+            stall_timeout: Seconds without a frame before the stream is reopened
+            initial_backoff: First delay between failed reopen attempts
+            max_backoff: Upper bound for the exponential backoff
+            auto_reconnect: Reopen stalled streams (disable for finite replays)
+            frame_ring: FrameRing every captured frame is also published to,
+                        for other local processes to read without copying
         """
         self.camera_url = camera_url
         self.camera_id = camera_id
+        self.capture_factory = capture_factory or cv2.VideoCapture
+        self.frame_interval = frame_interval
+        self.drop_frames = drop_frames
         self.capture = None
         self.frame_queue = queue.Queue(maxsize=10)
+        self.frame_ring = frame_ring
         self.is_running = False
         self.thread = None
+        self.capture_lock = threading.Lock()
+        
+        # Watchdog / reconnect supervisor
+        self.stall_timeout = stall_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.auto_reconnect = auto_reconnect
+        self.supervisor_thread = None
+        self.stop_event = threading.Event()
+        self.generation = 0  # bumped when a hung capture thread is abandoned
+        self.last_frame_time = time.monotonic()
+        self.health_state = HEALTH_STOPPED
+        self.health_since = time.time()
+        self.reconnect_attempts = 0
+        self.reconnects_total = 0
+        self.last_error = None
+        self.health_listeners = []
+        
+        # Metrics (resolved once, observed per frame)
+        self.capture_seconds = stage_timer('capture', camera_id)
+        self.frames_total = FRAMES_TOTAL.labels(source=camera_id)
+        self.frames_dropped = FRAMES_DROPPED.labels(source=camera_id)
+        self.capture_failures = CAPTURE_FAILURES.labels(source=camera_id)
+        FRAME_QUEUE_DEPTH.labels(source=camera_id).set_function(self.frame_queue.qsize)
+        self.camera_up = CAMERA_UP.labels(source=camera_id)
+        CAMERA_FRAME_AGE.labels(source=camera_id).set_function(
+            lambda: time.monotonic() - self.last_frame_time
+        )
         
         print(f"📷 Camera Manager initialized for {camera_id}")
         print(f"   URL: {camera_url}")
@@ -35,24 +93,13 @@ class CameraManager:
         try:
             print(f"\n🔌 Connecting to camera {self.camera_id}...")
             
-            # Try to open camera
-            if isinstance(self.camera_url, int):
-                # Webcam
-                self.capture = cv2.VideoCapture(self.camera_url)
-            else:
-                # IP camera (RTSP)
-                self.capture = cv2.VideoCapture(self.camera_url)
+            self.capture = self._open_capture(self.camera_url)
             
             # Check if camera opened successfully
-            if not self.capture.isOpened():
+            if self.capture is None:
                 print(f"❌ Failed to open camera {self.camera_id}")
                 return False
             
-            # Set camera properties
-            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
-            
             print(f"✅ Camera {self.camera_id} connected successfully")
             return True
             
@@ -60,12 +107,102 @@ class CameraManager:
             print(f"❌ Error connecting to camera {self.camera_id}: {e}")
             return False
     
+    def _open_capture(self, camera_url):
+        """
+        Open and configure a capture for a camera URL
+        
+        Args:
+            camera_url: RTSP URL or camera index
+            
+        Returns:
+            cv2.VideoCapture or None if it could not be opened
+        """
+        capture = self.capture_factory(camera_url)
+        
+        if not capture.isOpened():
+            capture.release()
+            return None
+        
+        # Set camera properties
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+        
+        return capture
+    
+    def switch_source(self, camera_url):
+        """
+        Switch to a new camera URL without stopping capture
+        
+        The new stream is opened before the old one is released, so the
+        capture loop keeps delivering frames until the swap.
+        
+        Args:
+            camera_url: New RTSP URL or camera index
+            
+        Returns:
+            bool: True if the new source is active
+        """
+        print(f"🔁 Switching camera {self.camera_id} to {camera_url}...")
+        
+        new_capture = self._open_capture(camera_url)
+        if new_capture is None:
+            print(f"❌ Failed to open {camera_url}, keeping current source")
+            return False
+        
+        self._swap_capture(new_capture, camera_url)
+        
+        print(f"✅ Camera {self.camera_id} switched to {camera_url}")
+        return True
+    
+    def _swap_capture(self, new_capture, camera_url, lock_timeout=2.0):
+        """
+        Install a new capture and release the old one
+        
+        If the capture thread is stuck inside read() on a dead stream (it
+        holds capture_lock), that thread is abandoned: it releases its old
+        capture and exits when read() finally returns, and a fresh capture
+        thread takes over with a new lock.
+        
+        Args:
+            new_capture: Opened capture
+            camera_url: URL it was opened from
+            lock_timeout: Seconds to wait for an in-progress read
+        """
+        if self.capture_lock.acquire(timeout=lock_timeout):
+            try:
+                old_capture = self.capture
+                self.capture = new_capture
+                self.camera_url = camera_url
+                self.last_frame_time = time.monotonic()
+            finally:
+                self.capture_lock.release()
+            
+            if old_capture:
+                old_capture.release()
+            return
+        
+        log_event(logger, logging.WARNING, 'camera.read_hung',
+                  f"⚠️  Capture thread for {self.camera_id} is stuck in read(), replacing it",
+                  camera=self.camera_id)
+        self.capture_lock = threading.Lock()
+        self.capture = new_capture
+        self.camera_url = camera_url
+        self.last_frame_time = time.monotonic()
+        self.generation += 1
+        if self.is_running:
+            self.thread = threading.Thread(target=self._capture_loop, args=(self.generation,), daemon=True)
+            self.thread.start()
+    
     def disconnect(self):
         """Disconnect from camera"""
         self.is_running = False
+        self.stop_event.set()
         
         if self.thread:
             self.thread.join(timeout=5)
+        if self.supervisor_thread:
+            self.supervisor_thread.join(timeout=5)
         
         if self.capture:
             self.capture.release()
@@ -78,45 +215,208 @@ class CameraManager:
             return False
         
         self.is_running = True
-        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.stop_event.clear()
+        self.last_frame_time = time.monotonic()
+        self._set_health(HEALTH_CONNECTING)
+        
+        self.thread = threading.Thread(target=self._capture_loop, args=(self.generation,), daemon=True)
         self.thread.start()
         
+        if self.auto_reconnect:
+            self.supervisor_thread = threading.Thread(target=self._supervise_loop, daemon=True)
+            self.supervisor_thread.start()
+        
         print(f"▶️  Camera {self.camera_id} capture started")
         return True
     
     def stop_capture(self):
         """Stop capturing frames"""
         self.is_running = False
+        self.stop_event.set()
         if self.thread:
             self.thread.join(timeout=5)
+        if self.supervisor_thread:
+            self.supervisor_thread.join(timeout=5)
+        self._set_health(HEALTH_STOPPED)
         print(f"⏹️  Camera {self.camera_id} capture stopped")
     
-    def _capture_loop(self):
+    def add_health_listener(self, callback):
+        """
+        Register a callback for health changes
+        
+        Args:
+            callback: Function called as callback(camera_id, state, health_dict)
+        """
+        self.health_listeners.append(callback)
+    
+    def _set_health(self, state, error=None):
+        """Record a health transition and notify listeners"""
+        if error is not None:
+            self.last_error = error
+        if state == self.health_state:
+            return
+        
+        previous = self.health_state
+        self.health_state = state
+        self.health_since = time.time()
+        self.camera_up.set(1 if state == HEALTH_HEALTHY else 0)
+        
+        level = logging.INFO if state in (HEALTH_HEALTHY, HEALTH_CONNECTING, HEALTH_STOPPED) else logging.WARNING
+        log_event(logger, level, 'camera.health', f"📷 Camera {self.camera_id}: {previous} → {state}",
+                  camera=self.camera_id, state=state, previous=previous,
+                  attempts=self.reconnect_attempts)
+        
+        health = self.get_health()
+        for callback in self.health_listeners:
+            try:
+                callback(self.camera_id, state, health)
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'camera.health_listener_error',
+                          f"❌ Camera health listener error: {e}", camera=self.camera_id)
+    
+    def get_health(self):
+        """
+        Get the camera's health state
+        
+        Returns:
+            dict: State, seconds since last frame, reconnect counters and last error
+        """
+        return {
+            'camera_id': self.camera_id,
+            'state': self.health_state,
+            'since': datetime.fromtimestamp(self.health_since).isoformat(),
+            'last_frame_age': round(time.monotonic() - self.last_frame_time, 2),
+            'reconnect_attempts': self.reconnect_attempts,
+            'reconnects_total': self.reconnects_total,
+            'last_error': self.last_error
+        }
+    
+    def _backoff_delay(self):
+        """Exponential backoff with jitter for the current attempt"""
+        delay = min(self.max_backoff, self.initial_backoff * (2 ** max(0, self.reconnect_attempts - 1)))
+        # Jitter spreads reconnects of cameras that dropped together (switch/NVR reboot)
+        return random.uniform(delay / 2, delay)
+    
+    def _supervise_loop(self):
+        """Watchdog: reopen the stream when frames stop arriving"""
+        check_interval = min(1.0, self.stall_timeout / 2)
+        
+        while not self.stop_event.wait(check_interval):
+            age = time.monotonic() - self.last_frame_time
+            if age < self.stall_timeout:
+                continue
+            
+            self._set_health(HEALTH_STALLED, f'No frame for {age:.1f}s')
+            self._reconnect()
+    
+    def _reconnect(self):
+        """Reopen the current URL until it succeeds or capture stops"""
+        while not self.stop_event.is_set():
+            self.reconnect_attempts += 1
+            self._set_health(HEALTH_RECONNECTING)
+            
+            error = None
+            try:
+                new_capture = self._open_capture(self.camera_url)
+            except Exception as e:
+                new_capture = None
+                error = str(e)
+            
+            if new_capture is not None:
+                CAMERA_RECONNECTS.labels(source=self.camera_id, result='success').inc()
+                self.reconnects_total += 1
+                self._swap_capture(new_capture, self.camera_url)
+                self._set_health(HEALTH_CONNECTING)
+                return
+            
+            CAMERA_RECONNECTS.labels(source=self.camera_id, result='failure').inc()
+            self.last_error = error or f'Failed to open {self.camera_url}'
+            delay = self._backoff_delay()
+            log_event(logger, logging.WARNING, 'camera.reconnect_failed',
+                      f"⚠️  Reopening {self.camera_id} failed, retrying in {delay:.1f}s",
+                      camera=self.camera_id, attempt=self.reconnect_attempts, delay=round(delay, 2))
+            self.stop_event.wait(delay)
+    
+    def _capture_loop(self, generation=0):
         """Capture loop running in separate thread"""
-        while self.is_running:
+        while self.is_running and generation == self.generation:
             try:
-                ret, frame = self.capture.read()
+                read_start = time.perf_counter()
+                capture_lock = self.capture_lock
+                with capture_lock:
+                    capture = self.capture
+                    ret, frame = capture.read()
+                
+                if generation != self.generation:
+                    # Abandoned after hanging in read(); the supervisor replaced us
+                    capture.release()
+                    return
                 
                 if not ret:
-                    print(f"⚠️  Failed to read frame from {self.camera_id}")
-                    time.sleep(1)
+                    self.capture_failures.inc()
+                    log_event(logger, logging.WARNING, 'camera.read_failed',
+                              f"⚠️  Failed to read frame from {self.camera_id}",
+                              rate_limit=30, rate_key=self.camera_id, camera=self.camera_id)
+                    # The watchdog reopens the stream once it has been quiet for stall_timeout
+                    self.stop_event.wait(0.2)
+                    continue
+                
+                self.last_frame_time = time.monotonic()
+                if self.health_state != HEALTH_HEALTHY:
+                    self.reconnect_attempts = 0
+                    self._set_health(HEALTH_HEALTHY)
+                
+                self.capture_seconds.observe(time.perf_counter() - read_start)
+                self.frames_total.inc()
+                
+                if self.frame_ring is not None:
+                    self._publish_to_ring(frame)
+                
+                if not self.drop_frames:
+                    self._put_blocking(frame)
                     continue
                 
                 # Add frame to queue (drop old frames if queue is full)
                 if self.frame_queue.full():
                     try:
                         self.frame_queue.get_nowait()
+                        self.frames_dropped.inc()
                     except queue.Empty:
                         pass
                 
                 self.frame_queue.put(frame)
                 
                 # Small sleep to control frame rate
-                time.sleep(0.03)  # ~30 FPS
+                if self.frame_interval:
+                    time.sleep(self.frame_interval)
                 
             except Exception as e:
-                print(f"❌ Error in capture loop for {self.camera_id}: {e}")
-                time.sleep(1)
+                self.last_error = str(e)
+                log_event(logger, logging.ERROR, 'camera.capture_error',
+                          f"❌ Error in capture loop for {self.camera_id}: {e}",
+                          rate_limit=30, rate_key=self.camera_id, camera=self.camera_id)
+                self.stop_event.wait(1)
+    
+    def _publish_to_ring(self, frame):
+        """Copy a captured frame into the shared frame ring"""
+        try:
+            self.frame_ring.write(frame)
+        except ValueError as e:
+            log_event(logger, logging.WARNING, 'camera.ring_write_failed',
+                      f"⚠️  Frame from {self.camera_id} not shared: {e}",
+                      rate_limit=30, rate_key=self.camera_id, camera=self.camera_id)
+    
+    def _put_blocking(self, frame):
+        """Queue a frame, waiting for space (stops waiting on shutdown)"""
+        while self.is_running:
+            try:
+                self.frame_queue.put(frame, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        
+        if self.frame_interval:
+            time.sleep(self.frame_interval)
     
     def get_frame(self):
         """
@@ -0,0 +1,449 @@
+"""
+Camera Registry
+Independent capture/detect/count pipelines per camera, keyed by camera ID, with site-wide totals
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+import cv2
+from camera_manager import CameraManager
+from counting_zones import parse_zones
+from metrics import stage_timer
+from structured_logging import log_event
+
+logger = logging.getLogger('camera_registry')
+
+DEFAULT_CAMERAS = [{'id': 'CAMERA_1', 'source': 0}]
+
+def parse_cameras(spec):
+    """
+    Parse the CAMERAS setting
+
+    Example:
+        [{"id": "CAMERA_1", "source": 0},
+         {"id": "NORTH_GATE", "source": "rtsp://192.168.1.110:554/stream",
+          "zones": [{"name": "lane_1", "points": [[0.3, 0], [0.3, 1]]}]}]
+
+    Cameras without "zones" use COUNTING_ZONES (or the default centre line).
+    With "share_frames": true the captured frames are also published to the
+    camera's shared frame ring (frame_ring.ring_name(id)) for other local
+    consumers. "min_fps"/"max_fps" bound the camera's inference rate
+    (default LANE_MIN_FPS/LANE_MAX_FPS, see inference_scheduler).
+
+    Args:
+        spec: JSON string or list of dicts (empty = one webcam, CAMERA_1)
+
+    Returns:
+        list: Dicts with 'id', 'source', 'line_position', 'zones' (None or zone list),
+              'share_frames', 'min_fps' and 'max_fps' (None = default)
+
+    Raises:
+        ValueError: On malformed specs, duplicate IDs or invalid zones
+    """
+    if isinstance(spec, str):
+        try:
+            spec = json.loads(spec) if spec.strip() else []
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid camera JSON: {e}")
+
+    cameras = []
+    ids = set()
+    for item in spec or DEFAULT_CAMERAS:
+        camera_id = str(item.get('id') or f"CAMERA_{len(cameras) + 1}")
+        if camera_id in ids:
+            raise ValueError(f"Duplicate camera ID: {camera_id}")
+        if '/' in camera_id:
+            raise ValueError(f"Camera ID may not contain '/': {camera_id}")
+        ids.add(camera_id)
+
+        source = item.get('source', 0)
+        if isinstance(source, str) and source.strip().isdigit():
+            source = int(source)
+
+        zones = item.get('zones')
+        cameras.append({
+            'id': camera_id,
+            'source': source,
+            'line_position': float(item.get('line_position', 0.5)),
+            'zones': parse_zones(zones) if zones else None,
+            'share_frames': bool(item.get('share_frames', False)),
+            'min_fps': float(item['min_fps']) if item.get('min_fps') else None,
+            'max_fps': float(item['max_fps']) if item.get('max_fps') else None
+        })
+    return cameras
+
+def parking_availability(cars_in, cars_out, total_capacity):
+    """Parking availability from car counts (see VehicleCounter.get_parking_availability)"""
+    net_cars = cars_in - cars_out
+    return {
+        'total_capacity': total_capacity,
+        'cars_in': cars_in,
+        'cars_out': cars_out,
+        'currently_parked': net_cars,
+        'available': max(0, total_capacity - net_cars),
+        'occupancy_percent': (net_cars / total_capacity * 100) if total_capacity > 0 else 0
+    }
+
+def _empty_counts():
+    return {'IN': defaultdict(int), 'OUT': defaultdict(int)}
+
+class SiteTotals:
+    """
+    Site-wide IN/OUT counts by category across all cameras
+
+    Updated by each counting event (one increment) instead of summing every
+    camera on every request. A camera's reset subtracts only that camera's
+    contribution.
+    """
+
+    def __init__(self):
+        self.totals = _empty_counts()
+        self.cameras = {}
+        self.lock = threading.Lock()
+
+    def set_camera(self, camera_id, counts):
+        """
+        Set a camera's baseline (e.g. counts restored on startup)
+
+        Args:
+            camera_id: Camera ID
+            counts: {'IN': {category: n}, 'OUT': {...}}
+        """
+        with self.lock:
+            self._remove(camera_id)
+            self.cameras[camera_id] = _empty_counts()
+            for count_type in ('IN', 'OUT'):
+                for category, count in counts.get(count_type, {}).items():
+                    self.cameras[camera_id][count_type][category] += count
+                    self.totals[count_type][category] += count
+
+    def apply(self, camera_id, event):
+        """
+        Apply a counter event (crossings add one, resets clear the camera,
+        restores replace its baseline)
+
+        Args:
+            camera_id: Camera the event came from
+            event: Counter event dict
+        """
+        event_type = event.get('type')
+        if event_type == 'restore':
+            self.set_camera(camera_id, event['counts'])
+        elif event_type == 'reset':
+            with self.lock:
+                self._remove(camera_id)
+                self.cameras[camera_id] = _empty_counts()
+        elif event_type == 'crossing':
+            count_type, category = event['count_type'], event['category']
+            with self.lock:
+                camera = self.cameras.setdefault(camera_id, _empty_counts())
+                camera[count_type][category] += 1
+                self.totals[count_type][category] += 1
+
+    def _remove(self, camera_id):
+        """Subtract a camera's contribution (caller holds the lock)"""
+        camera = self.cameras.pop(camera_id, None)
+        if camera is None:
+            return
+        for count_type in ('IN', 'OUT'):
+            for category, count in camera[count_type].items():
+                self.totals[count_type][category] -= count
+
+    def get_counts(self):
+        """
+        Get site-wide counts (same shape as VehicleCounter.get_counts, without zones)
+
+        Returns:
+            dict: in_counts, out_counts, total_in, total_out, net_count, cameras
+        """
+        with self.lock:
+            in_counts = {category: n for category, n in self.totals['IN'].items() if n}
+            out_counts = {category: n for category, n in self.totals['OUT'].items() if n}
+            cameras = sorted(self.cameras)
+        total_in = sum(in_counts.values())
+        total_out = sum(out_counts.values())
+        return {
+            'in_counts': in_counts,
+            'out_counts': out_counts,
+            'total_in': total_in,
+            'total_out': total_out,
+            'net_count': total_in - total_out,
+            'cameras': cameras
+        }
+
+    def get_parking_availability(self, total_capacity):
+        """Parking availability from site-wide car counts (see VehicleCounter.get_parking_availability)"""
+        with self.lock:
+            cars_in = self.totals['IN']['Car']
+            cars_out = self.totals['OUT']['Car']
+        return parking_availability(cars_in, cars_out, total_capacity)
+
+    def get_camera_counts(self, camera_id):
+        """
+        Get one camera's contribution
+
+        Returns:
+            dict: {'IN': {category: n}, 'OUT': {...}} (as accepted by set_camera)
+        """
+        with self.lock:
+            camera = self.cameras.get(camera_id) or _empty_counts()
+            return {count_type: {category: n for category, n in camera[count_type].items() if n}
+                    for count_type in ('IN', 'OUT')}
+
+class CameraPipeline:
+    """
+    Capture → detect → count → draw loop for one camera
+
+    Runs on its own thread whether or not anyone is watching, so counting
+    never depends on viewers and several viewers never advance the counter
+    twice. The latest annotated frame is JPEG-encoded at most once, on
+    demand, and shared by every viewer of the camera.
+    """
+
+    def __init__(self, camera_id, source, counter, detect=None, capture_factory=None,
+                 stall_timeout=5.0, max_backoff=30.0, frame_ring=None, lane=None):
+        """
+        Initialize pipeline
+
+        Args:
+            camera_id: Camera ID
+            source: RTSP URL, video file or webcam index
+            counter: VehicleCounter for this camera
+            detect: Function(frame) -> detections (None = preview without counting)
+            capture_factory: Callable opening a capture (default cv2.VideoCapture)
+            stall_timeout: Seconds without a frame before the stream is reopened
+            max_backoff: Maximum seconds between reconnect attempts
+            frame_ring: FrameRing to publish captured frames to (None = not shared)
+            lane: inference_scheduler.Lane pacing detection (None = detect every frame)
+        """
+        self.camera_id = camera_id
+        self.source = source
+        self.counter = counter
+        self.detect = detect
+        self.lane = lane
+        self.camera = CameraManager(source, camera_id, capture_factory, stall_timeout=stall_timeout,
+                                    max_backoff=max_backoff, frame_ring=frame_ring)
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.encode_lock = threading.Lock()
+
+        self.is_running = False
+        self.thread = None
+        self.encoding_seconds = stage_timer('encoding', camera_id)
+
+    def start(self):
+        """Start the pipeline thread (connects to the camera, retrying with backoff)"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run_loop, daemon=True, name=f'pipeline-{self.camera_id}')
+        self.thread.start()
+
+    def stop(self):
+        """Stop the pipeline and release the camera"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        self.camera.stop_capture()
+        self.camera.disconnect()
+        if self.camera.frame_ring is not None:
+            self.camera.frame_ring.close()
+        with self.condition:
+            self.condition.notify_all()
+
+    def _connect(self):
+        """Connect and start capture, retrying until it works or the pipeline stops"""
+        attempt = 0
+        while self.is_running:
+            if self.camera.connect() and self.camera.start_capture():
+                return True
+            attempt += 1
+            delay = min(self.camera.max_backoff, 2 ** attempt)
+            log_event(logger, logging.WARNING, 'pipeline.connect_failed',
+                      f"⚠️  Camera {self.camera_id} unavailable, retrying in {delay}s",
+                      camera=self.camera_id, attempt=attempt)
+            time.sleep(delay)
+        return False
+
+    def _run_loop(self):
+        """Process every frame the camera delivers"""
+        if not self._connect():
+            return
+
+        while self.is_running:
+            frame = self.camera.get_frame()
+            if frame is None:
+                continue
+            # Frames between the lane's inference slots are only annotated
+            run_detection = self.lane is None or self.lane.due()
+            try:
+                frame = self.process_frame(frame, run_detection)
+                if run_detection and self.lane is not None:
+                    self.lane.report(len(self.counter.trackers))
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'pipeline.frame_error',
+                          f"❌ Detection/Counting error on {self.camera_id}: {e}",
+                          rate_limit=10, rate_key=self.camera_id, camera=self.camera_id)
+
+            self.publish_frame(frame)
+    
+    def publish_frame(self, frame):
+        """Make a processed frame the latest one and wake viewers"""
+        with self.condition:
+            self.frame = frame
+            self.seq += 1
+            self.condition.notify_all()
+
+    def process_frame(self, frame, run_detection=True):
+        """
+        Detect, count and annotate one frame
+
+        Args:
+            frame: BGR frame (annotated in place)
+            run_detection: False to only draw the current tracks and counts
+
+        Returns:
+            numpy.ndarray: Annotated frame
+        """
+        if self.detect is not None:
+            if run_detection:
+                detections = self.detect(frame)
+                self.counter.update(detections, frame.shape)
+            frame = self.counter.draw_on_frame(frame)
+
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.counter.overlay.put_text(frame, timestamp, (10, frame.shape[0] - 10), 0.7, (255, 255, 255))
+        return frame
+
+    def wait_for_jpeg(self, after_seq=0, timeout=1.0):
+        """
+        Wait for a frame newer than after_seq and get it as JPEG
+
+        Args:
+            after_seq: Sequence number of the last frame the caller has
+            timeout: Maximum seconds to wait
+
+        Returns:
+            tuple: (seq, jpeg bytes) or (after_seq, None) on timeout
+        """
+        with self.condition:
+            if self.seq <= after_seq:
+                self.condition.wait(timeout)
+            seq, frame = self.seq, self.frame
+        if frame is None or seq <= after_seq:
+            return after_seq, None
+
+        with self.encode_lock:
+            if self.jpeg_seq != seq:
+                with self.encoding_seconds.time():
+                    ok, buffer = cv2.imencode('.jpg', frame)
+                if not ok:
+                    return after_seq, None
+                self.jpeg, self.jpeg_seq = buffer.tobytes(), seq
+            return self.jpeg_seq, self.jpeg
+
+    def add_listener(self, callback):
+        """Register a callback for this camera's counter events"""
+        self.counter.add_listener(callback)
+    
+    def get_state(self):
+        """Get this camera's persisted counts (see VehicleCounter.get_state)"""
+        return self.counter.get_state()
+    
+    def get_counts(self):
+        """Get this camera's counts (see VehicleCounter.get_counts)"""
+        return self.counter.get_counts()
+
+    def get_parking_availability(self, total_capacity):
+        return self.counter.get_parking_availability(total_capacity)
+
+    def reset_counts(self):
+        self.counter.reset_counts()
+
+    def get_health(self):
+        """Get the camera's health (see CameraManager.get_health)"""
+        return self.camera.get_health()
+
+class CameraRegistry:
+    """
+    All camera pipelines of this site, keyed by camera ID
+
+    Pipelines run independently (threads: CameraPipeline, or worker
+    processes: pipeline_workers.ProcessCameraPipeline); SiteTotals follows
+    every camera's counter events.
+    """
+
+    def __init__(self, pipelines):
+        """
+        Initialize registry
+
+        Args:
+            pipelines: CameraPipeline / ProcessCameraPipeline list (first = default camera)
+        """
+        self.site = SiteTotals()
+        self.pipelines = {pipeline.camera_id: pipeline for pipeline in pipelines}
+        self.listeners = []
+
+    @property
+    def default_camera_id(self):
+        """First configured camera (served by the legacy single-camera routes)"""
+        return next(iter(self.pipelines))
+
+    def camera_ids(self):
+        return list(self.pipelines)
+
+    def get(self, camera_id=None):
+        """
+        Get a camera's pipeline
+
+        Args:
+            camera_id: Camera ID (None = default camera)
+
+        Returns:
+            CameraPipeline or None if the camera is not configured
+        """
+        return self.pipelines.get(camera_id or self.default_camera_id)
+
+    def add_listener(self, callback):
+        """
+        Register a callback for counting events of any camera
+
+        Args:
+            callback: Function called as callback(camera_id, event)
+        """
+        self.listeners.append(callback)
+
+    def start(self):
+        """Attach site totals to every counter and start all pipelines"""
+        for camera_id, pipeline in self.pipelines.items():
+            self.site.set_camera(camera_id, pipeline.get_state()['counts'])
+            pipeline.add_listener(self._event_handler(camera_id))
+            pipeline.start()
+
+    def stop(self):
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+
+    def _event_handler(self, camera_id):
+        def on_event(event):
+            self.site.apply(camera_id, event)
+            for callback in self.listeners:
+                callback(camera_id, event)
+        return on_event
+
+    def get_health(self):
+        """
+        Get every camera's health
+
+        Returns:
+            dict: Camera ID -> health dict
+        """
+        return {camera_id: pipeline.get_health() for camera_id, pipeline in self.pipelines.items()}
@@ -0,0 +1,252 @@
+"""
+Config Manager
+In-memory SystemConfig cache with hot reload and change notification
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+from database import db, SystemConfig
+
+# Numeric settings the running services parse: key -> (type, minimum, maximum or None)
+NUMERIC_CONFIG = {
+    'PARKING_CAPACITY': (int, 1, None),
+    'DETECTION_CONFIDENCE': (float, 0.01, 1.0),
+    'DETECTION_COOLDOWN': (int, 0, None),
+    'DETECTION_CACHE_SIZE': (int, 1, None),
+    'DETECTION_CACHE_TTL': (float, 0, None),
+    'DETECTION_QUEUE_SIZE': (int, 1, None),
+    'ENTRY_GATE_PROBE_PORT': (int, 0, 65535),
+    'EXIT_GATE_PROBE_PORT': (int, 0, 65535),
+    'FORECAST_HALF_LIFE_WEEKS': (float, 0.1, None),
+    'FORECAST_REFRESH_SECONDS': (float, 0, None),
+    'INFERENCE_BUDGET_FPS': (float, 0, None),
+    'LANE_MIN_FPS': (float, 0.1, None),
+    'LANE_MAX_FPS': (float, 0.1, None),
+    'CAMERA_STALL_TIMEOUT': (float, 0.5, None),
+    'CAMERA_RECONNECT_MAX_BACKOFF': (float, 1, None),
+    'COUNTER_FLUSH_INTERVAL': (float, 0.05, None),
+    'COUNTER_CHECKPOINT_INTERVAL': (float, 1, None),
+}
+
+# Settings limited to a fixed set of values (matched case-insensitively)
+CHOICE_CONFIG = {
+    'ENABLE_ENTRY_GATE': ('true', 'false'),
+    'ENABLE_EXIT_GATE': ('true', 'false'),
+    'MODEL_RUNTIME': ('pytorch', 'onnx', 'openvino'),
+    'MODEL_PRECISION': ('fp32', 'fp16', 'int8'),
+    'DETECTION_CACHE': ('off', 'exact', 'perceptual'),
+    'PIPELINE_MODE': ('thread', 'process'),
+    'LOG_LEVEL': ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'),
+    'LOG_FORMAT': ('text', 'json'),
+}
+
+# (lower, upper) pairs that must stay ordered
+ORDERED_CONFIG = [('LANE_MIN_FPS', 'LANE_MAX_FPS')]
+
+def validate_config_value(key, value, current=None):
+    """
+    Check a setting against its expected type and range before it is stored
+
+    Keys without a rule are free text.
+
+    Args:
+        key: Config key
+        value: New value (string)
+        current: Optional mapping of the other current values (for ordered pairs)
+
+    Returns:
+        str: Normalized value to store
+
+    Raises:
+        ValueError: With a message fit for the settings page
+    """
+    if key in NUMERIC_CONFIG:
+        kind, minimum, maximum = NUMERIC_CONFIG[key]
+        try:
+            number = kind(value)
+        except ValueError:
+            raise ValueError(f"{key} must be {'an integer' if kind is int else 'a number'}")
+        if not math.isfinite(number) or number < minimum or (maximum is not None and number > maximum):
+            bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+            raise ValueError(f"{key} must be {bounds}")
+
+        for lower, upper in ORDERED_CONFIG:
+            if current is None or key not in (lower, upper):
+                continue
+            try:
+                other = float(current.get(upper if key == lower else lower))
+            except (TypeError, ValueError):
+                continue
+            if (number > other) if key == lower else (number < other):
+                raise ValueError(f"{lower} must not exceed {upper}")
+        return value
+
+    if key in CHOICE_CONFIG:
+        choices = CHOICE_CONFIG[key]
+        for choice in choices:
+            if value.lower() == choice.lower():
+                return choice
+        raise ValueError(f"{key} must be one of {', '.join(choices)}")
+
+    return value
+
+class ConfigCache:
+    """
+    Cached view of the system_config table
+
+    Reads are plain dictionary lookups, so hot loops can call the getters on
+    every frame. A background thread reloads the (tiny) table every
+    refresh_interval seconds and notifies subscribers of changed keys, which
+    also picks up edits made by other processes.
+    """
+
+    def __init__(self, app, refresh_interval=2.0):
+        """
+        Initialize config cache
+
+        Args:
+            app: Flask app bound to the parking database
+            refresh_interval: Seconds between reloads
+        """
+        self.app = app
+        self.refresh_interval = refresh_interval
+        self.values = {}
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.is_running = False
+        self.loaded = False
+
+    def load(self):
+        """
+        Reload all config rows and notify subscribers of changes
+
+        Returns:
+            dict: Changed keys mapped to (old, new) values
+        """
+        with self.app.app_context():
+            rows = db.session.query(SystemConfig.config_key, SystemConfig.config_value).all()
+            db.session.remove()
+
+        new_values = {key: value for key, value in rows}
+
+        with self.lock:
+            old_values = self.values
+            self.values = new_values
+            first_load = not self.loaded
+            self.loaded = True
+
+        if first_load:
+            return {}
+
+        changes = {
+            key: (old_values.get(key), new_values.get(key))
+            for key in set(old_values) | set(new_values)
+            if old_values.get(key) != new_values.get(key)
+        }
+        for key, (old, new) in changes.items():
+            self._notify(key, old, new)
+
+        return changes
+
+    def start(self):
+        """Load once and start the background reload thread"""
+        if not self.loaded:
+            self.load()
+
+        if self.is_running:
+            return
+
+        self.is_running = True
+        self.thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the background reload thread"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _refresh_loop(self):
+        """Reload config periodically"""
+        while self.is_running:
+            time.sleep(self.refresh_interval)
+            try:
+                self.load()
+            except Exception as e:
+                print(f"❌ Config reload error: {e}")
+
+    def subscribe(self, callback, keys=None):
+        """
+        Register a change callback
+
+        Args:
+            callback: Function called as callback(key, old_value, new_value)
+            keys: Iterable of keys to watch (None = all keys)
+        """
+        self.subscribers.append((callback, set(keys) if keys else None))
+
+    def _notify(self, key, old, new):
+        """Call subscribers watching key"""
+        for callback, keys in self.subscribers:
+            if keys is not None and key not in keys:
+                continue
+            try:
+                callback(key, old, new)
+            except Exception as e:
+                print(f"❌ Config subscriber error for {key}: {e}")
+
+    def set(self, key, value, description=None):
+        """
+        Persist a config value and apply it immediately in this process
+
+        Args:
+            key: Config key
+            value: New value (stored as string)
+            description: Optional description for new keys
+        """
+        with self.app.app_context():
+            config = SystemConfig.query.filter_by(config_key=key).first()
+            if config is None:
+                config = SystemConfig(config_key=key, config_value=str(value), description=description)
+                db.session.add(config)
+            else:
+                config.config_value = str(value)
+                config.updated_at = datetime.utcnow()
+            db.session.commit()
+
+        self.load()
+
+    def get(self, key, default=None):
+        """Get a raw string value"""
+        return self.values.get(key, default)
+
+    def get_int(self, key, default=0):
+        """Get an integer value"""
+        try:
+            return int(self.values[key])
+        except (KeyError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        """Get a float value"""
+        try:
+            return float(self.values[key])
+        except (KeyError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        """Get a boolean value ('true', '1', 'yes', 'on')"""
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return value.strip().lower() in ('true', '1', 'yes', 'on')
+
+    def get_camera_url(self, key, default=0):
+        """Get a camera source (numeric strings become webcam indexes)"""
+        value = self.values.get(key)
+        if value is None or value == '':
+            return default
+        return int(value) if value.strip().isdigit() else value
@@ -0,0 +1,272 @@
+"""
+Counter State
+Durable vehicle counter state: append-only event log, periodic checkpoints and recovery on startup
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import inspect, insert
+from sqlalchemy.exc import OperationalError
+from database import db, CounterEvent, CounterCheckpoint
+from metrics import registry, stage_timer
+from structured_logging import log_event
+
+logger = logging.getLogger('counter_state')
+
+COUNTER_EVENTS_PENDING = registry.gauge(
+    'parking_counter_events_pending', 'Counter events waiting to be written to the event log', ('source',))
+
+COUNTER_EVENTS_WRITTEN = registry.counter(
+    'parking_counter_events_written_total', 'Counter events written to the event log', ('source',))
+
+# Counter events that change the persisted state
+LOGGED_EVENTS = ('crossing', 'line', 'zone', 'reset')
+
+def ensure_counter_schema():
+    """Create the counter event log and checkpoint tables if missing"""
+    for model in (CounterEvent, CounterCheckpoint):
+        try:
+            model.__table__.create(db.engine, checkfirst=True)
+        except OperationalError:
+            # Another camera worker created it between the check and the CREATE
+            if not inspect(db.engine).has_table(model.__tablename__):
+                raise
+
+def empty_state():
+    """Counter state with no counts"""
+    return {'counts': {'IN': {}, 'OUT': {}}, 'zones': {}}
+
+def apply_event(state, event_type, zone=None, count_type=None, category=None):
+    """
+    Apply one logged counter event to a state dict (in place)
+
+    Mirrors VehicleCounter: crossings of the counting line add to the
+    overall counts and to their line, crossings of other lines ('line') and
+    zone transitions only to their zone, resets clear everything.
+
+    Args:
+        state: State dict (see empty_state)
+        event_type: 'crossing', 'line', 'zone' or 'reset'
+        zone: Line / polygon zone name
+        count_type: 'IN' or 'OUT'
+        category: Vehicle category
+    """
+    if event_type == 'reset':
+        state['counts'] = {'IN': {}, 'OUT': {}}
+        state['zones'] = {name: {'IN': {}, 'OUT': {}} for name in state['zones']}
+        return
+
+    zone_counts = state['zones'].setdefault(zone, {'IN': {}, 'OUT': {}})
+    zone_counts[count_type][category] = zone_counts[count_type].get(category, 0) + 1
+    if event_type == 'crossing':
+        counts = state['counts'][count_type]
+        counts[category] = counts.get(category, 0) + 1
+
+class CounterStateStore:
+    """
+    Persist a VehicleCounter's counts and restore them after a restart
+
+    Counting events are queued by a counter listener (the counting loop never
+    touches the database) and a writer thread appends them to the event log in
+    batches. Every checkpoint_interval the writer stores a checkpoint: the
+    state covering the log up to a given event id. On startup the checkpoint
+    is loaded and only the events logged after it are replayed.
+    """
+
+    def __init__(self, app, counter, flush_interval=1.0, checkpoint_interval=30.0, batch_size=500):
+        """
+        Initialize store
+
+        Args:
+            app: Flask app (for the database context)
+            counter: VehicleCounter to persist (its camera_id keys the stored state)
+            flush_interval: Maximum seconds an event waits before being written
+            checkpoint_interval: Seconds between checkpoints (bounds replay on startup)
+            batch_size: Maximum events written per transaction
+        """
+        self.app = app
+        self.counter = counter
+        self.camera_id = counter.camera_id
+        self.flush_interval = flush_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.batch_size = batch_size
+
+        self.events = queue.SimpleQueue()
+        self.pending = []  # events taken from the queue but not yet committed
+        self.state = empty_state()  # state covering the log up to last_event_id
+        self.last_event_id = 0
+        self.checkpointed_id = 0
+        self.last_checkpoint = time.monotonic()
+
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+        self.flush_seconds = stage_timer('counter_flush', self.camera_id)
+        self.events_written = COUNTER_EVENTS_WRITTEN.labels(source=self.camera_id)
+        COUNTER_EVENTS_PENDING.labels(source=self.camera_id).set_function(
+            lambda: self.events.qsize() + len(self.pending))
+
+    def recover(self):
+        """
+        Load the latest checkpoint, replay later events and restore the counter
+
+        Returns:
+            int: Number of events replayed on top of the checkpoint
+        """
+        with self.app.app_context():
+            ensure_counter_schema()
+
+            checkpoint = CounterCheckpoint.query.filter_by(camera_id=self.camera_id).first()
+            state = json.loads(checkpoint.state) if checkpoint else empty_state()
+            last_event_id = checkpoint.last_event_id if checkpoint else 0
+
+            replayed = 0
+            rows = db.session.query(
+                CounterEvent.id, CounterEvent.event_type, CounterEvent.zone,
+                CounterEvent.count_type, CounterEvent.category
+            ).filter(
+                CounterEvent.camera_id == self.camera_id,
+                CounterEvent.id > last_event_id
+            ).order_by(CounterEvent.id).yield_per(1000)
+
+            for event_id, event_type, zone, count_type, category in rows:
+                apply_event(state, event_type, zone, count_type, category)
+                last_event_id = event_id
+                replayed += 1
+
+        self.state = state
+        self.last_event_id = last_event_id
+        self.checkpointed_id = checkpoint.last_event_id if checkpoint else 0
+        self.counter.restore_state(state)
+
+        if replayed:
+            self._checkpoint()
+
+        log_event(logger, logging.INFO, 'counter_state.recovered',
+                  f"✅ Restored {self.camera_id} counts ({replayed} events replayed)",
+                  camera=self.camera_id, replayed=replayed, last_event_id=last_event_id)
+        return replayed
+
+    def start(self):
+        """Recover the counter, then log its events from a background writer thread"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.recover()
+            self.counter.add_listener(self._on_event)
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._writer_loop, daemon=True,
+                                           name=f'counter-state-{self.camera_id}')
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Write queued events and a final checkpoint, then stop the writer"""
+        with self.lock:
+            if self.thread is None:
+                return
+            self.stop_event.set()
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def _on_event(self, event):
+        """Counter listener: only enqueues (runs on the counting loop)"""
+        if event.get('type') in LOGGED_EVENTS:
+            self.events.put(event)
+
+    def _writer_loop(self):
+        """Write batches every flush_interval and checkpoints every checkpoint_interval"""
+        while not self.stop_event.wait(self.flush_interval):
+            self._drain()
+
+            if (self.last_event_id != self.checkpointed_id
+                    and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval):
+                self._checkpoint()
+
+        self._drain()
+        if self.last_event_id != self.checkpointed_id:
+            self._checkpoint()
+
+    def _drain(self):
+        """Write everything queued so far, batch_size events per transaction"""
+        while True:
+            while len(self.pending) < self.batch_size:
+                try:
+                    self.pending.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not self.pending or not self._flush():
+                return
+
+    def _flush(self):
+        """
+        Append pending events to the log in one transaction
+
+        Returns:
+            bool: True if written (on failure the events stay pending and are retried)
+        """
+        start = time.perf_counter()
+        rows = [dict(
+            camera_id=self.camera_id,
+            event_type=event['type'],
+            zone=event.get('zone'),
+            count_type=event.get('count_type'),
+            category=event.get('category'),
+            direction=event.get('direction'),
+            track_id=event.get('track_id'),
+            event_datetime=event.get('timestamp') or datetime.now()
+        ) for event in self.pending]
+
+        try:
+            with self.app.app_context():
+                # One multi-row INSERT ... RETURNING; ORM objects would be flushed row by row
+                # and reloaded one SELECT each after commit
+                event_ids = db.session.execute(insert(CounterEvent).returning(CounterEvent.id), rows).scalars().all()
+                db.session.commit()
+        except Exception as e:
+            log_event(logger, logging.ERROR, 'counter_state.flush_failed',
+                      f"❌ Counter event log write failed: {e}", rate_limit=30, rate_key=self.camera_id,
+                      camera=self.camera_id, pending=len(self.pending))
+            with self.app.app_context():
+                db.session.rollback()
+            return False
+
+        for event in self.pending:
+            apply_event(self.state, event['type'], event.get('zone'), event.get('count_type'),
+                        event.get('category'))
+        self.last_event_id = max(event_ids)
+
+        self.events_written.inc(len(self.pending))
+        self.pending = []
+        self.flush_seconds.observe(time.perf_counter() - start)
+        return True
+
+    def _checkpoint(self):
+        """Store the state covering the log up to last_event_id"""
+        try:
+            with self.app.app_context():
+                checkpoint = CounterCheckpoint.query.filter_by(camera_id=self.camera_id).first()
+                if checkpoint is None:
+                    checkpoint = CounterCheckpoint(camera_id=self.camera_id)
+                    db.session.add(checkpoint)
+                checkpoint.last_event_id = self.last_event_id
+                checkpoint.state = json.dumps(self.state)
+                db.session.commit()
+        except Exception as e:
+            log_event(logger, logging.ERROR, 'counter_state.checkpoint_failed',
+                      f"❌ Counter checkpoint failed: {e}", rate_limit=30, rate_key=self.camera_id,
+                      camera=self.camera_id)
+            return
+
+        self.checkpointed_id = self.last_event_id
+        self.last_checkpoint = time.monotonic()
+        log_event(logger, logging.DEBUG, 'counter_state.checkpoint',
+                  f"Checkpointed {self.camera_id} at event {self.last_event_id}",
+                  camera=self.camera_id, last_event_id=self.last_event_id)
@@ -3,11 +3,34 @@ Database Models for Vehicle Parking Management System
 Uses SQLAlchemy ORM with SQLite database
 """
 
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import os
 
 db = SQLAlchemy()
 
+DATABASE_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'parking_system.db')
+
+def create_db_app(name=__name__):
+    """
+    Create a minimal Flask app bound to the parking database
+    
+    Used by scripts and background services that need database access
+    without importing the full web application.
+    
+    Args:
+        name: Flask import name
+        
+    Returns:
+        Flask: App with the database extension initialized
+    """
+    app = Flask(name)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DATABASE_PATH}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
 class VehicleCategory(db.Model):
     """Vehicle category mapping table"""
     __tablename__ = 'vehicle_categories'
@@ -29,7 +52,7 @@ class VehicleEntry(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('vehicle_categories.id'), nullable=False)
     original_class = db.Column(db.String(50), nullable=False)  # Detected class
     display_category = db.Column(db.String(50), nullable=False)  # Display category
-    entry_datetime = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    entry_datetime = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     entry_image_path = db.Column(db.String(500))
     detection_confidence = db.Column(db.Float)
     gate_id = db.Column(db.String(50), default='ENTRY_GATE_1')
@@ -49,8 +72,8 @@ class VehicleExit(db.Model):
     __tablename__ = 'vehicle_exits'
     
     id = db.Column(db.Integer, primary_key=True)
-    entry_id = db.Column(db.Integer, db.ForeignKey('vehicle_entries.id'), nullable=False)
-    exit_datetime = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    entry_id = db.Column(db.Integer, db.ForeignKey('vehicle_entries.id'), nullable=False, index=True)
+    exit_datetime = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     exit_image_path = db.Column(db.String(500))
     duration_minutes = db.Column(db.Integer)
     gate_id = db.Column(db.String(50), default='EXIT_GATE_1')
@@ -136,4 +159,92 @@ class DailyStats(db.Model):
     __table_args__ = (db.UniqueConstraint('stat_date', 'category', name='_date_category_uc'),)
     
     def __repr__(self):
-        return f'<DailyStats {self.stat_date} - {self.category}>'
\ No newline at end of file
+        return f'<DailyStats {self.stat_date} - {self.category}>'
+
+class ArchivePartition(db.Model):
+    """Registry of monthly archive partitions for entry/exit logs"""
+    __tablename__ = 'archive_partitions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    base_table = db.Column(db.String(50), nullable=False)  # vehicle_entries, vehicle_exits
+    table_name = db.Column(db.String(100), unique=True, nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    row_count = db.Column(db.Integer, default=0)
+    min_datetime = db.Column(db.DateTime)
+    max_datetime = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('base_table', 'year', 'month', name='_partition_month_uc'),)
+    
+    def __repr__(self):
+        return f'<ArchivePartition {self.table_name} ({self.row_count} rows)>'
+
+class CounterEvent(db.Model):
+    """Append-only log of line crossings, zone transitions and resets of the live vehicle counters"""
+    __tablename__ = 'counter_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    camera_id = db.Column(db.String(50), nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)  # crossing (counting line), line, zone, reset
+    zone = db.Column(db.String(100))
+    count_type = db.Column(db.String(10))  # IN, OUT
+    category = db.Column(db.String(50))
+    direction = db.Column(db.String(10))  # LEFT, RIGHT, UP, DOWN
+    track_id = db.Column(db.Integer)
+    event_datetime = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # Recovery replays one camera's events after its checkpoint
+    __table_args__ = (db.Index('ix_counter_events_camera_id_id', 'camera_id', 'id'),)
+    
+    def __repr__(self):
+        return f'<CounterEvent {self.id} {self.camera_id} {self.event_type} {self.count_type}>'
+
+class CounterCheckpoint(db.Model):
+    """Latest counter state per camera, covering events up to last_event_id"""
+    __tablename__ = 'counter_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    camera_id = db.Column(db.String(50), unique=True, nullable=False)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    state = db.Column(db.Text, nullable=False)  # JSON: line and zone counts
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CounterCheckpoint {self.camera_id} @ {self.last_event_id}>'
+
+class ImageDetection(db.Model):
+    """Vehicle detected in an archived image by the batch ingest CLI (batch_ingest.py)"""
+    __tablename__ = 'image_detections'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(100), nullable=False, index=True)
+    image_path = db.Column(db.String(500), nullable=False, index=True)
+    image_time = db.Column(db.DateTime, index=True)  # File modification time
+    image_width = db.Column(db.Integer)
+    image_height = db.Column(db.Integer)
+    class_id = db.Column(db.Integer)
+    original_class = db.Column(db.String(50))
+    display_category = db.Column(db.String(50))
+    confidence = db.Column(db.Float)
+    x1 = db.Column(db.Float)
+    y1 = db.Column(db.Float)
+    x2 = db.Column(db.Float)
+    y2 = db.Column(db.Float)
+    parking_applicable = db.Column(db.Boolean, default=False)
+    
+    def __repr__(self):
+        return f'<ImageDetection {self.image_path} {self.display_category}>'
+
+class IngestCheckpoint(db.Model):
+    """Progress of a batch ingest job (last image committed), for resuming"""
+    __tablename__ = 'ingest_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job = db.Column(db.String(100), unique=True, nullable=False)
+    state = db.Column(db.Text, nullable=False)  # JSON: last path and totals
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<IngestCheckpoint {self.job}>'
\ No newline at end of file
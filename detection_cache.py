@@ -0,0 +1,162 @@
+"""
+Detection Cache
+LRU/TTL cache of detection results keyed by image hash, model version and confidence threshold
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from itertools import islice
+import cv2
+import numpy as np
+from metrics import registry
+from structured_logging import log_event
+
+logger = logging.getLogger('detection_cache')
+
+DETECTION_CACHE_LOOKUPS = registry.counter(
+    'parking_detection_cache_lookups_total', 'Detection cache lookups by result (hit/miss)', ('source', 'result'))
+
+DETECTION_CACHE_ENTRIES = registry.gauge(
+    'parking_detection_cache_entries', 'Results held in the detection cache', ('source',))
+
+CACHE_MODES = ('off', 'exact', 'perceptual')
+
+# Perceptual matching compares grayscale thumbnails this wide; frames whose
+# thumbnails differ by at most PERCEPTUAL_TOLERANCE grey levels anywhere are
+# the same scene (sensor noise and re-encoding stay within 1-2 levels, a
+# vehicle moving a few pixels does not)
+PERCEPTUAL_WIDTH = 64
+PERCEPTUAL_TOLERANCE = 3
+
+# Most recently used entries compared on an inexact lookup
+PERCEPTUAL_CANDIDATES = 32
+
+CacheKey = namedtuple('CacheKey', ['id', 'thumbnail'])
+
+def exact_digest(image):
+    """Hash of the exact pixel bytes"""
+    image = np.ascontiguousarray(image)
+    return hashlib.blake2b(memoryview(image).cast('B'), digest_size=16).digest()
+
+def perceptual_thumbnail(image, width=PERCEPTUAL_WIDTH):
+    """Small grayscale copy used for perceptual matching"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height = max(1, round(width * gray.shape[0] / gray.shape[1]))
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+class DetectionCache:
+    """
+    Thread-safe LRU cache of detections with a time-to-live
+
+    Keys combine the image fingerprint, the image shape, the model version
+    and the confidence threshold, so a model reload or a threshold change
+    never serves stale results. 'exact' mode matches identical pixels
+    (re-uploads, re-analysis); 'perceptual' mode additionally lets lookups
+    that ask for it match a visually unchanged image. Only uploads ask:
+    live frames feed trackers and gate logging, so they always match
+    exactly, however the cache is configured.
+    """
+
+    def __init__(self, mode='exact', max_entries=1024, ttl=300.0, metrics_source='detector'):
+        """
+        Initialize cache
+
+        Args:
+            mode: 'exact' or 'perceptual' (similar-image lookups allowed) matching
+            max_entries: Results kept before the least recently used is evicted
+            ttl: Seconds a result stays valid
+            metrics_source: Source label for hit/miss metrics
+        """
+        if mode not in CACHE_MODES[1:]:
+            raise ValueError(f"Unknown detection cache mode: {mode}")
+        self.mode = mode
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key id -> (expires, detections, thumbnail)
+        self.lock = threading.Lock()
+        self.hits = DETECTION_CACHE_LOOKUPS.labels(source=metrics_source, result='hit')
+        self.misses = DETECTION_CACHE_LOOKUPS.labels(source=metrics_source, result='miss')
+        DETECTION_CACHE_ENTRIES.labels(source=metrics_source).set_function(lambda: len(self.entries))
+
+    def key(self, image, model_version, confidence_threshold, similar=False):
+        """
+        Cache key for an image under the current model and threshold
+
+        Args:
+            image: OpenCV image
+            model_version: Identifier of the loaded weights
+            confidence_threshold: Threshold the detections were filtered at
+            similar: Also match visually unchanged images (perceptual mode only)
+        """
+        context = (image.shape, model_version, round(confidence_threshold, 4))
+        if similar and self.mode == 'perceptual':
+            thumbnail = perceptual_thumbnail(image)
+            return CacheKey((context, thumbnail.tobytes()), thumbnail)
+        return CacheKey((context, exact_digest(image)), None)
+
+    def _nearest(self, key, now):
+        """Most recently used live entry whose thumbnail matches key's (lock held)"""
+        context = key.id[0]
+        for entry_id, (expires, _, thumbnail) in islice(reversed(self.entries.items()), PERCEPTUAL_CANDIDATES):
+            if (entry_id[0] == context and expires > now and thumbnail is not None and
+                    np.abs(thumbnail - key.thumbnail).max() <= PERCEPTUAL_TOLERANCE):
+                return entry_id
+        return None
+
+    def get(self, key):
+        """
+        Look up detections
+
+        Returns:
+            list: Copy of the cached detections, or None on a miss
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry_id = key.id
+            entry = self.entries.get(entry_id)
+            if entry is not None and entry[0] <= now:
+                del self.entries[entry_id]
+                entry = None
+            if entry is None and key.thumbnail is not None:
+                entry_id = self._nearest(key, now)
+                entry = self.entries[entry_id] if entry_id is not None else None
+            if entry is not None:
+                self.entries.move_to_end(entry_id)
+                self.hits.inc()
+                return [dict(det, bbox=list(det['bbox'])) for det in entry[1]]
+        self.misses.inc()
+        return None
+
+    def put(self, key, detections):
+        """Store detections (a copy) under key"""
+        stored = [dict(det, bbox=list(det['bbox'])) for det in detections]
+        with self.lock:
+            self.entries[key.id] = (time.monotonic() + self.ttl, stored, key.thumbnail)
+            self.entries.move_to_end(key.id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result"""
+        with self.lock:
+            self.entries.clear()
+
+def create_detection_cache(config, metrics_source='detector'):
+    """
+    Create the detection cache configured by DETECTION_CACHE, DETECTION_CACHE_SIZE and DETECTION_CACHE_TTL
+
+    Returns:
+        DetectionCache or None when caching is off
+    """
+    mode = (config.get('DETECTION_CACHE', 'exact') or 'off').lower()
+    if mode not in CACHE_MODES:
+        log_event(logger, logging.WARNING, 'detection.invalid_cache_mode',
+                  f"⚠️  Unknown DETECTION_CACHE {mode!r}, caching disabled", mode=mode)
+        mode = 'off'
+    if mode == 'off':
+        return None
+    return DetectionCache(mode, max_entries=config.get_int('DETECTION_CACHE_SIZE', 1024),
+                          ttl=config.get_float('DETECTION_CACHE_TTL', 300.0), metrics_source=metrics_source)
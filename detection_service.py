@@ -3,12 +3,18 @@ Vehicle Detection Service
 Handles all vehicle detection, classification, and parking logic
 """
 
-from ultralytics import YOLO
 import cv2
+import logging
 import numpy as np
 from datetime import datetime
 import os
+import time
 from pathlib import Path
+from model_runtime import resolve_model_path
+from metrics import stage_timer, DETECTIONS_TOTAL
+from structured_logging import log_event
+
+logger = logging.getLogger('detection_service')
 
 class VehicleDetectionService:
     """Service for detecting and classifying vehicles"""
@@ -26,44 +32,86 @@ class VehicleDetectionService:
     # Classes that get parking (only cars)
     PARKING_CLASSES = ['car']
     
-    def __init__(self, model_path, confidence_threshold=0.5):
+    def __init__(self, model_path, confidence_threshold=0.5, runtime='pytorch', precision='fp32',
+                 metrics_source='detector', cache=None):
         """
         Initialize detection service
         
         Args:
-            model_path: Path to trained YOLO model
+            model_path: Path to trained YOLO model (.pt)
             confidence_threshold: Minimum confidence for detections
+            runtime: Inference runtime ('pytorch', 'onnx' or 'openvino')
+            precision: Exported model precision ('fp32', 'fp16' or 'int8')
+            metrics_source: Source label for latency metrics (gate or camera name)
+            cache: Optional DetectionCache for repeated images
         """
         self.model_path = model_path
         self.confidence_threshold = confidence_threshold
+        self.runtime = runtime
+        self.precision = precision
         self.model = None
+        self.model_version = None
+        self.cache = cache
         self.class_names = ['bus', 'car', 'microbus', 'motorbike', 'pickup-van', 'truck']
         
+        # Metrics
+        self.metrics_source = metrics_source
+        self.inference_seconds = stage_timer('inference', metrics_source)
+        self.postprocess_seconds = stage_timer('postprocess', metrics_source)
+        self.image_save_seconds = stage_timer('image_save', metrics_source)
+        
         # Create uploads directory for saving detection images
         self.uploads_dir = Path('uploads')
         self.uploads_dir.mkdir(exist_ok=True)
         
         print(f"🚗 Vehicle Detection Service initialized")
         print(f"   Model: {model_path}")
+        print(f"   Runtime: {runtime} ({precision})")
         print(f"   Confidence threshold: {confidence_threshold}")
     
     def load_model(self):
         """Load the YOLO model"""
         try:
-            print(f"\n📥 Loading model from {self.model_path}...")
-            self.model = YOLO(self.model_path)
+            # Imported here so importing this module stays cheap (torch is heavy)
+            from ultralytics import YOLO
+            
+            resolved_path = resolve_model_path(self.model_path, self.runtime, self.precision)
+            print(f"\n📥 Loading model from {resolved_path}...")
+            self.model = YOLO(resolved_path, task='detect')
+            # Cached detections are only reused for the same weights file
+            self.model_version = f"{resolved_path}@{os.path.getmtime(resolved_path):.0f}"
             print(f"✅ Model loaded successfully!")
             return True
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             return False
     
-    def detect_vehicles(self, image):
+    def warmup(self, runs=2, image_shape=(1080, 1920, 3)):
+        """
+        Run throwaway inferences so the first real frame is not slow
+        
+        Args:
+            runs: Number of warm-up inferences
+            image_shape: Shape of the blank warm-up frame
+            
+        Returns:
+            float: Seconds spent warming up
+        """
+        start = time.perf_counter()
+        blank = np.zeros(image_shape, dtype=np.uint8)
+        for _ in range(runs):
+            self.detect_vehicles(blank)
+        elapsed = time.perf_counter() - start
+        print(f"🔥 Model warmed up ({runs} runs, {elapsed:.2f}s)")
+        return elapsed
+    
+    def detect_vehicles(self, image, similar=False):
         """
         Detect vehicles in an image
         
         Args:
             image: OpenCV image (numpy array)
+            similar: Allow a perceptual cache hit on a visually unchanged image (uploads only)
             
         Returns:
             list: List of detection dictionaries
@@ -72,47 +120,182 @@ class VehicleDetectionService:
             if not self.load_model():
                 return []
         
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(image, self.model_version, self.confidence_threshold, similar)
+            detections = self.cache.get(key)
+            if detections is not None:
+                self._count_detections(detections)
+                return detections
+        
         try:
             # Run inference
-            results = self.model(image, conf=self.confidence_threshold, verbose=False)
+            with self.inference_seconds.time():
+                results = self.model(image, conf=self.confidence_threshold, verbose=False)
             
             detections = []
             
             # Process detections
-            for result in results:
-                boxes = result.boxes
-                
-                for box in boxes:
-                    # Get detection details
-                    class_id = int(box.cls[0])
-                    confidence = float(box.conf[0])
-                    bbox = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
-                    
-                    # Get class name
-                    original_class = self.class_names[class_id]
-                    display_category = self.CLASS_MAPPING.get(original_class, 'Unknown')
-                    
-                    # Check if parking applicable
-                    parking_applicable = original_class in self.PARKING_CLASSES
-                    
-                    detection = {
-                        'class_id': class_id,
-                        'original_class': original_class,
-                        'display_category': display_category,
-                        'confidence': confidence,
-                        'bbox': bbox.tolist(),
-                        'parking_applicable': parking_applicable
-                    }
-                    
-                    detections.append(detection)
+            with self.postprocess_seconds.time():
+                for result in results:
+                    detections.extend(self._parse_result(result))
             
+            if key is not None:
+                self.cache.put(key, detections)
+            self._count_detections(detections)
             return detections
             
         except Exception as e:
-            print(f"❌ Detection error: {e}")
+            log_event(logger, logging.ERROR, 'detection.error', f"❌ Detection error: {e}",
+                      rate_limit=10, source=self.metrics_source)
+            return []
+    
+    def detect_vehicles_batch(self, images, similar=None):
+        """
+        Detect vehicles in several images with one batched inference call
+        
+        Args:
+            images: List of OpenCV images
+            similar: Optional per-image flags allowing perceptual cache hits (see detect_vehicles)
+            
+        Returns:
+            list: One list of detection dictionaries per image
+        """
+        if not images:
             return []
+        
+        if self.model is None:
+            if not self.load_model():
+                return [[] for _ in images]
+        
+        images = list(images)
+        similar = list(similar) if similar is not None else [False] * len(images)
+        batch_detections = [None] * len(images)
+        keys = [None] * len(images)
+        if self.cache is not None:
+            for index, image in enumerate(images):
+                keys[index] = self.cache.key(image, self.model_version, self.confidence_threshold,
+                                             similar[index])
+                batch_detections[index] = self.cache.get(keys[index])
+        misses = [index for index, detections in enumerate(batch_detections) if detections is None]
+        
+        try:
+            if misses:
+                with self.inference_seconds.time():
+                    results = self.model([images[index] for index in misses], conf=self.confidence_threshold,
+                                         verbose=False)
+                
+                with self.postprocess_seconds.time():
+                    for index, result in zip(misses, results):
+                        batch_detections[index] = self._parse_result(result)
+                        if keys[index] is not None:
+                            self.cache.put(keys[index], batch_detections[index])
+            
+            for detections in batch_detections:
+                self._count_detections(detections)
+            return batch_detections
+            
+        except Exception as e:
+            # Fixed-batch exports reject batches; fall back to one call per image
+            log_event(logger, logging.WARNING, 'detection.batch_failed',
+                      f"⚠️  Batched detection failed ({e}), running images one by one",
+                      rate_limit=60, source=self.metrics_source, batch_size=len(images))
+            return [self.detect_vehicles(image, flag) for image, flag in zip(images, similar)]
     
-    def save_detection_image(self, image, detections, prefix='detection'):
+    def _parse_result(self, result):
+        """
+        Convert one model result into detection dictionaries
+        
+        Args:
+            result: Ultralytics result for a single image
+            
+        Returns:
+            list: List of detection dictionaries
+        """
+        detections = []
+        
+        for box in result.boxes:
+            # Get detection details
+            class_id = int(box.cls[0])
+            confidence = float(box.conf[0])
+            bbox = box.xyxy[0].cpu().numpy()  # [x1, y1, x2, y2]
+            
+            # Get class name
+            original_class = self.class_names[class_id]
+            display_category = self.CLASS_MAPPING.get(original_class, 'Unknown')
+            
+            # Check if parking applicable
+            parking_applicable = original_class in self.PARKING_CLASSES
+            
+            detection = {
+                'class_id': class_id,
+                'original_class': original_class,
+                'display_category': display_category,
+                'confidence': confidence,
+                'bbox': bbox.tolist(),
+                'parking_applicable': parking_applicable
+            }
+            
+            detections.append(detection)
+        
+        return detections
+    
+    def _count_detections(self, detections):
+        """Update per-category detection counters"""
+        for det in detections:
+            DETECTIONS_TOTAL.labels(source=self.metrics_source, category=det['display_category']).inc()
+    
+    def annotate_detections(self, image, detections):
+        """
+        Draw detection boxes and labels
+        
+        Args:
+            image: OpenCV image (not modified)
+            detections: List of detection dictionaries
+            
+        Returns:
+            numpy.ndarray: Annotated copy of the image
+        """
+        annotated = image.copy()
+        
+        # Colors for different categories
+        colors = {
+            'Bus': (0, 255, 255),      # Yellow
+            'Car': (0, 255, 0),        # Green
+            '2-Wheeler': (255, 0, 0),  # Blue
+            'Truck': (0, 165, 255)     # Orange
+        }
+        
+        for det in detections:
+            bbox = det['bbox']
+            x1, y1, x2, y2 = map(int, bbox)
+            
+            category = det['display_category']
+            confidence = det['confidence']
+            
+            # Get color
+            color = colors.get(category, (255, 255, 255))
+            
+            # Draw rectangle
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+            
+            # Draw label
+            label = f"{category} {confidence:.2f}"
+            label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            
+            # Draw label background
+            cv2.rectangle(annotated, 
+                        (x1, y1 - label_size[1] - 10),
+                        (x1 + label_size[0], y1),
+                        color, -1)
+            
+            # Draw label text
+            cv2.putText(annotated, label, (x1, y1 - 5),
+                      cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+        
+        return annotated
+    
+    def save_detection_image(self, image, detections, prefix='detection', filepath=None):
         """
         Save image with detection annotations
         
@@ -120,58 +303,31 @@ class VehicleDetectionService:
             image: OpenCV image
             detections: List of detection dictionaries
             prefix: Filename prefix
+            filepath: Output .jpg path (default: uploads/<prefix>_<timestamp>.jpg)
             
         Returns:
             str: Saved image path
         """
         try:
-            # Create annotated image
-            annotated = image.copy()
-            
-            # Colors for different categories
-            colors = {
-                'Bus': (0, 255, 255),      # Yellow
-                'Car': (0, 255, 0),        # Green
-                '2-Wheeler': (255, 0, 0),  # Blue
-                'Truck': (0, 165, 255)     # Orange
-            }
-            
-            for det in detections:
-                bbox = det['bbox']
-                x1, y1, x2, y2 = map(int, bbox)
-                
-                category = det['display_category']
-                confidence = det['confidence']
-                
-                # Get color
-                color = colors.get(category, (255, 255, 255))
-                
-                # Draw rectangle
-                cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-                
-                # Draw label
-                label = f"{category} {confidence:.2f}"
-                label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                
-                # Draw label background
-                cv2.rectangle(annotated, 
-                            (x1, y1 - label_size[1] - 10),
-                            (x1 + label_size[0], y1),
-                            color, -1)
-                
-                # Draw label text
-                cv2.putText(annotated, label, (x1, y1 - 5),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+            annotated = self.annotate_detections(image, detections)
             
-            # Generate filename
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-            filename = f"{prefix}_{timestamp}.jpg"
-            filepath = self.uploads_dir / filename
+            if filepath is None:
+                # Generate filename
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
+                filepath = self.uploads_dir / f"{prefix}_{timestamp}.jpg"
+            filepath = str(filepath)
             
-            # Save image
-            cv2.imwrite(str(filepath), annotated)
+            # Save image (renamed into place, so readers never see a partial file)
+            with self.image_save_seconds.time():
+                ok, buffer = cv2.imencode('.jpg', annotated)
+                if not ok:
+                    raise ValueError("JPEG encoding failed")
+                temp_path = f"{filepath}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(buffer)
+                os.replace(temp_path, filepath)
             
-            return str(filepath)
+            return filepath
             
         except Exception as e:
             print(f"❌ Error saving detection image: {e}")
@@ -4,20 +4,29 @@ Monitors exit camera and processes vehicle exits
 """
 
 import cv2
+import importlib
+import logging
 import time
-from datetime import datetime
+import threading
+from gate_startup import StartupTimer, ReadinessProbe, run_parallel, wait_for_camera
 from camera_manager import CameraManager
-from detection_service import VehicleDetectionService
-from flask import Flask
-from database import db
+from inference_server import create_detection_service
+from inference_scheduler import create_inference_scheduler, lane_limits
+from config_manager import ConfigCache
+from metrics import stage_timer, GATE_EVENTS
+from structured_logging import log_event, setup_logging_from_config
+from database import create_db_app
 import sys
 import os
 
 # Add application path to sys.path
 sys.path.insert(0, os.path.dirname(__file__))
 
-# Import app functions
-from app import log_vehicle_exit
+logger = logging.getLogger('exit_gate_service')
+
+def _import_log_vehicle_exit():
+    """Import the web app (Flask routes and all) only for its logging function"""
+    return importlib.import_module('app').log_vehicle_exit
 
 def run_exit_gate_service():
     """Main exit gate service"""
@@ -26,45 +35,109 @@ def run_exit_gate_service():
     print("EXIT GATE SERVICE")
     print("=" * 70)
     
+    timer = StartupTimer()
+    
+    # Flask app for database access and live configuration (system_config table)
+    with timer.phase('config'):
+        app = create_db_app(__name__)
+        config = ConfigCache(app)
+        config.start()
+        setup_logging_from_config(config)
+    
+    probe = ReadinessProbe('EXIT_GATE_1', config.get_int('EXIT_GATE_PROBE_PORT', 8082), timer)
+    probe.start()
+    
     # Configuration
-    CAMERA_URL = 0  # Use 0 for webcam, or RTSP URL for IP camera
+    CAMERA_URL = config.get_camera_url('EXIT_CAMERA_URL', default=0)  # 0 for webcam, or RTSP URL for IP camera
     MODEL_PATH = "best.pt"
-    DETECTION_COOLDOWN = 5  # Seconds between detections
     
     print(f"\n⚙️  Configuration:")
-    print(f"   Camera: {CAMERA_URL}")
-    print(f"   Model: {MODEL_PATH}")
-    print(f"   Cooldown: {DETECTION_COOLDOWN}s")
-    
-    # Initialize camera
-    camera = CameraManager(CAMERA_URL, 'EXIT_GATE_1')
+    print(f"Camera: {CAMERA_URL}")
+    print(f"Model: {MODEL_PATH} ({config.get('MODEL_RUNTIME', 'pytorch')} {config.get('MODEL_PRECISION', 'fp32')})")
+    print(f"Confidence: {config.get_float('DETECTION_CONFIDENCE', 0.5)}")
+    print(f"Cooldown: {config.get_int('DETECTION_COOLDOWN', 5)}s")
+    min_fps, max_fps = lane_limits(config)
+    print(f"Inference rate: {min_fps:g} FPS idle, up to {max_fps:g} FPS with vehicles")
     
-    if not camera.connect():
-        print("\n❌ Failed to connect to camera")
-        return
+    # Initialize camera and detection service (local model, or the shared inference server)
+    camera = CameraManager(
+        CAMERA_URL, 'EXIT_GATE_1',
+        stall_timeout=config.get_float('CAMERA_STALL_TIMEOUT', 5.0),
+        max_backoff=config.get_float('CAMERA_RECONNECT_MAX_BACKOFF', 30.0)
+    )
     
-    # Initialize detection service
-    if not os.path.exists(MODEL_PATH):
+    if not config.get('INFERENCE_SERVER', '') and not os.path.exists(MODEL_PATH):
         print(f"\n❌ Model not found: {MODEL_PATH}")
         print("   Please copy best.pt from training/runs/detect/vehicle_detection_v1/weights/")
+        return
+    
+    detection_service = create_detection_service(MODEL_PATH, config, metrics_source='EXIT_GATE_1')
+    db_commit_seconds = stage_timer('db_commit', 'EXIT_GATE_1')
+    
+    # Connect camera, load model and import the app concurrently
+    startup = run_parallel({
+        'camera_connect': camera.connect,
+        'model_load': detection_service.load_model,
+        'app_import': _import_log_vehicle_exit
+    }, timer)
+    
+    camera_ok, camera_error = startup['camera_connect']
+    model_ok, model_error = startup['model_load']
+    log_vehicle_exit, import_error = startup['app_import']
+    
+    if not model_ok:
+        print(f"\n❌ Failed to load model {model_error or ''}")
+        probe.set_ready(False, 'model load failed')
         camera.disconnect()
         return
     
-    detection_service = VehicleDetectionService(MODEL_PATH, confidence_threshold=0.5)
-    if not detection_service.load_model():
-        print("\n❌ Failed to load model")
+    if import_error:
+        print(f"\n❌ Failed to import app: {import_error}")
+        probe.set_ready(False, 'app import failed')
         camera.disconnect()
         return
     
-    # Initialize Flask app for database access
-    app = Flask(__name__)
-    basedir = os.path.abspath(os.path.dirname(__file__))
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "parking_system.db")}'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db.init_app(app)
+    # Pay one-time inference initialization before reporting ready
+    with timer.phase('warmup'):
+        detection_service.warmup()
+    
+    # A camera that is not up yet is retried; only model/import failures end the gate
+    if not camera_ok:
+        print(f"\n⚠️  Camera not available yet {camera_error or ''}")
+        try:
+            wait_for_camera(camera, probe, lambda: config.get_camera_url('EXIT_CAMERA_URL', default=0))
+        except KeyboardInterrupt:
+            print("\n\n⏹️  Stopping exit gate service...")
+            probe.set_ready(False, 'stopped')
+            config.stop()
+            return
+    
+    def on_config_change(key, old_value, new_value):
+        """Apply retuned settings to the running gate"""
+        print(f"\n🔄 Config changed: {key} = {new_value}")
+        if key == 'EXIT_CAMERA_URL':
+            # Reopen in the background; the loop keeps using the old stream meanwhile
+            threading.Thread(
+                target=camera.switch_source, args=(config.get_camera_url(key),), daemon=True
+            ).start()
+        elif key == 'DETECTION_CONFIDENCE':
+            detection_service.confidence_threshold = config.get_float(key, 0.5)
+    
+    def on_camera_health(camera_id, state, health):
+        """Report not-ready while the camera is stalled or reconnecting"""
+        probe.details['camera'] = health
+        if state in ('stalled', 'reconnecting'):
+            probe.set_ready(False, f'camera {state}')
+        elif state == 'healthy':
+            probe.set_ready(True)
+    
+    camera.add_health_listener(on_camera_health)
+    config.subscribe(on_config_change, keys=['EXIT_CAMERA_URL', 'DETECTION_CONFIDENCE'])
     
     # Start camera capture
     camera.start_capture()
+    probe.set_ready(True)
+    timer.print_report()
     
     print("\n" + "=" * 70)
     print("✅ EXIT GATE SERVICE RUNNING")
@@ -74,8 +147,13 @@ def run_exit_gate_service():
     
     last_detection_time = 0
     
+    # Paces inference: LANE_MIN_FPS while the gate is empty, up to LANE_MAX_FPS with vehicles
+    lane = create_inference_scheduler(config, budget_fps=float('inf')).add_lane('EXIT_GATE_1', min_fps, max_fps)
+    
     try:
         while True:
+            lane.wait()
+            
             # Get frame from camera
             frame = camera.get_frame()
             
@@ -83,50 +161,57 @@ def run_exit_gate_service():
                 time.sleep(0.1)
                 continue
             
+            # Gate can be paused from the settings without stopping the service
+            if not config.get_bool('ENABLE_EXIT_GATE', True):
+                time.sleep(0.5)
+                continue
+            
             # Check if cooldown period has passed
+            detection_cooldown = config.get_int('DETECTION_COOLDOWN', 5)
             current_time = time.time()
-            if current_time - last_detection_time < DETECTION_COOLDOWN:
+            if current_time - last_detection_time < detection_cooldown:
                 time.sleep(0.1)
                 continue
             
             # Run detection
             detections = detection_service.detect_vehicles(frame)
+            lane.report(len(detections))
             
             if len(detections) > 0:
-                print(f"\n🚗 {datetime.now().strftime('%H:%M:%S')} - Detected {len(detections)} vehicle(s)")
+                log_event(logger, logging.INFO, 'gate.detection', f"🚗 Detected {len(detections)} vehicle(s)",
+                          gate='EXIT_GATE_1', vehicles=len(detections))
                 
                 # Process each detection
                 with app.app_context():
                     for detection in detections:
-                        print(f"\n   Vehicle Details:")
-                        print(f"      Category: {detection['display_category']}")
-                        print(f"      Original Class: {detection['original_class']}")
-                        print(f"      Confidence: {detection['confidence']:.2%}")
-                        print(f"      Parking Applicable: {detection['parking_applicable']}")
-                        
                         # Save detection image
                         image_path = detection_service.save_detection_image(
                             frame, [detection], prefix='exit'
                         )
-                        print(f"      Image saved: {image_path}")
+                        log_event(logger, logging.INFO, 'gate.vehicle', f"{detection['display_category']} "
+                                  f"({detection['original_class']}, {detection['confidence']:.2%})",
+                                  gate='EXIT_GATE_1', category=detection['display_category'],
+                                  original_class=detection['original_class'],
+                                  confidence=round(detection['confidence'], 3),
+                                  parking_applicable=detection['parking_applicable'], image=image_path)
                         
                         # Log exit to database
-                        success, message = log_vehicle_exit(
-                            detection, image_path, 'EXIT_GATE_1'
-                        )
+                        with db_commit_seconds.time():
+                            success, message = log_vehicle_exit(
+                                detection, image_path, 'EXIT_GATE_1'
+                            )
+                        GATE_EVENTS.labels(gate='EXIT_GATE_1', outcome='logged' if success else 'failed').inc()
                         
                         if success:
-                            print(f"      ✅ {message}")
-                            if detection['parking_applicable']:
-                                print(f"      🅿️  Parking slot released")
+                            log_event(logger, logging.INFO, 'gate.exit_logged', f"✅ {message}",
+                                      gate='EXIT_GATE_1', parking_released=detection['parking_applicable'])
                         else:
-                            print(f"      ❌ {message}")
+                            log_event(logger, logging.ERROR, 'gate.exit_failed', f"❌ {message}",
+                                      gate='EXIT_GATE_1')
                 
                 last_detection_time = current_time
-                print(f"\n⏳ Next detection in {DETECTION_COOLDOWN} seconds...")
-            
-            # Small delay
-            time.sleep(0.1)
+                log_event(logger, logging.DEBUG, 'gate.cooldown', f"⏳ Next detection in {detection_cooldown} seconds...",
+                          cooldown=detection_cooldown)
     
     except KeyboardInterrupt:
         print("\n\n⏹️  Stopping exit gate service...")
@@ -135,6 +220,8 @@ def run_exit_gate_service():
         print(f"\n❌ Error: {e}")
     
     finally:
+        probe.set_ready(False, 'stopped')
+        config.stop()
         camera.stop_capture()
         camera.disconnect()
         print("✅ Exit gate service stopped")
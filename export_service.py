@@ -0,0 +1,244 @@
+"""
+Export Service
+Streams entry/exit logs as CSV or Parquet with constant memory
+"""
+
+import argparse
+import csv
+import io
+import sys
+from sqlalchemy import Integer, Float, Boolean, DateTime
+from database import db, create_db_app
+from log_queries import LogFilters, entries_select, exits_select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 1000
+
+# Rows per Parquet row group (bounds memory held before each flush)
+ROW_GROUP_SIZE = 50000
+
+def export_select(log_type, filters):
+    """
+    Get the ordered Core select for an export
+
+    Args:
+        log_type: 'entries' or 'exits'
+        filters: LogFilters (same semantics as the /entries and /exits views)
+
+    Returns:
+        Select: Flat rows in chronological order
+    """
+    if log_type == 'entries':
+        statement = entries_select(filters)
+        columns = statement.selected_columns
+        return statement.order_by(columns.entry_datetime, columns.id)
+
+    if log_type == 'exits':
+        statement = exits_select(filters)
+        columns = statement.selected_columns
+        return statement.order_by(columns.exit_datetime, columns.id)
+
+    raise ValueError(f"Unknown log type: {log_type}")
+
+def iter_row_batches(statement, batch_size=FETCH_SIZE):
+    """
+    Stream rows from the database in batches
+
+    Uses a plain Core connection with stream_results, so rows never enter the
+    ORM session or identity map.
+
+    Yields:
+        tuple: (column names, list of row tuples)
+    """
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+        keys = list(result.keys())
+        for batch in result.partitions(batch_size):
+            yield keys, batch
+
+def stream_csv(statement):
+    """
+    Generate CSV text chunks for a select
+
+    Yields:
+        str: Header line, then one chunk per fetched batch
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+
+    for keys, batch in iter_row_batches(statement):
+        if not header_written:
+            writer.writerow(keys)
+            header_written = True
+
+        for row in batch:
+            writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if not header_written:
+        writer.writerow([column.name for column in statement.selected_columns])
+        yield buffer.getvalue()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _arrow_type(column_type):
+    """Map a SQLAlchemy column type to an Arrow type"""
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+def stream_parquet(statement):
+    """
+    Generate Parquet bytes for a select, one row group at a time
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+
+    Yields:
+        bytes: Encoded Parquet data
+    """
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        (column.name, _arrow_type(column.type)) for column in statement.selected_columns
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    pending = [[] for _ in schema.names]
+    pending_rows = 0
+
+    def flush():
+        table = pa.table({
+            name: pa.array(values, type=schema.field(name).type)
+            for name, values in zip(schema.names, pending)
+        }, schema=schema)
+        writer.write_table(table)
+        for values in pending:
+            values.clear()
+
+    try:
+        for _, batch in iter_row_batches(statement):
+            for row in batch:
+                for values, value in zip(pending, row):
+                    values.append(value)
+            pending_rows += len(batch)
+
+            if pending_rows >= ROW_GROUP_SIZE:
+                flush()
+                pending_rows = 0
+                yield sink.drain()
+
+        if pending_rows:
+            flush()
+    finally:
+        writer.close()
+
+    yield sink.drain()
+
+def stream_export(log_type, filters, export_format='csv'):
+    """
+    Stream an export in the requested format
+
+    Args:
+        log_type: 'entries' or 'exits'
+        filters: LogFilters
+        export_format: 'csv' or 'parquet'
+
+    Returns:
+        generator: Text (CSV) or bytes (Parquet) chunks
+    """
+    statement = export_select(log_type, filters)
+
+    if export_format == 'csv':
+        return stream_csv(statement)
+    if export_format == 'parquet':
+        return stream_parquet(statement)
+
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export vehicle entry/exit logs')
+    parser.add_argument('log_type', choices=['entries', 'exits'])
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--output', '-o', help='Output file (default: stdout for CSV)')
+    parser.add_argument('--category', default='')
+    parser.add_argument('--status', default='', help='IN/OUT (entries only)')
+    parser.add_argument('--date-from', default='', help='YYYY-MM-DD')
+    parser.add_argument('--date-to', default='', help='YYYY-MM-DD (inclusive)')
+    args = parser.parse_args()
+
+    if args.format == 'parquet' and not args.output:
+        parser.error('--output is required for parquet exports')
+
+    filters = LogFilters(
+        category=args.category,
+        status=args.status if args.log_type == 'entries' else '',
+        date_from=args.date_from,
+        date_to=args.date_to
+    )
+
+    app = create_db_app(__name__)
+    with app.app_context():
+        chunks = stream_export(args.log_type, filters, args.format)
+
+        if args.format == 'csv':
+            output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+            try:
+                for chunk in chunks:
+                    output.write(chunk)
+            finally:
+                if args.output:
+                    output.close()
+        else:
+            with open(args.output, 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+
+    if args.output:
+        print(f"✅ Exported {args.log_type} to {args.output}", file=sys.stderr)
@@ -0,0 +1,241 @@
+"""
+Frame Ring
+Shared-memory ring of video frames: one writer, any number of zero-copy readers in any local process
+"""
+
+import re
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+# Largest frame a ring holds by default (CameraManager requests 1920x1080)
+DEFAULT_MAX_SHAPE = (1080, 1920, 3)
+
+DEFAULT_SLOTS = 4
+
+# Per-slot header fields (int64)
+_SEQ, _HEIGHT, _WIDTH, _CHANNELS, _TIMESTAMP = range(5)
+_SLOT_FIELDS = 5
+
+# Ring header: [head seq, slot count, slot size in bytes, closed flag]
+_RING_FIELDS = 4
+
+FrameView = namedtuple('FrameView', ['seq', 'frame', 'timestamp'])
+FrameView.__doc__ = """A frame in the ring: sequence number, read-only NumPy view and capture time (unix seconds)"""
+
+def ring_name(camera_id, kind='raw'):
+    """
+    Well-known shared memory name of a camera's ring
+
+    Any local process can attach with FrameRing(ring_name(camera_id)).
+
+    Args:
+        camera_id: Camera ID
+        kind: 'raw' (captured frames) or 'annotated' (pipeline output)
+    """
+    return f"parking_{kind}_{re.sub(r'[^A-Za-z0-9_]', '_', str(camera_id))}"
+
+def _attach(name):
+    """Attach to existing shared memory without letting this process's exit unlink it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Older versions register attached segments with the resource tracker,
+        # which unlinks them when the reader exits
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class FrameRing:
+    """
+    Fixed-size ring of frame slots in multiprocessing.shared_memory
+
+    Frame n lives in slot n % slots. The writer invalidates a slot (seq 0)
+    before overwriting it and publishes the new seq (per slot and as the
+    ring head) when the copy is complete. Readers get NumPy views straight
+    into the shared buffer; a view of frame n stays intact until the writer
+    comes back to its slot (slots - 1 frames later), so a reader that needs
+    the pixels beyond its own processing checks valid(n) afterwards, or
+    copies.
+    """
+
+    def __init__(self, name=None, create=False, slots=DEFAULT_SLOTS, max_shape=DEFAULT_MAX_SHAPE):
+        """
+        Create or attach to a ring
+
+        Args:
+            name: Shared memory name (None with create=True = generated)
+            create: Create the ring (the writer) instead of attaching (readers)
+            slots: Number of frame slots (when creating)
+            max_shape: Largest (height, width, channels) frame (when creating)
+        """
+        if create:
+            slot_size = int(np.prod(max_shape))
+            header_size = (_RING_FIELDS + slots * _SLOT_FIELDS) * 8
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                      size=header_size + slots * slot_size)
+            except FileExistsError:
+                # Left behind by a crashed owner: take it over
+                stale = shared_memory.SharedMemory(name=name)
+                np.frombuffer(stale.buf, dtype=np.int64, count=_RING_FIELDS)[3] = 1  # readers reattach
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True,
+                                                      size=header_size + slots * slot_size)
+            np.frombuffer(self.shm.buf, dtype=np.int64, count=_RING_FIELDS)[:] = (0, slots, slot_size, 0)
+        else:
+            self.shm = _attach(name)
+
+        # np.frombuffer holds a buffer export, so the mapping cannot be closed
+        # under a live view (see close)
+        self.owner = create
+        self.header = np.frombuffer(self.shm.buf, dtype=np.int64, count=_RING_FIELDS)
+        self.slots = int(self.header[1])
+        self.slot_size = int(self.header[2])
+        self.slot_headers = np.frombuffer(self.shm.buf, dtype=np.int64, count=self.slots * _SLOT_FIELDS,
+                                          offset=_RING_FIELDS * 8).reshape(self.slots, _SLOT_FIELDS)
+        data_offset = (_RING_FIELDS + self.slots * _SLOT_FIELDS) * 8
+        self.data = np.frombuffer(self.shm.buf, dtype=np.uint8, count=self.slots * self.slot_size,
+                                  offset=data_offset).reshape(self.slots, self.slot_size)
+        if create:
+            self.slot_headers[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def head(self):
+        """Sequence number of the newest complete frame (0 = none yet)"""
+        return int(self.header[0])
+
+    @property
+    def closed(self):
+        """Whether the owner has closed (or replaced) the ring: readers should reattach by name"""
+        return self.header is None or bool(self.header[3])
+
+    def write(self, frame, timestamp=None):
+        """
+        Publish a frame (single writer)
+
+        Args:
+            frame: uint8 image (height, width[, channels])
+            timestamp: Capture time in unix seconds (default now)
+
+        Returns:
+            int: Sequence number of the frame
+
+        Raises:
+            ValueError: If the frame is larger than a slot
+        """
+        if frame.nbytes > self.slot_size:
+            raise ValueError(f"Frame {frame.shape} does not fit ring {self.name} "
+                             f"({self.slot_size} bytes per slot)")
+
+        seq = self.head + 1
+        slot = seq % self.slots
+        header = self.slot_headers[slot]
+        shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+
+        header[_SEQ] = 0  # invalidate before overwriting
+        self.data[slot, :frame.nbytes].reshape(shape)[...] = frame.reshape(shape)
+        header[_HEIGHT:_TIMESTAMP] = shape
+        header[_TIMESTAMP] = int((timestamp or time.time()) * 1e9)
+        header[_SEQ] = seq
+        self.header[0] = seq
+        return seq
+
+    def latest(self, after_seq=0):
+        """
+        Get the newest frame without copying
+
+        Args:
+            after_seq: Only return frames newer than this
+
+        Returns:
+            FrameView or None if there is no newer frame
+        """
+        for _ in range(3):
+            seq = self.head
+            if seq <= after_seq:
+                return None
+            view = self._view(seq)
+            if view is not None:
+                return view
+        return None
+
+    def get(self, seq):
+        """
+        Get a specific frame without copying (e.g. to catch up on missed frames)
+
+        Returns:
+            FrameView or None if it was overwritten (or not written yet)
+        """
+        return self._view(seq)
+
+    def _view(self, seq):
+        slot = seq % self.slots
+        header = self.slot_headers[slot]
+        height, width, channels, timestamp = (int(v) for v in header[_HEIGHT:])
+        if int(header[_SEQ]) != seq:
+            return None
+        frame = self.data[slot, :height * width * channels].reshape(height, width, channels)
+        frame.flags.writeable = False
+        if int(header[_SEQ]) != seq:
+            return None
+        return FrameView(seq, frame, timestamp / 1e9)
+
+    def valid(self, seq):
+        """Whether frame seq is still intact (call after using a view)"""
+        return int(self.slot_headers[seq % self.slots, _SEQ]) == seq
+
+    def copy(self, after_seq=0):
+        """
+        Get the newest frame as a private copy
+
+        Returns:
+            FrameView or None if there is no newer frame
+        """
+        for _ in range(3):
+            view = self.latest(after_seq)
+            if view is None:
+                return None
+            frame = view.frame.copy()
+            if self.valid(view.seq):
+                return view._replace(frame=frame)
+        return None
+
+    def wait(self, after_seq=0, timeout=1.0, poll_interval=0.002):
+        """
+        Wait for a frame newer than after_seq (zero-copy)
+
+        Returns:
+            FrameView or None on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            view = self.latest(after_seq)
+            if view is not None or time.monotonic() >= deadline:
+                return view
+            time.sleep(poll_interval)
+
+    def close(self):
+        """Detach (the owner also removes the shared memory name)"""
+        if self.owner and self.header is not None:
+            self.header[3] = 1
+        self.header = self.slot_headers = self.data = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views handed out are still alive: the mapping stays until they are gone
+            pass
+        if self.owner:
+            # A reader sharing our resource tracker may have unregistered the
+            # name (see _attach); unlink() expects it registered
+            resource_tracker.register(self.shm._name, 'shared_memory')
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
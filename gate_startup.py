@@ -0,0 +1,190 @@
+"""
+Gate Startup
+Parallel startup, startup timing and readiness probe for gate services
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from structured_logging import log_event
+
+logger = logging.getLogger('gate_startup')
+
+class StartupTimer:
+    """Record how long each startup phase takes"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block as a named phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name] = time.perf_counter() - start
+
+    def report(self):
+        """
+        Get the timing breakdown
+
+        Returns:
+            dict: Seconds per phase and total seconds since creation
+        """
+        with self.lock:
+            return {
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                'total': round(time.perf_counter() - self.started, 3)
+            }
+
+    def print_report(self):
+        """Print the timing breakdown"""
+        report = self.report()
+        print(f"\n⏱️  Startup took {report['total']:.2f}s:")
+        for name, seconds in report['phases'].items():
+            print(f"   {name:16} {seconds:6.2f}s")
+
+def run_parallel(tasks, timer):
+    """
+    Run startup tasks concurrently, timing each one
+
+    Args:
+        tasks: Dict of phase name -> callable
+        timer: StartupTimer
+
+    Returns:
+        dict: Phase name -> (result, exception)
+    """
+    def timed(name, task):
+        with timer.phase(name):
+            return task()
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = {name: executor.submit(timed, name, task) for name, task in tasks.items()}
+
+    outcomes = {}
+    for name, future in futures.items():
+        error = future.exception()
+        outcomes[name] = (None if error else future.result(), error)
+    return outcomes
+
+def wait_for_camera(camera, probe, camera_url):
+    """
+    Retry a camera whose first connect failed, with exponential backoff
+
+    The gate stays up and reports not-ready meanwhile, so a camera that
+    comes up late (e.g. after a power blip) only delays readiness.
+
+    Args:
+        camera: CameraManager
+        probe: ReadinessProbe
+        camera_url: Callable returning the current URL (follows config edits while waiting)
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        delay = min(camera.max_backoff, 2 ** attempt)
+        probe.set_ready(False, 'waiting for camera')
+        log_event(logger, logging.WARNING, 'gate.camera_unavailable',
+                  f"⚠️  Camera {camera.camera_id} unavailable, retrying in {delay}s",
+                  camera=camera.camera_id, attempt=attempt)
+        time.sleep(delay)
+        camera.camera_url = camera_url()
+        if camera.connect():
+            return
+
+class ReadinessProbe:
+    """
+    Minimal HTTP probe for supervisors and load balancers
+
+    GET /health  -> 200 while the process is up (liveness)
+    GET /ready   -> 200 once the gate is processing frames, otherwise 503
+    GET /startup -> startup timing breakdown
+    GET /metrics -> Prometheus metrics for this gate process
+    """
+
+    def __init__(self, name, port, timer, host='0.0.0.0'):
+        """
+        Initialize probe
+
+        Args:
+            name: Gate identifier reported in responses
+            port: TCP port to listen on (0 disables the probe)
+            timer: StartupTimer whose report is served
+            host: Bind address
+        """
+        self.name = name
+        self.port = port
+        self.host = host
+        self.timer = timer
+        self.ready = False
+        self.status = 'starting'
+        self.details = {}  # extra state reported by /ready (e.g. camera health)
+        self.server = None
+
+    def start(self):
+        """Start serving in a background thread"""
+        if not self.port:
+            return
+
+        probe = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    probe._respond(self, 200, {'gate': probe.name, 'alive': True})
+                elif self.path == '/ready':
+                    probe._respond(self, 200 if probe.ready else 503,
+                                   {'gate': probe.name, 'ready': probe.ready, 'status': probe.status,
+                                    **probe.details})
+                elif self.path == '/startup':
+                    probe._respond(self, 200, {'gate': probe.name, **probe.timer.report()})
+                elif self.path == '/metrics':
+                    probe._respond_raw(self, 200, registry.render().encode(), METRICS_CONTENT_TYPE)
+                else:
+                    probe._respond(self, 404, {'error': 'not found'})
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"⚠️  Readiness probe disabled (port {self.port}): {e}")
+            return
+
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"🩺 Readiness probe on http://{self.host}:{self.port}/ready")
+
+    def _respond(self, handler, status, body):
+        """Write a JSON response"""
+        self._respond_raw(handler, status, json.dumps(body).encode(), 'application/json')
+
+    def _respond_raw(self, handler, status, payload, content_type):
+        """Write a response body"""
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def set_ready(self, ready, status=None):
+        """Update readiness (and an optional status string)"""
+        self.ready = ready
+        self.status = status or ('ready' if ready else 'not ready')
+
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
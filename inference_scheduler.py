@@ -0,0 +1,262 @@
+"""
+Inference Scheduler
+Shares an inference budget between camera lanes, giving more frames per second to lanes with traffic
+"""
+
+import logging
+import threading
+import time
+from metrics import registry
+from structured_logging import log_event
+
+logger = logging.getLogger('inference_scheduler')
+
+SCHEDULER_BUDGET = registry.gauge(
+    'parking_scheduler_budget_fps', 'Inferences per second shared between lanes')
+
+SCHEDULER_RATE = registry.gauge(
+    'parking_scheduler_rate_fps', 'Inference rate currently allocated to a lane', ('lane',))
+
+SCHEDULER_ACTIVITY = registry.gauge(
+    'parking_scheduler_activity', 'Vehicles a lane reported at its last inference', ('lane',))
+
+SCHEDULER_INFERENCES = registry.counter(
+    'parking_scheduler_inferences_total', 'Frames a lane was allowed to run inference on', ('lane',))
+
+SCHEDULER_SKIPPED = registry.counter(
+    'parking_scheduler_skipped_frames_total', 'Frames a lane skipped to stay within its rate', ('lane',))
+
+class Lane:
+    """One camera's share of the budget; used by that camera's loop only"""
+
+    def __init__(self, scheduler, lane_id, min_fps, max_fps):
+        self.scheduler = scheduler
+        self.lane_id = lane_id
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.rate = max_fps
+        self.activity = 0
+        self.last_active = float('-inf')
+        self.next_due = 0.0
+
+        self.rate_gauge = SCHEDULER_RATE.labels(lane=lane_id)
+        self.activity_gauge = SCHEDULER_ACTIVITY.labels(lane=lane_id)
+        self.inferences = SCHEDULER_INFERENCES.labels(lane=lane_id)
+        self.skipped = SCHEDULER_SKIPPED.labels(lane=lane_id)
+        self.rate_gauge.set(self.rate)
+
+    def is_active(self, now):
+        """Lane had vehicles within the scheduler's hold time"""
+        return now - self.last_active < self.scheduler.activity_hold
+
+    def due(self):
+        """
+        Check whether this frame should run inference (non-blocking, for frame-driven loops)
+
+        Returns:
+            bool: True if the lane's next inference slot has come
+        """
+        now = time.monotonic()
+        self.scheduler.maybe_rebalance(now)
+        # Half an interval of slack: a frame arriving just before its slot
+        # (camera jitter at rate ~ frame rate) must not wait for the next frame
+        if now < self.next_due - 0.5 / self.rate:
+            self.skipped.inc()
+            return False
+        self._take_slot(now)
+        return True
+
+    def wait(self):
+        """Sleep until the lane's next inference slot (for polling loops)"""
+        now = time.monotonic()
+        self.scheduler.maybe_rebalance(now)
+        if now < self.next_due:
+            time.sleep(self.next_due - now)
+            now = time.monotonic()
+        self._take_slot(now)
+
+    def _take_slot(self, now):
+        # Slots follow the schedule, but never from the past, so a slow inference never causes a burst
+        self.next_due = max(self.next_due, now) + 1.0 / self.rate
+        self.inferences.inc()
+
+    def report(self, vehicles):
+        """
+        Report activity after an inference
+
+        Args:
+            vehicles: Vehicles tracked (or detected) in the lane right now
+        """
+        now = time.monotonic()
+        was_active = self.is_active(now)
+        self.activity = vehicles
+        self.activity_gauge.set(vehicles)
+        if vehicles:
+            self.last_active = now
+            if not was_active:
+                # Traffic arrived: rebalance now instead of at the next interval
+                self.scheduler.rebalance(now)
+
+class InferenceScheduler:
+    """
+    Split budget_fps inferences per second between lanes
+
+    Every lane always gets its min_fps; idle lanes get nothing more, so
+    their spare budget is left to the CPU. Lanes with vehicles in the last
+    activity_hold seconds share the rest in proportion to 1 + vehicles,
+    never above their max_fps; what a capped lane cannot use goes to the
+    other active lanes.
+    """
+
+    def __init__(self, budget_fps=float('inf'), rebalance_interval=1.0, activity_hold=3.0):
+        """
+        Initialize scheduler
+
+        Args:
+            budget_fps: Inferences per second the box can sustain across all lanes (inf = no limit)
+            rebalance_interval: Seconds between allocations
+            activity_hold: Seconds a lane counts as active after its last vehicle
+        """
+        self.budget_fps = budget_fps
+        self.rebalance_interval = rebalance_interval
+        self.activity_hold = activity_hold
+        self.lanes = {}
+        self.lock = threading.Lock()
+        self.last_rebalance = float('-inf')
+        SCHEDULER_BUDGET.set(budget_fps)
+
+    def add_lane(self, lane_id, min_fps=1.0, max_fps=30.0):
+        """
+        Register a lane
+
+        Args:
+            lane_id: Camera or gate ID
+            min_fps: Rate the lane always gets (keeps idle lanes watching for arrivals)
+            max_fps: Rate above which more inference does not help the lane
+
+        Returns:
+            Lane
+        """
+        if not 0 < min_fps <= max_fps:
+            raise ValueError(f"Lane {lane_id}: need 0 < min_fps <= max_fps (got {min_fps}, {max_fps})")
+        with self.lock:
+            lane = Lane(self, lane_id, min_fps, max_fps)
+            self.lanes[lane_id] = lane
+        self.rebalance()
+        return lane
+
+    def set_budget(self, budget_fps):
+        """Change the shared budget (applied immediately)"""
+        self.budget_fps = budget_fps
+        SCHEDULER_BUDGET.set(budget_fps)
+        self.rebalance()
+
+    def maybe_rebalance(self, now):
+        """Rebalance if rebalance_interval has passed"""
+        if now - self.last_rebalance >= self.rebalance_interval:
+            self.rebalance(now)
+
+    def rebalance(self, now=None):
+        """Recompute every lane's rate from current activity"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.last_rebalance = now
+            lanes = list(self.lanes.values())
+            if not lanes:
+                return
+            weights = {lane.lane_id: (1.0 + lane.activity if lane.is_active(now) else 0.0) for lane in lanes}
+            rates = allocate_rates(self.budget_fps, lanes, weights)
+
+            for lane in lanes:
+                old_rate = lane.rate
+                lane.rate = rates[lane.lane_id]
+                lane.rate_gauge.set(lane.rate)
+                # A lane whose rate rose should not wait out its old, longer interval
+                lane.next_due = min(lane.next_due, now + 1.0 / lane.rate)
+                if abs(lane.rate - old_rate) >= 0.5:
+                    log_event(logger, logging.DEBUG, 'scheduler.rate_changed',
+                              f"🎚️  {lane.lane_id}: {old_rate:.1f} → {lane.rate:.1f} FPS",
+                              lane=lane.lane_id, rate=round(lane.rate, 2), previous=round(old_rate, 2),
+                              active=lane.is_active(now), vehicles=lane.activity)
+
+    def get_allocations(self):
+        """
+        Get the current decisions
+
+        Returns:
+            dict: lane ID -> {'rate', 'min_fps', 'max_fps', 'active', 'vehicles'}
+        """
+        now = time.monotonic()
+        with self.lock:
+            return {lane.lane_id: {'rate': lane.rate, 'min_fps': lane.min_fps, 'max_fps': lane.max_fps,
+                                   'active': lane.is_active(now), 'vehicles': lane.activity}
+                    for lane in self.lanes.values()}
+
+def allocate_rates(budget, lanes, weights):
+    """
+    Water-fill budget over lanes by weight between their min and max rates
+
+    Minimums are always granted, even when they exceed the budget; lanes
+    with weight 0 get only their minimum.
+
+    Args:
+        budget: Total inferences per second (may be inf)
+        lanes: Lane objects (min_fps, max_fps, lane_id)
+        weights: lane ID -> share weight
+
+    Returns:
+        dict: lane ID -> rate
+    """
+    rates = {lane.lane_id: lane.min_fps for lane in lanes}
+    remaining = budget - sum(rates.values())
+    open_lanes = [lane for lane in lanes if weights[lane.lane_id] > 0 and lane.max_fps > lane.min_fps]
+
+    while remaining > 1e-6 and open_lanes:
+        total_weight = sum(weights[lane.lane_id] for lane in open_lanes)
+        granted = 0.0
+        still_open = []
+        for lane in open_lanes:
+            share = remaining * weights[lane.lane_id] / total_weight
+            grant = min(share, lane.max_fps - rates[lane.lane_id])
+            rates[lane.lane_id] += grant
+            granted += grant
+            if rates[lane.lane_id] < lane.max_fps - 1e-9:
+                still_open.append(lane)
+        remaining -= granted
+        if len(still_open) == len(open_lanes) or remaining == float('inf'):
+            break  # nobody hit a cap, so the whole remainder was handed out
+        open_lanes = still_open
+    return rates
+
+def create_inference_scheduler(config, budget_fps=None):
+    """
+    Create a scheduler following INFERENCE_BUDGET_FPS (0 = no shared limit)
+
+    Args:
+        config: ConfigCache
+        budget_fps: Fixed budget instead of the setting (e.g. inf for a single-camera process)
+
+    Returns:
+        InferenceScheduler
+    """
+    def configured_budget():
+        budget = config.get_float('INFERENCE_BUDGET_FPS', 0.0)
+        return budget if budget > 0 else float('inf')
+
+    scheduler = InferenceScheduler(budget_fps if budget_fps is not None else configured_budget())
+    if budget_fps is None:
+        config.subscribe(lambda key, old, new: scheduler.set_budget(configured_budget()),
+                         keys=['INFERENCE_BUDGET_FPS'])
+    return scheduler
+
+def lane_limits(config, camera=None):
+    """
+    Per-lane (min_fps, max_fps): the camera's own 'min_fps'/'max_fps', else LANE_MIN_FPS/LANE_MAX_FPS
+
+    Returns:
+        tuple: (min_fps, max_fps)
+    """
+    camera = camera or {}
+    min_fps = camera.get('min_fps') or config.get_float('LANE_MIN_FPS', 2.0)
+    max_fps = camera.get('max_fps') or config.get_float('LANE_MAX_FPS', 30.0)
+    return min_fps, max(min_fps, max_fps)
@@ -0,0 +1,567 @@
+"""
+Inference Server
+Local detection service that coalesces requests from all lanes into micro-batches
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from contextlib import contextmanager
+import numpy as np
+from detection_cache import CACHE_MODES, DetectionCache, create_detection_cache
+from detection_service import VehicleDetectionService
+from metrics import registry
+from structured_logging import log_event
+
+logger = logging.getLogger('inference_server')
+
+DEFAULT_ADDRESS = '127.0.0.1:8765'
+
+DETECTION_QUEUE_PENDING = registry.gauge(
+    'parking_detection_queue_pending', 'Uploaded images admitted and waiting for detection')
+
+DETECTION_QUEUE_REJECTED = registry.counter(
+    'parking_detection_queue_rejected_total', 'Detection requests rejected because the queue was full')
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at capacity"""
+
+class MicroBatcher:
+    """
+    Merge concurrent detection requests into batches
+
+    A worker thread takes the oldest request, then keeps collecting until
+    max_batch requests are waiting or the oldest request has waited
+    max_wait_ms, and runs them through one batched inference call.
+    """
+
+    def __init__(self, detection_service, max_batch=8, max_wait_ms=10, max_queue=64):
+        """
+        Initialize batcher
+
+        Args:
+            detection_service: Loaded VehicleDetectionService
+            max_batch: Maximum images per inference call
+            max_wait_ms: Latency deadline for filling a batch
+            max_queue: Maximum pending requests before submit() rejects
+        """
+        self.detection_service = detection_service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue(maxsize=max_queue)
+        self.is_running = False
+        self.stopped = False
+        self.thread = None
+
+        self.stats_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.requests_total = 0
+        self.rejected_total = 0
+        self.inference_seconds = 0.0
+
+    def start(self):
+        """Start the batching worker"""
+        self.is_running = True
+        self.stopped = False
+        self.thread = threading.Thread(target=self._batch_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the batching worker and fail requests it will never run"""
+        self.is_running = False
+        self.stopped = True
+        if self.thread:
+            self.thread.join(timeout=5)
+        self._fail_pending()
+
+    def _fail_pending(self):
+        """Resolve queued requests with an error so callers blocked on result() return"""
+        while True:
+            try:
+                _, future, _, _ = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            future.set_exception(RuntimeError("Inference batcher stopped"))
+
+    def submit(self, image, similar=False):
+        """
+        Queue an image for detection
+
+        Args:
+            image: OpenCV image
+            similar: Allow a perceptual cache hit (uploads only, never live frames)
+
+        Returns:
+            Future: Resolves to the list of detections
+
+        Raises:
+            QueueFullError: If max_queue requests are already pending
+            RuntimeError: If the batcher has been stopped
+        """
+        if self.stopped:
+            raise RuntimeError("Inference batcher stopped")
+        future = Future()
+        try:
+            self.requests.put_nowait((image, future, time.monotonic(), similar))
+        except queue.Full:
+            with self.stats_lock:
+                self.rejected_total += 1
+            raise QueueFullError("Inference queue is full")
+        if self.stopped:
+            # stop() drained the queue while this request was being added
+            self._fail_pending()
+        return future
+
+    def detect(self, image, timeout=None, similar=False):
+        """Submit an image and wait for its detections"""
+        return self.submit(image, similar).result(timeout=timeout)
+
+    def _batch_loop(self):
+        """Collect and run batches"""
+        while self.is_running:
+            try:
+                first = self.requests.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            while len(batch) < self.max_batch:
+                # Requests already waiting are always taken; only waiting for
+                # new ones is bounded by the deadline
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self.requests.get(timeout=remaining))
+                    else:
+                        batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            images = [item[0] for item in batch]
+            start = time.perf_counter()
+            try:
+                results = self.detection_service.detect_vehicles_batch(images, [item[3] for item in batch])
+            except Exception as e:
+                for item in batch:
+                    item[1].set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for (_, future, _, _), detections in zip(batch, results):
+                future.set_result(detections)
+
+            with self.stats_lock:
+                self.batch_sizes[len(batch)] += 1
+                self.requests_total += len(batch)
+                self.inference_seconds += elapsed
+
+    def get_stats(self):
+        """
+        Get queue and batching statistics
+
+        Returns:
+            dict: Queue depth, batch-size histogram and throughput counters
+        """
+        with self.stats_lock:
+            batches = sum(self.batch_sizes.values())
+            return {
+                'queue_depth': self.requests.qsize(),
+                'max_queue': self.requests.maxsize,
+                'requests_total': self.requests_total,
+                'rejected_total': self.rejected_total,
+                'batches_total': batches,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'mean_batch_size': self.requests_total / batches if batches else 0.0,
+                'mean_batch_ms': self.inference_seconds / batches * 1000 if batches else 0.0
+            }
+
+class AdmissionQueue:
+    """
+    Bounded entry point for on-demand detection (image uploads)
+
+    Requests reserve one slot per image before decoding anything; once
+    max_pending images are in flight, reserve() raises QueueFullError so
+    bursts are turned away instead of piling up request threads. Admitted
+    images go to the shared backend (the MicroBatcher camera frames use, or
+    the remote server), so uploads are batched with frames rather than
+    running the model concurrently.
+    """
+
+    def __init__(self, backend, max_pending=16, timeout=30):
+        """
+        Initialize queue
+
+        Args:
+            backend: Object with submit(image, similar) -> Future (MicroBatcher or RemoteDetectionService)
+            max_pending: Maximum images admitted at once
+            timeout: Seconds to wait for one image's detections
+        """
+        self.backend = backend
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pending = 0
+
+    @contextmanager
+    def reserve(self, count=1):
+        """
+        Hold count slots for the duration of the block
+
+        Raises:
+            QueueFullError: If the slots are not available right now
+        """
+        with self.lock:
+            if self.pending + count > self.max_pending:
+                DETECTION_QUEUE_REJECTED.inc()
+                raise QueueFullError("Detection queue is full")
+            self.pending += count
+            DETECTION_QUEUE_PENDING.set(self.pending)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.pending -= count
+                DETECTION_QUEUE_PENDING.set(self.pending)
+
+    def detect(self, images):
+        """
+        Detect vehicles in admitted images (call inside reserve())
+
+        Args:
+            images: OpenCV images
+
+        Returns:
+            list: One list of detections per image
+        """
+        # Uploads may reuse results for visually unchanged images (DETECTION_CACHE=perceptual)
+        futures = [self.backend.submit(image, similar=True) for image in images]
+        return [future.result(timeout=self.timeout) for future in futures]
+
+# Wire format: 4-byte header length, JSON header, 4-byte payload length, payload
+
+def send_message(sock, header, payload=b''):
+    """Send one framed message"""
+    header_bytes = json.dumps(header).encode()
+    sock.sendall(struct.pack('!I', len(header_bytes)) + header_bytes +
+                 struct.pack('!I', len(payload)) + payload)
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes (raises ConnectionError on EOF)"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        chunk = sock.recv_into(view[received:], size - received)
+        if chunk == 0:
+            raise ConnectionError("Connection closed")
+        received += chunk
+    return bytes(buffer)
+
+def recv_message(sock):
+    """Receive one framed message as (header, payload)"""
+    header_length, = struct.unpack('!I', _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, header_length))
+    payload_length, = struct.unpack('!I', _recv_exact(sock, 4))
+    payload = _recv_exact(sock, payload_length) if payload_length else b''
+    return header, payload
+
+def parse_address(address):
+    """
+    Parse 'host:port' or 'unix:/path/to.sock'
+
+    Returns:
+        tuple: (socket family, address)
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, port = address.rsplit(':', 1)
+    return socket.AF_INET, (host, int(port))
+
+class _InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Serve requests on one persistent client connection"""
+
+    def handle(self):
+        batcher = self.server.batcher
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            op = header.get('op')
+            try:
+                if op == 'detect':
+                    image = np.frombuffer(payload, dtype=np.uint8).reshape(header['shape'])
+                    detections = batcher.detect(image, timeout=header.get('timeout', 30),
+                                                similar=header.get('similar', False))
+                    # The model runs at the server's floor; each client applies its own threshold
+                    confidence = header.get('confidence')
+                    if confidence is not None:
+                        detections = [det for det in detections if det['confidence'] >= confidence]
+                    send_message(self.request, {'ok': True, 'detections': detections})
+                elif op == 'stats':
+                    send_message(self.request, {'ok': True, 'stats': batcher.get_stats()})
+                else:
+                    send_message(self.request, {'ok': False, 'error': f'Unknown op: {op}'})
+            except QueueFullError as e:
+                send_message(self.request, {'ok': False, 'error': str(e), 'busy': True})
+            except Exception as e:
+                send_message(self.request, {'ok': False, 'error': str(e)})
+
+class InferenceServer:
+    """Socket server exposing one warm model to all local processes"""
+
+    def __init__(self, detection_service, address=DEFAULT_ADDRESS, **batcher_options):
+        """
+        Initialize server
+
+        Args:
+            detection_service: VehicleDetectionService (loaded on start)
+            address: 'host:port' or 'unix:/path/to.sock'
+            **batcher_options: Passed to MicroBatcher
+        """
+        self.detection_service = detection_service
+        self.address = address
+        self.batcher = MicroBatcher(detection_service, **batcher_options)
+        self.server = None
+
+    def serve_forever(self):
+        """Load the model and serve until interrupted"""
+        if self.detection_service.model is None and not self.detection_service.load_model():
+            raise RuntimeError("Failed to load model")
+
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_address):
+                os.unlink(bind_address)
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+
+        server_class.allow_reuse_address = True
+        server_class.daemon_threads = True
+        self.server = server_class(bind_address, _InferenceRequestHandler)
+        self.server.batcher = self.batcher
+
+        self.batcher.start()
+        print(f"✅ Inference server listening on {self.address}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.batcher.stop()
+            self.server.server_close()
+
+    def shutdown(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+
+class ServiceClient:
+    """
+    Framed request/response client for the local socket services
+
+    Each thread keeps its own persistent connection, so concurrent callers
+    never interleave messages.
+    """
+
+    def __init__(self, address, timeout=30):
+        """
+        Initialize client (connects lazily)
+
+        Args:
+            address: 'host:port' or 'unix:/path/to.sock'
+            timeout: Socket timeout in seconds
+        """
+        self.address = address
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        """Get this thread's socket, connecting if needed"""
+        sock = getattr(self.local, 'sock', None)
+        if sock is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.local.sock = sock
+        return sock
+
+    def request(self, header, payload=b''):
+        """Send a request and get the response header, reconnecting once on a dropped connection"""
+        for attempt in range(2):
+            try:
+                sock = self.connection()
+                send_message(sock, header, payload)
+                return recv_message(sock)[0]
+            except (ConnectionError, OSError):
+                self.local.sock = None
+                if attempt:
+                    raise
+
+class RemoteDetectionService(VehicleDetectionService):
+    """
+    Drop-in VehicleDetectionService that sends frames to the inference server
+
+    Annotation and classification helpers are inherited; only inference is
+    remote. Each thread keeps its own persistent connection.
+    confidence_threshold is sent with every request, so hot reloads apply
+    (down to the server's --confidence floor).
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=30, metrics_source='detector', confidence_threshold=0.5):
+        super().__init__(model_path=f'remote:{address}', confidence_threshold=confidence_threshold,
+                         metrics_source=metrics_source)
+        self.address = address
+        self.timeout = timeout
+        self.client = ServiceClient(address, timeout)
+
+    def load_model(self):
+        """Connect to the server (the model lives in the server process)"""
+        try:
+            self.client.connection()
+            self.model = self.address
+            print(f"✅ Connected to inference server at {self.address}")
+            return True
+        except OSError as e:
+            print(f"❌ Inference server unavailable at {self.address}: {e}")
+            return False
+
+    def _request_detections(self, image, similar=False):
+        """Send one image to the server (raises QueueFullError when the server is saturated)"""
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        # Round trip, including queueing in the server's batcher
+        with self.inference_seconds.time():
+            response = self.client.request(
+                {'op': 'detect', 'shape': list(image.shape), 'timeout': self.timeout,
+                 'confidence': self.confidence_threshold, 'similar': similar},
+                image.tobytes()
+            )
+        if response.get('busy'):
+            raise QueueFullError(response.get('error'))
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        self._count_detections(response['detections'])
+        return response['detections']
+
+    def detect_vehicles(self, image, similar=False):
+        """Detect vehicles via the inference server"""
+        try:
+            return self._request_detections(image, similar)
+        except Exception as e:
+            log_event(logger, logging.ERROR, 'detection.remote_error', f"❌ Remote detection error: {e}",
+                      rate_limit=10, source=self.metrics_source, busy=isinstance(e, QueueFullError))
+            return []
+
+    def submit(self, image, similar=False):
+        """
+        MicroBatcher-compatible submit (the server batches, so the round trip runs here)
+
+        Returns:
+            Future: Already resolved with the detections or the error
+
+        Raises:
+            QueueFullError: If the server's queue is full
+        """
+        future = Future()
+        try:
+            future.set_result(self._request_detections(image, similar))
+        except QueueFullError:
+            raise
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def detect_vehicles_batch(self, images, similar=None):
+        """Detect vehicles in several images (the server does the batching)"""
+        similar = similar if similar is not None else [False] * len(images)
+        return [self.detect_vehicles(image, flag) for image, flag in zip(images, similar)]
+
+    def get_server_stats(self):
+        """Get queue depth and batch-size statistics from the server"""
+        response = self.client.request({'op': 'stats'})
+        return response.get('stats', {})
+
+def create_detection_service(model_path, config, metrics_source='detector'):
+    """
+    Create the detection service configured for this box
+
+    Uses the inference server when INFERENCE_SERVER is set, otherwise loads
+    the model in-process with the DETECTION_CACHE result cache.
+
+    Args:
+        model_path: Path to the .pt model
+        config: ConfigCache
+        metrics_source: Source label for latency metrics
+
+    Returns:
+        VehicleDetectionService
+    """
+    address = config.get('INFERENCE_SERVER', '')
+    if address:
+        return RemoteDetectionService(address, metrics_source=metrics_source,
+                                      confidence_threshold=config.get_float('DETECTION_CONFIDENCE', 0.5))
+
+    return VehicleDetectionService(
+        model_path,
+        confidence_threshold=config.get_float('DETECTION_CONFIDENCE', 0.5),
+        runtime=config.get('MODEL_RUNTIME', 'pytorch'),
+        precision=config.get('MODEL_PRECISION', 'fp32'),
+        metrics_source=metrics_source,
+        cache=create_detection_cache(config, metrics_source)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Shared local inference server')
+    parser.add_argument('--model', default='best.pt')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="'host:port' or 'unix:/path.sock'")
+    parser.add_argument('--confidence', type=float, default=0.25,
+                        help="Lowest confidence reported; clients filter per request with their DETECTION_CONFIDENCE")
+    parser.add_argument('--runtime', default='pytorch')
+    parser.add_argument('--precision', default='fp32')
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--cache', choices=CACHE_MODES, default='exact',
+                        help="Detection result cache ('perceptual' lets uploads reuse results for similar images)")
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--cache-ttl', type=float, default=300, help='Seconds a cached result stays valid')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("INFERENCE SERVER")
+    print("=" * 70)
+
+    cache = (DetectionCache(args.cache, max_entries=args.cache_size, ttl=args.cache_ttl)
+             if args.cache != 'off' else None)
+    service = VehicleDetectionService(args.model, confidence_threshold=args.confidence,
+                                      runtime=args.runtime, precision=args.precision, cache=cache)
+    server = InferenceServer(service, args.address, max_batch=args.max_batch,
+                             max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+
+    def report_stats():
+        while True:
+            time.sleep(60)
+            stats = server.batcher.get_stats()
+            print(f"📊 queue={stats['queue_depth']} requests={stats['requests_total']} "
+                  f"mean_batch={stats['mean_batch_size']:.2f} batches={stats['batch_size_histogram']}")
+
+    threading.Thread(target=report_stats, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Inference server stopped")
@@ -5,6 +5,7 @@ Creates all tables and inserts initial data
 
 from flask import Flask
 from database import db, VehicleCategory, ParkingSlot, SystemConfig
+from archive_manager import drop_archive_partitions
 import os
 
 def init_database():
@@ -39,6 +40,7 @@ def init_database():
         
         print("\n📋 Dropping existing tables...")
         db.drop_all()
+        drop_archive_partitions()
         print("✅ Existing tables dropped")
         
         # Create all tables
@@ -92,6 +94,31 @@ def init_database():
             {'config_key': 'DETECTION_COOLDOWN', 'config_value': '5', 'description': 'Cooldown seconds between detections'},
             {'config_key': 'ENABLE_ENTRY_GATE', 'config_value': 'true', 'description': 'Enable entry gate detection'},
             {'config_key': 'ENABLE_EXIT_GATE', 'config_value': 'true', 'description': 'Enable exit gate detection'},
+            {'config_key': 'MODEL_RUNTIME', 'config_value': 'pytorch', 'description': 'Inference runtime: pytorch, onnx or openvino'},
+            {'config_key': 'MODEL_PRECISION', 'config_value': 'fp32', 'description': 'Exported model precision: fp32, fp16 or int8'},
+            {'config_key': 'ENTRY_GATE_PROBE_PORT', 'config_value': '8081', 'description': 'Entry gate readiness probe port (0 = disabled)'},
+            {'config_key': 'EXIT_GATE_PROBE_PORT', 'config_value': '8082', 'description': 'Exit gate readiness probe port (0 = disabled)'},
+            {'config_key': 'INFERENCE_SERVER', 'config_value': '', 'description': "Shared inference server address ('host:port' or 'unix:/path'), empty = load model in-process"},
+            {'config_key': 'DETECTION_CACHE', 'config_value': 'exact', 'description': "Detection result cache: 'exact' (identical images only), 'perceptual' (uploads may also reuse results for visually unchanged images; live frames stay exact) or 'off'"},
+            {'config_key': 'DETECTION_CACHE_SIZE', 'config_value': '1024', 'description': 'Detection results kept in the cache (least recently used are evicted)'},
+            {'config_key': 'DETECTION_CACHE_TTL', 'config_value': '300', 'description': 'Seconds a cached detection result stays valid'},
+            {'config_key': 'DETECTION_QUEUE_SIZE', 'config_value': '16', 'description': 'Uploaded images admitted for detection at once (more get HTTP 429)'},
+            {'config_key': 'CAMERAS', 'config_value': '', 'description': 'Counting cameras as JSON [{"id": "CAMERA_1", "source": 0, "zones": [...]}], empty = webcam 0 as CAMERA_1'},
+            {'config_key': 'PIPELINE_SERVICE', 'config_value': '', 'description': "Pipeline service address ('host:port' or 'unix:/path') HTTP workers use for cameras, counts and detection, empty = pipelines in the web process (wsgi.py sets it for its own workers)"},
+            {'config_key': 'PIPELINE_MODE', 'config_value': 'thread', 'description': "Camera pipelines: 'thread' (in the web process) or 'process' (one worker process per camera)"},
+            {'config_key': 'FORECAST_HALF_LIFE_WEEKS', 'config_value': '8', 'description': 'Age in weeks at which history counts half in the occupancy forecast'},
+            {'config_key': 'FORECAST_REFRESH_SECONDS', 'config_value': '300', 'description': 'Minimum seconds between occupancy forecast refits on new entry/exit rows'},
+            {'config_key': 'INFERENCE_BUDGET_FPS', 'config_value': '0', 'description': 'Inferences per second shared by the camera pipelines, given to lanes with traffic first (0 = no shared limit)'},
+            {'config_key': 'LANE_MIN_FPS', 'config_value': '2', 'description': 'Inference rate of an idle camera or gate lane (per-camera "min_fps" overrides)'},
+            {'config_key': 'LANE_MAX_FPS', 'config_value': '30', 'description': 'Highest inference rate of a lane with vehicles; keep near the camera frame rate so the IoU tracker can follow fast vehicles (per-camera "max_fps" overrides)'},
+            {'config_key': 'COUNTING_ZONES', 'config_value': '', 'description': 'Counting lines/polygon zones as JSON (normalized coordinates; "count": true marks the line behind the overall counts, default the first), empty = vertical centre line'},
+            {'config_key': 'CAMERA_STALL_TIMEOUT', 'config_value': '5', 'description': 'Seconds without a frame before a camera stream is reopened'},
+            {'config_key': 'CAMERA_RECONNECT_MAX_BACKOFF', 'config_value': '30', 'description': 'Maximum seconds between camera reconnect attempts'},
+            {'config_key': 'LOG_LEVEL', 'config_value': 'INFO', 'description': 'Default log level (DEBUG, INFO, WARNING, ERROR)'},
+            {'config_key': 'LOG_LEVELS', 'config_value': '', 'description': "Per-module log levels, e.g. 'camera_manager=WARNING,vehicle_counter=DEBUG'"},
+            {'config_key': 'LOG_FORMAT', 'config_value': 'text', 'description': "Log output format: 'text' or 'json'"},
+            {'config_key': 'COUNTER_FLUSH_INTERVAL', 'config_value': '1', 'description': 'Seconds between batched writes of counter events to the database'},
+            {'config_key': 'COUNTER_CHECKPOINT_INTERVAL', 'config_value': '30', 'description': 'Seconds between counter state checkpoints (bounds replay on restart)'},
         ]
         
         for conf in configs:
@@ -113,7 +140,7 @@ def init_database():
         print(f"   ✓ 7 tables (vehicle_categories, vehicle_entries, vehicle_exits, etc.)")
         print(f"   ✓ 6 vehicle categories")
         print(f"   ✓ 1 parking configuration (100 slots)")
-        print(f"   ✓ 7 system settings")
+        print(f"   ✓ {len(configs)} system settings")
         print(f"\n🎯 Next Steps:")
         print(f"   1. Database is ready for use")
         print(f"   2. Proceed with Flask application development")
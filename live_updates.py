@@ -0,0 +1,183 @@
+"""
+Live Updates
+Server-sent event broker for vehicle counts and parking status
+"""
+
+import json
+import threading
+import time
+
+class LiveUpdateBroker:
+    """
+    Publish/subscribe hub for live dashboard state
+
+    State is kept per topic. Publishing only records the latest value and a
+    sequence number; subscribers pick up every topic that changed since they
+    last sent, so a burst of updates collapses into one message per
+    subscriber. Each value is JSON-encoded once at publish time and shared by
+    all subscribers.
+    """
+
+    def __init__(self, min_interval=0.1, heartbeat_interval=15):
+        """
+        Initialize broker
+
+        Args:
+            min_interval: Minimum seconds between messages to one subscriber
+            heartbeat_interval: Seconds of silence before a keep-alive comment
+        """
+        self.min_interval = min_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.versions = {}
+        self.encoded = {}
+        self.values = {}
+        self.subscriber_count = 0
+
+    def publish(self, topic, value):
+        """
+        Publish the latest value of a topic
+
+        Args:
+            topic: Topic name (e.g. 'vehicle_counts')
+            value: JSON-serializable value; unchanged values are ignored
+        """
+        with self.condition:
+            if self.values.get(topic) == value:
+                return
+            self.seq += 1
+            self.values[topic] = value
+            self.encoded[topic] = json.dumps(value, default=str)
+            self.versions[topic] = self.seq
+            self.condition.notify_all()
+
+    def _changes_since(self, seq):
+        """Encoded topics changed after seq (caller holds the condition)"""
+        return {
+            topic: self.encoded[topic]
+            for topic, version in self.versions.items()
+            if version > seq
+        }
+
+    def stream(self):
+        """
+        Generate server-sent events for one subscriber
+
+        The first message carries the full state, later messages only the
+        topics that changed.
+
+        Yields:
+            str: SSE-formatted messages
+        """
+        with self.condition:
+            self.subscriber_count += 1
+
+        last_seq = 0
+        last_sent = 0.0
+
+        try:
+            while True:
+                # Coalesce bursts: never send more often than min_interval
+                wait = last_sent + self.min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+                with self.condition:
+                    if self.seq == last_seq:
+                        self.condition.wait(self.heartbeat_interval)
+
+                    changes = self._changes_since(last_seq)
+                    last_seq = self.seq
+
+                if not changes:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                payload = ','.join(f'"{topic}":{encoded}' for topic, encoded in changes.items())
+                last_sent = time.monotonic()
+                yield f"id: {last_seq}\nevent: update\ndata: {{{payload}}}\n\n"
+        finally:
+            with self.condition:
+                self.subscriber_count -= 1
+
+class DatabaseChangeWatcher:
+    """Publish parking status and latest entries when the database changes"""
+
+    def __init__(self, app, broker, snapshot_cache, interval=0.5):
+        """
+        Initialize watcher
+
+        Args:
+            app: Flask app (for the database context)
+            broker: LiveUpdateBroker to publish to
+            snapshot_cache: DashboardSnapshotCache used for change detection
+            interval: Seconds between checks
+        """
+        self.app = app
+        self.broker = broker
+        self.snapshot_cache = snapshot_cache
+        self.interval = interval
+        self.thread = None
+        self.is_running = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the watcher thread once"""
+        with self.lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            self.thread = threading.Thread(target=self._watch_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the watcher thread"""
+        self.is_running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _watch_loop(self):
+        """Poll the snapshot cache and publish on version changes"""
+        last_etag = None
+
+        while self.is_running:
+            try:
+                with self.app.app_context():
+                    snapshot = self.snapshot_cache.get()
+
+                if snapshot.etag != last_etag:
+                    last_etag = snapshot.etag
+                    self._publish_snapshot(snapshot)
+
+            except Exception as e:
+                print(f"❌ Live update watcher error: {e}")
+
+            time.sleep(self.interval)
+
+    def _publish_snapshot(self, snapshot):
+        """Publish the topics derived from a dashboard snapshot"""
+        parking = snapshot.parking
+        if parking:
+            self.broker.publish('parking_status', {
+                'total_capacity': parking.total_capacity,
+                'occupied_count': parking.occupied_count,
+                'available_count': parking.available_count,
+                'last_updated': parking.last_updated.isoformat() if parking.last_updated else None
+            })
+
+        self.broker.publish('latest_entries', [{
+            'id': entry.id,
+            'category': entry.display_category,
+            'entry_time': entry.entry_datetime.isoformat(),
+            'status': entry.status,
+            'confidence': entry.detection_confidence
+        } for entry in snapshot.recent_entries])
+
+        self.broker.publish('stats', {
+            'total_entries': snapshot.total_entries_today,
+            'total_exits': snapshot.total_exits_today,
+            'currently_in': snapshot.currently_in
+        })
+
+live_broker = LiveUpdateBroker()
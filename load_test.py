@@ -0,0 +1,213 @@
+"""
+Load Test
+Concurrent clients against the JSON APIs plus MJPEG viewers, reporting throughput, latency percentiles and frame rates
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+from pipeline_benchmark import summarize_latencies
+
+DEFAULT_ENDPOINTS = ['/api/vehicle-counts', '/api/stats', '/api/parking-status', '/api/cameras',
+                     '/api/latest-entries']
+
+def _connect(base):
+    parts = urlsplit(base)
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    return connection_class(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80), timeout=30)
+
+def run_api_client(base, endpoints, deadline, results, client_index):
+    """
+    Request the endpoints round-robin on one keep-alive connection until deadline
+
+    Args:
+        base: Server URL (e.g. http://127.0.0.1:5000)
+        endpoints: Paths to request
+        deadline: time.monotonic() to stop at
+        results: Dict path -> {'latencies': [...], 'errors': n} (shared)
+        client_index: Offsets the round robin so clients do not move in lockstep
+    """
+    connection = _connect(base)
+    index = client_index
+    while time.monotonic() < deadline:
+        path = endpoints[index % len(endpoints)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            ok = False
+            connection.close()
+            connection = _connect(base)
+        elapsed = time.perf_counter() - start
+
+        stats = results[path]
+        if ok:
+            stats['latencies'].append(elapsed)
+        else:
+            stats['errors'] += 1
+    connection.close()
+
+def run_mjpeg_client(base, path, deadline, results):
+    """
+    Read an MJPEG stream until deadline, recording inter-frame gaps
+
+    Args:
+        base: Server URL
+        path: Stream path (e.g. /video_feed)
+        deadline: time.monotonic() to stop at
+        results: List this viewer's stats dict is appended to
+    """
+    stats = {'frames': 0, 'bytes': 0, 'gaps': [], 'first_frame_seconds': None, 'error': None}
+    results.append(stats)
+    start = time.monotonic()
+    try:
+        connection = _connect(base)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        if response.status != 200:
+            stats['error'] = f'HTTP {response.status}'
+            return
+
+        last_frame = None
+        while time.monotonic() < deadline:
+            line = response.readline()
+            if not line:
+                stats['error'] = 'Stream closed'
+                break
+            if not line.lower().startswith(b'content-type'):
+                continue
+            response.readline()  # blank line before the JPEG
+            frame = bytearray()
+            while not frame.endswith(b'\xff\xd9\r\n'):
+                chunk = response.readline()
+                if not chunk:
+                    break
+                frame += chunk
+
+            now = time.monotonic()
+            if last_frame is None:
+                stats['first_frame_seconds'] = now - start
+            else:
+                stats['gaps'].append(now - last_frame)
+            last_frame = now
+            stats['frames'] += 1
+            stats['bytes'] += len(frame) - 2
+        connection.close()
+    except (OSError, http.client.HTTPException) as e:
+        stats['error'] = str(e)
+
+def run_load_test(base, endpoints=None, concurrency=16, duration=30.0, mjpeg_clients=0,
+                  mjpeg_path='/video_feed'):
+    """
+    Run API and MJPEG clients concurrently
+
+    Args:
+        base: Server URL
+        endpoints: JSON API paths (default DEFAULT_ENDPOINTS)
+        concurrency: API clients (one keep-alive connection each)
+        duration: Seconds to run
+        mjpeg_clients: Concurrent MJPEG viewers
+        mjpeg_path: Stream path the viewers open
+
+    Returns:
+        dict: Report with per-endpoint latency percentiles and per-viewer FPS
+    """
+    endpoints = endpoints or DEFAULT_ENDPOINTS
+    api_results = {path: {'latencies': [], 'errors': 0} for path in endpoints}
+    mjpeg_results = []
+
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=run_mjpeg_client, args=(base, mjpeg_path, deadline, mjpeg_results),
+                                daemon=True) for _ in range(mjpeg_clients)]
+    threads += [threading.Thread(target=run_api_client, args=(base, endpoints, deadline, api_results, i),
+                                 daemon=True) for i in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=duration + 60)
+    elapsed = time.monotonic() - started
+
+    report = {'url': base, 'duration_seconds': elapsed, 'concurrency': concurrency, 'endpoints': {},
+              'mjpeg': None}
+    total_requests = 0
+    total_errors = 0
+    for path, stats in api_results.items():
+        total_requests += len(stats['latencies'])
+        total_errors += stats['errors']
+        report['endpoints'][path] = dict(summarize_latencies(stats['latencies']) or {'count': 0},
+                                         errors=stats['errors'], rps=len(stats['latencies']) / elapsed)
+    report['requests'] = total_requests
+    report['errors'] = total_errors
+    report['rps'] = total_requests / elapsed
+
+    if mjpeg_clients:
+        fps = [viewer['frames'] / elapsed for viewer in mjpeg_results]
+        gaps = [gap for viewer in mjpeg_results for gap in viewer['gaps']]
+        report['mjpeg'] = {
+            'path': mjpeg_path,
+            'viewers': len(mjpeg_results),
+            'errors': [viewer['error'] for viewer in mjpeg_results if viewer['error']],
+            'fps_min': min(fps) if fps else 0.0,
+            'fps_mean': sum(fps) / len(fps) if fps else 0.0,
+            'mbps_total': sum(viewer['bytes'] for viewer in mjpeg_results) * 8 / elapsed / 1e6,
+            'frame_gap': summarize_latencies(gaps)
+        }
+    return report
+
+def print_report(report):
+    """Print a load test report"""
+    print(f"\n📊 {report['requests']} requests in {report['duration_seconds']:.1f}s → "
+          f"{report['rps']:.0f} req/s ({report['concurrency']} clients, {report['errors']} errors)")
+    print(f"\n{'endpoint':26} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}   (ms)")
+    for path, stats in report['endpoints'].items():
+        if stats['count']:
+            print(f"{path:26} {stats['rps']:8.0f} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+                  f"{stats['p99_ms']:8.2f} {stats['errors']:7}")
+        else:
+            print(f"{path:26} {'-':>8} {'-':>8} {'-':>8} {'-':>8} {stats['errors']:7}")
+
+    mjpeg = report['mjpeg']
+    if mjpeg:
+        print(f"\n📹 {mjpeg['viewers']} MJPEG viewers on {mjpeg['path']}: "
+              f"{mjpeg['fps_mean']:.1f} FPS mean, {mjpeg['fps_min']:.1f} FPS worst, "
+              f"{mjpeg['mbps_total']:.1f} Mbit/s total")
+        if mjpeg['frame_gap']:
+            gap = mjpeg['frame_gap']
+            print(f"   frame gap p50 {gap['p50_ms']:.0f} ms, p99 {gap['p99_ms']:.0f} ms, max {gap['max_ms']:.0f} ms")
+        for error in mjpeg['errors']:
+            print(f"   ❌ {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the JSON APIs and MJPEG fan-out')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--endpoints', nargs='+', default=DEFAULT_ENDPOINTS)
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent API clients')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--mjpeg-clients', type=int, default=0, help='Concurrent MJPEG viewers')
+    parser.add_argument('--mjpeg-path', default='/video_feed')
+    parser.add_argument('--json', help='Write the report to this file')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("LOAD TEST")
+    print("=" * 70)
+    print(f"\n▶️  {args.url}: {args.concurrency} API clients, {args.mjpeg_clients} MJPEG viewers, "
+          f"{args.duration:.0f}s")
+
+    report = run_load_test(args.url, args.endpoints, args.concurrency, args.duration,
+                           args.mjpeg_clients, args.mjpeg_path)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.json}")
@@ -0,0 +1,389 @@
+"""
+Log Queries
+Shared filters and partition-aware queries for the entry/exit logs
+"""
+
+import base64
+import binascii
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import select, union_all, tuple_, func, Select
+from database import db, VehicleCategory, VehicleEntry, VehicleExit
+from archive_manager import ENTRIES_TABLE, EXITS_TABLE, partitions_for_range
+
+class LogFilters:
+    """Filters accepted by the entry/exit log views"""
+
+    def __init__(self, category='', status='', date_from='', date_to=''):
+        """
+        Initialize filters
+
+        Args:
+            category: Display category ('' = all)
+            status: Entry status IN/OUT ('' = all)
+            date_from: Inclusive start date 'YYYY-MM-DD' ('' = unbounded)
+            date_to: Inclusive end date 'YYYY-MM-DD' ('' = unbounded)
+        """
+        self.category = category
+        self.status = status
+        self.date_from = date_from
+        self.date_to = date_to
+
+        self.start = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        self.end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+
+    @classmethod
+    def from_args(cls, args):
+        """Build filters from request args (or any mapping)"""
+        return cls(
+            category=args.get('category', ''),
+            status=args.get('status', ''),
+            date_from=args.get('date_from', ''),
+            date_to=args.get('date_to', '')
+        )
+
+    def as_dict(self, include_status=True):
+        """Raw filter values for templates"""
+        filters = {
+            'category': self.category,
+            'status': self.status,
+            'date_from': self.date_from,
+            'date_to': self.date_to
+        }
+        if not include_status:
+            del filters['status']
+        return filters
+
+def apply_entry_filters(query, filters, columns=VehicleEntry):
+    """
+    Apply entry log filters
+
+    Args:
+        query: ORM query or Core select
+        filters: LogFilters
+        columns: Model class or table.c exposing display_category/status/entry_datetime
+
+    Returns:
+        Filtered query
+    """
+    if filters.category:
+        query = query.filter(columns.display_category == filters.category)
+
+    if filters.status:
+        query = query.filter(columns.status == filters.status)
+
+    if filters.start:
+        query = query.filter(columns.entry_datetime >= filters.start)
+
+    if filters.end:
+        query = query.filter(columns.entry_datetime < filters.end)
+
+    return query
+
+def apply_exit_filters(query, filters, exit_columns=VehicleExit, category_column=VehicleEntry.display_category):
+    """
+    Apply exit log filters (status does not apply to exits)
+
+    Args:
+        query: ORM query or Core select
+        filters: LogFilters
+        exit_columns: Model class or table.c exposing exit_datetime
+        category_column: Column holding the display category
+
+    Returns:
+        Filtered query
+    """
+    if filters.category:
+        query = query.filter(category_column == filters.category)
+
+    if filters.start:
+        query = query.filter(exit_columns.exit_datetime >= filters.start)
+
+    if filters.end:
+        query = query.filter(exit_columns.exit_datetime < filters.end)
+
+    return query
+
+def filtered_entries_query(filters):
+    """ORM query over the hot entries table"""
+    return apply_entry_filters(VehicleEntry.query, filters)
+
+def filtered_exits_query(filters):
+    """ORM query over the hot exits table joined with entries"""
+    query = db.session.query(VehicleExit, VehicleEntry).join(
+        VehicleEntry, VehicleExit.entry_id == VehicleEntry.id
+    )
+    return apply_exit_filters(query, filters)
+
+def archived_entries_select(filters):
+    """
+    Core select over hot entries plus the archive partitions the range needs
+
+    Partitions are only consulted for a bounded range (date_from and/or
+    date_to), so unbounded listings keep touching the hot table alone.
+
+    Returns:
+        Select or None when no archive partition overlaps the filters
+    """
+    if not filters.start and not filters.end:
+        return None
+
+    partitions = partitions_for_range(ENTRIES_TABLE, filters.start, filters.end)
+    if not partitions:
+        return None
+
+    branches = [
+        apply_entry_filters(select(table), filters, table.c)
+        for table in [VehicleEntry.__table__] + partitions
+    ]
+    return select(union_all(*branches).subquery())
+
+def archived_exits_select(filters):
+    """
+    Core select over hot exits plus the archive partitions the range needs
+
+    Rows are flat: exit columns followed by the denormalized entry columns.
+    Like entries, partitions are only consulted for a bounded range.
+
+    Returns:
+        Select or None when no archive partition overlaps the filters
+    """
+    if not filters.start and not filters.end:
+        return None
+
+    partitions = partitions_for_range(EXITS_TABLE, filters.start, filters.end)
+    if not partitions:
+        return None
+
+    entries_table = VehicleEntry.__table__
+    branches = [apply_exit_filters(_flat_exits_select(), filters, VehicleExit.__table__.c,
+                                   entries_table.c.display_category)]
+    branches += [
+        apply_exit_filters(select(table), filters, table.c, table.c.display_category)
+        for table in partitions
+    ]
+    return select(union_all(*branches).subquery())
+
+def _flat_exits_select():
+    """Hot exits joined with the entry columns archived exits carry"""
+    exits_table = VehicleExit.__table__
+    entries_table = VehicleEntry.__table__
+
+    return select(
+        exits_table,
+        entries_table.c.display_category,
+        entries_table.c.original_class,
+        entries_table.c.entry_datetime,
+        entries_table.c.gate_id.label('entry_gate_id'),
+        entries_table.c.detection_confidence
+    ).join(entries_table, exits_table.c.entry_id == entries_table.c.id)
+
+def entries_select(filters):
+    """Core select of flat entry rows, including archive partitions when needed"""
+    archived = archived_entries_select(filters)
+    if archived is not None:
+        return archived
+
+    table = VehicleEntry.__table__
+    return select(apply_entry_filters(select(table), filters, table.c).subquery())
+
+def exits_select(filters):
+    """Core select of flat exit rows, including archive partitions when needed"""
+    archived = archived_exits_select(filters)
+    if archived is not None:
+        return archived
+
+    hot = apply_exit_filters(_flat_exits_select(), filters, VehicleExit.__table__.c,
+                             VehicleEntry.__table__.c.display_category)
+    return select(hot.subquery())
+
+def split_exit_row(row):
+    """Turn a flat archived exit row into an (exit, entry) pair like the ORM join"""
+    exit_log = SimpleNamespace(
+        id=row.id,
+        entry_id=row.entry_id,
+        exit_datetime=row.exit_datetime,
+        exit_image_path=row.exit_image_path,
+        duration_minutes=row.duration_minutes,
+        gate_id=row.gate_id,
+        created_at=row.created_at
+    )
+    entry = SimpleNamespace(
+        id=row.entry_id,
+        display_category=row.display_category,
+        original_class=row.original_class,
+        entry_datetime=row.entry_datetime,
+        gate_id=row.entry_gate_id,
+        detection_confidence=row.detection_confidence,
+        status='OUT'
+    )
+    return exit_log, entry
+
+class KeysetPagination:
+    """
+    Cursor (keyset) pagination over (datetime, id), newest first
+
+    Pages are fetched with a row-value comparison against the cursor instead
+    of OFFSET, and no COUNT(*) is issued, so every page costs the same.
+
+    The Flask-SQLAlchemy Pagination attributes the log pagers use (page,
+    pages, total, prev_num, next_num, iter_pages) are kept: a page number
+    without a cursor falls back to OFFSET, and total runs its COUNT(*)
+    only when read.
+    """
+
+    def __init__(self, query, datetime_column, id_column, key_func, per_page=50,
+                 after=None, before=None, row_factory=None, page=1):
+        """
+        Fetch one page
+
+        Args:
+            query: ORM query or Core select
+            datetime_column: Ordering datetime column
+            id_column: Tie-breaking id column
+            key_func: Function returning (datetime, id) for a fetched item
+            per_page: Items per page
+            after: Cursor of the last item of the previous page (older items)
+            before: Cursor of the first item of the next page (newer items)
+            row_factory: Optional converter applied to fetched rows
+            page: Number of the page fetched (passed along with cursors; alone, it is fetched by OFFSET)
+        """
+        self.per_page = per_page
+        self.page = max(page, 1)
+        self.count_query = query
+        self._total = None
+        key = tuple_(datetime_column, id_column)
+        backwards = before is not None and after is None
+
+        if backwards:
+            query = query.filter(key > tuple_(*decode_cursor(before)))
+            query = query.order_by(datetime_column.asc(), id_column.asc())
+        else:
+            if after is not None:
+                query = query.filter(key < tuple_(*decode_cursor(after)))
+            query = query.order_by(datetime_column.desc(), id_column.desc())
+            if after is None and self.page > 1:
+                query = query.offset((self.page - 1) * per_page)
+
+        query = query.limit(per_page + 1)
+        if isinstance(query, Select):
+            rows = db.session.execute(query).all()
+        else:
+            rows = query.all()
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if backwards:
+            rows.reverse()
+
+        self.items = [row_factory(row) for row in rows] if row_factory else rows
+
+        if backwards:
+            self.has_prev = has_more
+            self.has_next = True
+        else:
+            self.has_prev = after is not None or self.page > 1
+            self.has_next = has_more
+
+        self.prev_cursor = encode_cursor(*key_func(self.items[0])) if self.items and self.has_prev else None
+        self.next_cursor = encode_cursor(*key_func(self.items[-1])) if self.items and self.has_next else None
+
+    @property
+    def total(self):
+        """Rows matching the filters (COUNT(*) on first access)"""
+        if self._total is None:
+            if isinstance(self.count_query, Select):
+                count = select(func.count()).select_from(self.count_query.subquery())
+                self._total = db.session.execute(count).scalar()
+            else:
+                self._total = self.count_query.order_by(None).count()
+        return self._total
+
+    @property
+    def pages(self):
+        """Total number of pages"""
+        return math.ceil(self.total / self.per_page) if self.total else 0
+
+    @property
+    def prev_num(self):
+        """Previous page number, or None on the first page"""
+        return self.page - 1 if self.has_prev and self.page > 1 else None
+
+    @property
+    def next_num(self):
+        """Next page number, or None on the last page"""
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        """
+        Page numbers for a numbered pager, None marking skipped runs (as Flask-SQLAlchemy)
+
+        Numbered links are fetched by OFFSET; prev/next links should carry the cursors.
+        """
+        pages_end = self.pages + 1
+        if pages_end == 1:
+            return
+
+        left_end = min(1 + left_edge, pages_end)
+        yield from range(1, left_end)
+        if left_end == pages_end:
+            return
+
+        mid_start = max(left_end, self.page - left_current)
+        mid_end = min(self.page + right_current + 1, pages_end)
+        if mid_start - left_end > 0:
+            yield None
+        yield from range(mid_start, mid_end)
+        if mid_end == pages_end:
+            return
+
+        right_start = max(mid_end, pages_end - right_edge)
+        if right_start - mid_end > 0:
+            yield None
+        yield from range(right_start, pages_end)
+
+def encode_cursor(dt, row_id):
+    """Encode a (datetime, id) position as an opaque URL-safe cursor"""
+    raw = f"{dt.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        dt, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(dt), int(row_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+_category_cache = {'categories': None, 'loaded_at': 0.0}
+_category_lock = threading.Lock()
+
+def get_log_categories(max_age_seconds=300):
+    """
+    Get display categories for the log filter dropdowns
+
+    Read from the small vehicle_categories table and cached, instead of a
+    DISTINCT scan over every logged entry on each request.
+
+    Args:
+        max_age_seconds: Cache lifetime
+
+    Returns:
+        list: Sorted display category names
+    """
+    with _category_lock:
+        now = time.monotonic()
+        if _category_cache['categories'] is None or now - _category_cache['loaded_at'] > max_age_seconds:
+            rows = db.session.query(VehicleCategory.display_category).distinct().all()
+            _category_cache['categories'] = sorted(row[0] for row in rows)
+            _category_cache['loaded_at'] = now
+        return list(_category_cache['categories'])
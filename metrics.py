@@ -0,0 +1,374 @@
+"""
+Metrics
+Low-overhead in-process counters, gauges and latency histograms in Prometheus text format
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds (1 ms .. 5 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _format_labels(names, values, extra=None):
+    """Render {name="value",...} (empty string without labels)"""
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    rendered = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        rendered.append(f'{name}="{value}"')
+    return '{' + ','.join(rendered) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Metric family: one child per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, **labels):
+        """
+        Get the child for a set of label values
+
+        Resolve children once outside hot loops and keep the reference; the
+        child's methods only take its own lock.
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        """Child for a metric without labels"""
+        return self.labels()
+
+    def values(self):
+        """
+        Get the current value of every child
+
+        Returns:
+            dict: label values tuple -> value (see _value)
+        """
+        with self.lock:
+            children = list(self.children.items())
+        return {key: self._value(child) for key, child in children}
+
+    def render(self, remote=None):
+        """
+        Render this family in Prometheus text format
+
+        Args:
+            remote: label values tuple -> value reported by other processes, added to local values
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        values = self.values()
+        for key, value in (remote or {}).items():
+            values[key] = self._combine(values[key], value) if key in values else value
+        for key in sorted(values):
+            lines.extend(self._render_value(key, values[key]))
+        return lines
+
+    def _combine(self, value, other):
+        return value + other
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _value(self, child):
+        return child.value
+
+    def _render_value(self, key, value):
+        yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return self.function()
+            except Exception:
+                return float('nan')
+        return self.value
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def _value(self, child):
+        return child.get()
+
+    def _render_value(self, key, value):
+        yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        """
+        Get cumulative bucket counts
+
+        Returns:
+            tuple: ([(upper bound, cumulative count)], sum, count)
+        """
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        return _cumulative(self.buckets, counts, total)
+
+def _cumulative(buckets, counts, total):
+    """Per-bucket counts -> ([(upper bound, cumulative count)], sum, count)"""
+    cumulative, running = [], 0
+    for bound, count in zip(buckets + (float('inf'),), counts):
+        running += count
+        cumulative.append((bound, running))
+    return cumulative, total, running
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _value(self, child):
+        with child.lock:
+            return list(child.counts), child.sum
+
+    def _combine(self, value, other):
+        return [a + b for a, b in zip(value[0], other[0])], value[1] + other[1]
+
+    def _render_value(self, key, value):
+        cumulative, total, count = _cumulative(self.buckets, *value)
+        for bound, running in cumulative:
+            labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+            yield f'{self.name}_bucket{labels} {running}'
+        labels = _format_labels(self.labelnames, key)
+        yield f'{self.name}_sum{labels} {_format_value(total)}'
+        yield f'{self.name}_count{labels} {count}'
+
+class MetricsRegistry:
+    """Collection of metric families rendered together for /metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.remote = {}  # origin -> {metric name: {label values: value}}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """
+        Get every labelled series, to forward from a worker process
+
+        Unlabelled series (process start time, scheduler budget) describe
+        the worker process itself and are left out.
+
+        Returns:
+            list: (kind, name, documentation, labelnames, buckets, values) per family
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return [(metric.kind, metric.name, metric.documentation, metric.labelnames,
+                 getattr(metric, 'buckets', None), metric.values())
+                for metric in metrics if metric.labelnames]
+
+    def merge_remote(self, origin, snapshot):
+        """
+        Expose another process's metrics, added to this process's own series
+
+        Each call replaces the origin's previous snapshot.
+
+        Args:
+            origin: Name of the reporting process (e.g. 'camera-A')
+            snapshot: Result of snapshot() in that process
+        """
+        values = {}
+        for kind, name, documentation, labelnames, buckets, series in snapshot:
+            # Families only the worker imported are registered here too
+            if kind == 'counter':
+                self.counter(name, documentation, labelnames)
+            elif kind == 'gauge':
+                self.gauge(name, documentation, labelnames)
+            else:
+                self.histogram(name, documentation, labelnames, buckets)
+            values[name] = series
+        with self.lock:
+            self.remote[origin] = values
+
+    def forget_remote(self, origin):
+        """Stop exposing an origin's metrics"""
+        with self.lock:
+            self.remote.pop(origin, None)
+
+    def render(self):
+        """
+        Render all metrics, including those merged from other processes
+
+        Returns:
+            str: Prometheus text exposition format
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+            remotes = list(self.remote.values())
+        lines = []
+        for metric in metrics:
+            remote = {}
+            for values in remotes:
+                for key, value in values.get(metric.name, {}).items():
+                    remote[key] = metric._combine(remote[key], value) if key in remote else value
+            lines.extend(metric.render(remote))
+        return '\n'.join(lines) + '\n'
+
+# Global registry (one per process: web app, each gate service)
+registry = MetricsRegistry()
+
+# Pipeline stages: capture, inference, postprocess, tracking, drawing, encoding, image_save, db_commit, counter_flush
+STAGE_SECONDS = registry.histogram(
+    'parking_stage_seconds', 'Time spent in each pipeline stage', ('stage', 'source'))
+
+FRAMES_TOTAL = registry.counter(
+    'parking_frames_captured_total', 'Frames read from the camera', ('source',))
+
+FRAMES_DROPPED = registry.counter(
+    'parking_frames_dropped_total', 'Frames dropped because consumers fell behind', ('source',))
+
+CAPTURE_FAILURES = registry.counter(
+    'parking_capture_failures_total', 'Failed camera reads', ('source',))
+
+FRAME_QUEUE_DEPTH = registry.gauge(
+    'parking_frame_queue_depth', 'Frames waiting to be processed', ('source',))
+
+DETECTIONS_TOTAL = registry.counter(
+    'parking_detections_total', 'Vehicles detected', ('source', 'category'))
+
+CROSSINGS_TOTAL = registry.counter(
+    'parking_line_crossings_total', 'Vehicles counted crossing a line or entering/leaving a zone',
+    ('source', 'zone', 'direction', 'category'))
+
+ACTIVE_TRACKS = registry.gauge(
+    'parking_active_tracks', 'Vehicles currently tracked', ('source',))
+
+CAMERA_UP = registry.gauge(
+    'parking_camera_up', 'Camera delivering frames (1) or stalled/reconnecting (0)', ('source',))
+
+CAMERA_RECONNECTS = registry.counter(
+    'parking_camera_reconnects_total', 'Camera reopen attempts by result', ('source', 'result'))
+
+CAMERA_FRAME_AGE = registry.gauge(
+    'parking_camera_frame_age_seconds', 'Seconds since the camera last delivered a frame', ('source',))
+
+GATE_EVENTS = registry.counter(
+    'parking_gate_events_total', 'Gate entries/exits processed by outcome', ('gate', 'outcome'))
+
+PROCESS_START = registry.gauge('parking_process_start_time_seconds', 'Process start time (unix)')
+PROCESS_START.set(time.time())
+
+def stage_timer(stage, source):
+    """
+    Get the latency histogram for a pipeline stage
+
+    Args:
+        stage: Stage name (e.g. 'inference')
+        source: Camera, gate or service name
+
+    Returns:
+        Histogram child with observe() and time()
+    """
+    return STAGE_SECONDS.labels(stage=stage, source=source)
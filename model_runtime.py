@@ -0,0 +1,319 @@
+"""
+Model Runtime
+Export, validate and select optimized inference runtimes for the YOLO model
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+import cv2
+import numpy as np
+
+# Supported runtimes: ultralytics export format and artifact kind
+RUNTIMES = {
+    'pytorch': None,
+    'onnx': 'onnx',
+    'openvino': 'openvino'
+}
+
+PRECISIONS = ['fp32', 'fp16', 'int8']
+
+EXPORTS_DIR = 'exports'
+
+def exported_model_path(model_path, runtime, precision):
+    """
+    Path where an exported variant of a model is stored
+
+    Args:
+        model_path: Path to the source .pt model
+        runtime: 'pytorch', 'onnx' or 'openvino'
+        precision: 'fp32', 'fp16' or 'int8'
+
+    Returns:
+        Path: .onnx file or OpenVINO model directory (the .pt itself for pytorch)
+    """
+    if runtime == 'pytorch':
+        return Path(model_path)
+
+    source = Path(model_path)
+    export_dir = source.parent / EXPORTS_DIR
+    if runtime == 'onnx':
+        return export_dir / f"{source.stem}_{precision}.onnx"
+    return export_dir / f"{source.stem}_{precision}_openvino_model"
+
+def _check_variant(runtime, precision):
+    """Raise ValueError for unsupported runtime/precision combinations"""
+    if runtime not in RUNTIMES:
+        raise ValueError(f"Unknown runtime: {runtime} (expected one of {', '.join(RUNTIMES)})")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    if runtime == 'pytorch' and precision != 'fp32':
+        raise ValueError("The pytorch runtime only runs fp32 on CPU")
+
+def export_model(model_path, runtime, precision='fp32', imgsz=640, calibration_data=None):
+    """
+    Export a .pt model to an optimized runtime
+
+    ONNX INT8 is produced by dynamic quantization of the FP32 export with
+    onnxruntime. ONNX FP16 is converted from the FP32 export with
+    onnxconverter-common, because ultralytics ignores half=True for ONNX on
+    CPU and would write FP32 weights. OpenVINO INT8 uses ultralytics' NNCF calibration and needs a
+    dataset YAML (calibration_data).
+
+    Args:
+        model_path: Path to the source .pt model
+        runtime: 'onnx' or 'openvino'
+        precision: 'fp32', 'fp16' or 'int8'
+        imgsz: Export input size
+        calibration_data: Dataset YAML for OpenVINO INT8 calibration
+
+    Returns:
+        Path: Exported model path
+    """
+    from ultralytics import YOLO
+
+    _check_variant(runtime, precision)
+    if runtime == 'pytorch':
+        return Path(model_path)
+
+    target = exported_model_path(model_path, runtime, precision)
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"\n📦 Exporting {model_path} → {runtime} {precision}...")
+
+    if runtime == 'onnx' and precision == 'int8':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        fp32_path = exported_model_path(model_path, 'onnx', 'fp32')
+        if not fp32_path.exists():
+            export_model(model_path, 'onnx', 'fp32', imgsz=imgsz)
+
+        quantize_dynamic(str(fp32_path), str(target), weight_type=QuantType.QUInt8)
+        print(f"✅ Exported to {target}")
+        return target
+
+    if runtime == 'onnx' and precision == 'fp16':
+        import onnx
+        from onnxconverter_common import float16
+
+        fp32_path = exported_model_path(model_path, 'onnx', 'fp32')
+        if not fp32_path.exists():
+            export_model(model_path, 'onnx', 'fp32', imgsz=imgsz)
+
+        # FP32 inputs/outputs keep the pre/postprocessing unchanged
+        fp16_model = float16.convert_float_to_float16(onnx.load(str(fp32_path)), keep_io_types=True)
+        onnx.save(fp16_model, str(target))
+        print(f"✅ Exported to {target}")
+        return target
+
+    if runtime == 'openvino' and precision == 'int8' and not calibration_data:
+        raise ValueError("OpenVINO INT8 export needs calibration_data (dataset YAML)")
+
+    model = YOLO(model_path)
+    exported = model.export(
+        format=RUNTIMES[runtime],
+        imgsz=imgsz,
+        half=precision == 'fp16',
+        int8=precision == 'int8',
+        data=calibration_data,
+        dynamic=True  # allow batched inference (inference server)
+    )
+
+    # Ultralytics writes next to the .pt; move into the per-variant location
+    if target.exists():
+        if target.is_dir():
+            shutil.rmtree(target)
+        else:
+            target.unlink()
+    shutil.move(str(exported), str(target))
+
+    print(f"✅ Exported to {target}")
+    return target
+
+def resolve_model_path(model_path, runtime='pytorch', precision='fp32'):
+    """
+    Get the model file for the configured runtime, falling back to the .pt
+
+    Args:
+        model_path: Path to the source .pt model
+        runtime: Configured runtime
+        precision: Configured precision
+
+    Returns:
+        str: Path to load with YOLO(...)
+    """
+    try:
+        _check_variant(runtime, precision)
+    except ValueError as e:
+        print(f"⚠️  {e}, using PyTorch model")
+        return str(model_path)
+
+    candidate = exported_model_path(model_path, runtime, precision)
+    if candidate.exists():
+        return str(candidate)
+
+    if runtime != 'pytorch':
+        print(f"⚠️  {runtime} {precision} export not found at {candidate}, using PyTorch model")
+        print(f"   Run: python model_runtime.py export --runtime {runtime} --precision {precision}")
+    return str(model_path)
+
+def _box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between two (N, 4) / (M, 4) xyxy arrays"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)))
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / union, 0)
+
+def _predict(model, image, conf):
+    """Run a model and return (boxes, classes, confidences, seconds)"""
+    start = time.perf_counter()
+    result = model(image, conf=conf, verbose=False)[0]
+    elapsed = time.perf_counter() - start
+
+    boxes = result.boxes
+    return (boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int),
+            boxes.conf.cpu().numpy(), elapsed)
+
+def validate_export(reference_path, candidate_path, images, conf=0.25, iou_threshold=0.5,
+                    min_recall=0.95, min_precision=0.95):
+    """
+    Compare an exported model's detections against the reference .pt model
+
+    Detections are matched greedily by class and IoU. The candidate passes
+    when it recovers at least min_recall of the reference detections and at
+    least min_precision of its own detections match the reference.
+
+    Args:
+        reference_path: Path to the .pt model
+        candidate_path: Path to the exported model
+        images: Iterable of image paths
+        conf: Confidence threshold for both models
+        iou_threshold: Minimum IoU for a match
+        min_recall: Pass threshold for recall vs reference
+        min_precision: Pass threshold for precision vs reference
+
+    Returns:
+        dict: Agreement metrics, latencies and 'passed'
+    """
+    from ultralytics import YOLO
+
+    reference = YOLO(str(reference_path))
+    candidate = YOLO(str(candidate_path), task='detect')
+
+    reference_total = candidate_total = matched = 0
+    ious, confidence_deltas = [], []
+    reference_times, candidate_times = [], []
+
+    for image_path in images:
+        image = cv2.imread(str(image_path))
+        if image is None:
+            continue
+
+        ref_boxes, ref_classes, ref_conf, ref_time = _predict(reference, image, conf)
+        cand_boxes, cand_classes, cand_conf, cand_time = _predict(candidate, image, conf)
+        reference_times.append(ref_time)
+        candidate_times.append(cand_time)
+
+        reference_total += len(ref_boxes)
+        candidate_total += len(cand_boxes)
+
+        iou = _box_iou(ref_boxes, cand_boxes)
+        if iou.size:
+            iou[ref_classes[:, None] != cand_classes[None, :]] = 0
+
+        used = set()
+        for r in np.argsort(-ref_conf):
+            if not iou.size:
+                break
+            order = np.argsort(-iou[r])
+            for c in order:
+                if iou[r, c] < iou_threshold:
+                    break
+                if c in used:
+                    continue
+                used.add(c)
+                matched += 1
+                ious.append(iou[r, c])
+                confidence_deltas.append(abs(ref_conf[r] - cand_conf[c]))
+                break
+
+    # Skip the first (warm-up) inference in latency figures
+    def median_ms(times):
+        return float(np.median(times[1:] if len(times) > 1 else times) * 1000) if times else 0.0
+
+    recall = matched / reference_total if reference_total else 1.0
+    precision = matched / candidate_total if candidate_total else 1.0
+    reference_ms = median_ms(reference_times)
+    candidate_ms = median_ms(candidate_times)
+
+    return {
+        'images': len(reference_times),
+        'reference_detections': reference_total,
+        'candidate_detections': candidate_total,
+        'recall': recall,
+        'precision': precision,
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'mean_confidence_delta': float(np.mean(confidence_deltas)) if confidence_deltas else 0.0,
+        'reference_ms': reference_ms,
+        'candidate_ms': candidate_ms,
+        'speedup': reference_ms / candidate_ms if candidate_ms else 0.0,
+        'passed': recall >= min_recall and precision >= min_precision
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export and validate optimized model runtimes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Export best.pt to an optimized runtime')
+    export_parser.add_argument('--model', default='best.pt')
+    export_parser.add_argument('--runtime', choices=['onnx', 'openvino'], required=True)
+    export_parser.add_argument('--precision', choices=PRECISIONS, default='fp32')
+    export_parser.add_argument('--imgsz', type=int, default=640)
+    export_parser.add_argument('--data', help='Dataset YAML for INT8 calibration')
+
+    validate_parser = subparsers.add_parser('validate', help='Compare an export against best.pt')
+    validate_parser.add_argument('--model', default='best.pt')
+    validate_parser.add_argument('--runtime', choices=['onnx', 'openvino'], required=True)
+    validate_parser.add_argument('--precision', choices=PRECISIONS, default='fp32')
+    validate_parser.add_argument('--images', required=True, help='Directory of validation images')
+    validate_parser.add_argument('--limit', type=int, default=100)
+
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("MODEL RUNTIME")
+    print("=" * 70)
+
+    if args.command == 'export':
+        export_model(args.model, args.runtime, args.precision, imgsz=args.imgsz, calibration_data=args.data)
+    else:
+        candidate = exported_model_path(args.model, args.runtime, args.precision)
+        if not os.path.exists(candidate):
+            print(f"\n❌ Export not found: {candidate}")
+            sys.exit(1)
+        else:
+            image_dir = Path(args.images)
+            images = sorted(list(image_dir.glob('*.jpg')) + list(image_dir.glob('*.png')))[:args.limit]
+            report = validate_export(args.model, candidate, images)
+
+            print(f"\n📊 Validation ({report['images']} images):")
+            print(f"   Recall vs .pt: {report['recall']:.2%}")
+            print(f"   Precision vs .pt: {report['precision']:.2%}")
+            print(f"   Mean IoU: {report['mean_iou']:.3f}")
+            print(f"   Mean confidence delta: {report['mean_confidence_delta']:.3f}")
+            print(f"   Latency: {report['reference_ms']:.1f} ms → {report['candidate_ms']:.1f} ms "
+                  f"({report['speedup']:.2f}x)")
+            print(f"\n{'✅ PASSED' if report['passed'] else '❌ FAILED'}")
+            # Non-zero exit lets the check gate CI and deployments
+            sys.exit(0 if report['passed'] else 1)
@@ -0,0 +1,376 @@
+"""
+Occupancy Forecast
+Seasonal hourly occupancy and time-to-full forecasts from the entry/exit logs
+"""
+
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.exc import OperationalError
+from database import db, create_db_app, VehicleEntry, VehicleExit, ParkingSlot
+from archive_manager import ENTRIES_TABLE, EXITS_TABLE, PARTITION_DATETIME_COLUMNS, partitions_for_range
+from structured_logging import log_event
+
+logger = logging.getLogger('occupancy_forecast')
+
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = 7 * HOURS_PER_DAY
+
+# Same-hour-of-week origins needed before the weekly profile is trusted;
+# with less history the forecast falls back to same-hour-of-day origins
+MIN_WEEKLY_SAMPLES = 4
+
+# Band of the forecast: mean +/- this many weighted standard deviations (~80%)
+BAND_Z = 1.28
+
+class HourlyFlows:
+    """
+    Entries and exits per hour since the first logged hour
+
+    last_ids holds the highest hot-table ID counted per kind: log IDs only
+    grow, so rows past it are exactly the rows not counted yet, whatever
+    their timestamps (late commits and backfills included).
+    """
+
+    def __init__(self):
+        self.start = None  # numpy.datetime64 hour of index 0
+        self.entries = np.zeros(0)
+        self.exits = np.zeros(0)
+        self.last_ids = {'entries': 0, 'exits': 0}
+        self.version = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, kind, hours, counts):
+        """Add per-hour counts ('entries' or 'exits'), growing the series as needed"""
+        if not len(hours):
+            return
+        if self.start is None:
+            self.start = hours.min()
+        if hours.min() < self.start:
+            pad = int((self.start - hours.min()).astype(int))
+            self.entries = np.concatenate([np.zeros(pad), self.entries])
+            self.exits = np.concatenate([np.zeros(pad), self.exits])
+            self.start = hours.min()
+        self.extend_to(int((hours.max() - self.start).astype(int)) + 1)
+        np.add.at(getattr(self, kind), (hours - self.start).astype(int), counts)
+
+    def extend_to(self, length):
+        """Pad with empty hours up to length"""
+        if length > len(self.entries):
+            pad = np.zeros(length - len(self.entries))
+            self.entries = np.concatenate([self.entries, pad])
+            self.exits = np.concatenate([self.exits, pad])
+
+    def hour_index(self, moment):
+        """Index of the hour containing moment (may lie past the end)"""
+        return int((np.datetime64(moment, 'h') - self.start).astype(int))
+
+def hourly_counts(table, column, after_id=0):
+    """
+    Rows per hour of one log table, counted by the database
+
+    Args:
+        table: Hot table or archive partition
+        column: Datetime column name
+        after_id: Only count rows with a higher ID
+
+    Returns:
+        tuple: (numpy datetime64[h] array, float count array, highest ID counted)
+    """
+    bucket = func.strftime('%Y-%m-%dT%H', table.c[column])
+    query = select(bucket, func.count(), func.max(table.c.id)).group_by(bucket)
+    if after_id:
+        query = query.where(table.c.id > after_id)
+    rows = [row for row in db.session.execute(query).all() if row[0] is not None]
+    if not rows:
+        return np.array([], dtype='datetime64[h]'), np.array([]), after_id
+    return (np.array([row[0] for row in rows], dtype='datetime64[h]'),
+            np.array([row[1] for row in rows], dtype=np.float64),
+            max(row[2] for row in rows))
+
+def archive_partitions(base_table):
+    """
+    Archive partitions of a log table, or none when the registry cannot be read
+
+    Returns:
+        list: Partition tables, oldest first
+    """
+    try:
+        return partitions_for_range(base_table)
+    except OperationalError as e:
+        db.session.rollback()
+        log_event(logger, logging.WARNING, 'forecast.no_partition_registry',
+                  f"⚠️  Archive partitions unavailable, forecasting from hot tables only: {e}",
+                  rate_limit=3600, table=base_table)
+        return []
+
+def seasonal_deltas(series, origin, horizon, period, max_samples):
+    """
+    Windows of a series following past origins at the same phase
+
+    Args:
+        series: 1-D array indexed by hour
+        origin: Index of the hour the forecast starts after
+        horizon: Hours ahead
+        period: Season length in hours (168 weekly, 24 daily)
+        max_samples: Most recent origins used
+
+    Returns:
+        tuple: (windows as (samples, horizon + 1) array, age of each origin in periods)
+    """
+    ages = np.arange(1, max_samples + 1)
+    origins = origin - ages * period
+    # Windows must lie in the past and inside the history
+    keep = (origins >= 0) & (origins + horizon <= origin)
+    origins, ages = origins[keep], ages[keep]
+    windows = series[origins[:, None] + np.arange(horizon + 1)[None, :]]
+    return windows, ages
+
+def weighted_stats(values, weights):
+    """Weighted mean and standard deviation over the first axis"""
+    weights = weights[:, None] / weights.sum()
+    mean = (values * weights).sum(axis=0)
+    std = np.sqrt((((values - mean) ** 2) * weights).sum(axis=0))
+    return mean, std
+
+def time_to_full(now, demand, capacity):
+    """
+    Minutes until demand first reaches capacity
+
+    Args:
+        now: Forecast start (demand[0] is the current occupancy)
+        demand: Occupancy at now and at each following hour boundary
+        capacity: Spaces in the lot
+
+    Returns:
+        float: Minutes (0 if already full), or None if the lot stays below capacity
+    """
+    if not capacity:
+        return None
+    full = np.flatnonzero(demand >= capacity)
+    if not len(full):
+        return None
+    k = int(full[0])
+    if k == 0:
+        return 0.0
+    # Linear within the hour the lot fills; the first step is shorter than an hour
+    step_start = 0.0 if k == 1 else 60.0 - now.minute - now.second / 60.0 + (k - 2) * 60.0
+    step_length = 60.0 - now.minute - now.second / 60.0 if k == 1 else 60.0
+    fraction = (capacity - demand[k - 1]) / (demand[k] - demand[k - 1])
+    return step_start + fraction * step_length
+
+class OccupancyForecaster:
+    """
+    Forecast occupancy for the next hours from the entry/exit history
+
+    The logs are reduced to entries and exits per hour in SQL; after the
+    first load only rows added since the last refresh are read, so a
+    refit costs two small queries plus a few vectorized NumPy operations.
+    The model is seasonal: the expected change in occupancy over the next
+    k hours is the exponentially weighted mean change observed after the
+    same hour of the week (same hour of the day while history is short),
+    added to the lot's current occupancy. Anchoring on the live count
+    keeps entries that never got an exit from skewing the level.
+    """
+
+    def __init__(self, horizon_hours=24, half_life_weeks=8.0, refresh_interval=300.0,
+                 full_reload_interval=86400.0, max_weeks=260, clock=datetime.utcnow):
+        """
+        Initialize forecaster
+
+        Args:
+            horizon_hours: Hours forecast ahead
+            half_life_weeks: Age at which a past week counts half as much
+            refresh_interval: Minimum seconds between reads of new log rows
+            full_reload_interval: Seconds between full reloads (picks up edited or purged history)
+            max_weeks: Most recent weeks of history the model uses
+            clock: Current time in the logs' timezone (rows are stamped in UTC)
+        """
+        self.horizon_hours = horizon_hours
+        self.half_life_weeks = half_life_weeks
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.max_weeks = max_weeks
+        self.clock = clock
+        self.flows = HourlyFlows()
+        self.last_refresh = float('-inf')
+        self.last_full_load = float('-inf')
+        self.cached_key = None
+        self.cached = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a full reload on the next forecast"""
+        with self.lock:
+            self.last_full_load = float('-inf')
+
+    def refresh(self):
+        """Read log rows added since the last refresh (all history on the first call)"""
+        now = time.monotonic()
+        if now - self.last_full_load >= self.full_reload_interval:
+            self._load(full=True)
+            self.last_full_load = now
+        elif now - self.last_refresh >= self.refresh_interval:
+            self._load(full=False)
+        else:
+            return
+        self.last_refresh = now
+
+    def _load(self, full):
+        flows = HourlyFlows() if full else self.flows
+        added = False
+        for kind, model, base_table in (('entries', VehicleEntry, ENTRIES_TABLE),
+                                        ('exits', VehicleExit, EXITS_TABLE)):
+            column = PARTITION_DATETIME_COLUMNS[base_table]
+            if full:
+                # Archived rows were counted while hot, so partitions are only read here
+                for table in archive_partitions(base_table):
+                    hours, counts, _ = hourly_counts(table, column)
+                    flows.add(kind, hours, counts)
+            hours, counts, last_id = hourly_counts(model.__table__, column, flows.last_ids[kind])
+            flows.add(kind, hours, counts)
+            flows.last_ids[kind] = last_id
+            added = added or len(hours) > 0
+
+        if full or added:
+            flows.version = self.flows.version + 1
+        self.flows = flows
+
+    def forecast(self, capacity=None, occupied=None):
+        """
+        Forecast the next horizon_hours
+
+        Args:
+            capacity: Spaces in the lot (None = read ParkingSlot)
+            occupied: Vehicles parked now (None = read ParkingSlot)
+
+        Returns:
+            dict: Forecast (see _build); 'available' is False without enough history
+        """
+        if capacity is None or occupied is None:
+            parking = ParkingSlot.query.first()
+            if capacity is None:
+                capacity = parking.total_capacity if parking else None
+            if occupied is None:
+                occupied = parking.occupied_count if parking else 0
+
+        with self.lock:
+            self.refresh()
+
+            now = self.clock()
+            key = (now.replace(minute=0, second=0, microsecond=0), self.flows.version, capacity, occupied)
+            if key != self.cached_key:
+                self.cached = self._build(now, capacity, occupied)
+                self.cached_key = key
+            return self.cached
+
+    def _build(self, now, capacity, occupied):
+        """Fit the seasonal profile for the current hour and project it from the live occupancy"""
+        flows = self.flows
+        result = {
+            'generated_at': now.isoformat(),
+            'capacity': capacity,
+            'occupied': occupied,
+            'horizon_hours': self.horizon_hours,
+            'available': False
+        }
+        if flows.start is None:
+            result['reason'] = 'No entry/exit history'
+            return result
+
+        # Forecast starts after the last complete hour; hours without rows had no traffic
+        origin = flows.hour_index(now) - 1
+        if origin < 0:
+            result['reason'] = 'History starts in the current hour'
+            return result
+        flows.extend_to(origin + 1)
+        net = np.cumsum(flows.entries - flows.exits)
+
+        period, unit_weeks = HOURS_PER_WEEK, 1.0
+        windows, ages = seasonal_deltas(net, origin, self.horizon_hours, HOURS_PER_WEEK, self.max_weeks)
+        if len(ages) < MIN_WEEKLY_SAMPLES:
+            period, unit_weeks = HOURS_PER_DAY, 1.0 / 7
+            windows, ages = seasonal_deltas(net, origin, self.horizon_hours, HOURS_PER_DAY, self.max_weeks * 7)
+        if not len(ages):
+            result['reason'] = f'Need at least one day of history (have {len(flows)} hours)'
+            return result
+
+        weights = 0.5 ** (ages * unit_weeks / self.half_life_weeks)
+        change, spread = weighted_stats(windows - windows[:, :1], weights)
+
+        # Expected arrivals/departures per hour come from the same origins
+        steps = np.arange(1, self.horizon_hours + 1)
+        rows = (origin - ages * period)[:, None] + steps[None, :]
+        entries, _ = weighted_stats(flows.entries[rows], weights)
+        exits, _ = weighted_stats(flows.exits[rows], weights)
+
+        demand = np.maximum(occupied + change, 0.0)
+        low = np.maximum(demand - BAND_Z * spread, 0.0)
+        high = demand + BAND_Z * spread
+
+        boundaries = [now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=int(k)) for k in steps]
+        hours = [{
+            'time': boundary.isoformat(),
+            'demand': round(float(demand[k]), 1),
+            'low': round(float(low[k]), 1),
+            'high': round(float(high[k]), 1),
+            'overflow': round(max(0.0, float(demand[k]) - capacity), 1) if capacity else 0.0,
+            'entries': round(float(entries[k - 1]), 1),
+            'exits': round(float(exits[k - 1]), 1)
+        } for k, boundary in zip(steps, boundaries)]
+
+        peak = int(np.argmax(demand[1:])) + 1
+        minutes = time_to_full(now, demand, capacity)
+        minutes_high = time_to_full(now, high, capacity)
+        result.update({
+            'available': True,
+            'model': 'weekly' if period == HOURS_PER_WEEK else 'daily',
+            'samples': int(len(ages)),
+            'history_start': flows.start.astype(datetime).isoformat(),
+            'hours': hours,
+            'peak': {'time': boundaries[peak - 1].isoformat(), 'demand': round(float(demand[peak]), 1)},
+            'time_to_full_minutes': round(minutes) if minutes is not None else None,
+            'full_at': (now + timedelta(minutes=minutes)).isoformat() if minutes is not None else None,
+            'time_to_full_minutes_high': round(minutes_high) if minutes_high is not None else None,
+            'full_at_high': (now + timedelta(minutes=minutes_high)).isoformat() if minutes_high is not None else None
+        })
+        return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Forecast parking occupancy from the entry/exit logs')
+    parser.add_argument('--hours', type=int, default=24, help='Hours forecast ahead')
+    parser.add_argument('--half-life', type=float, default=8.0, help='Weeks after which history counts half')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("OCCUPANCY FORECAST")
+    print("=" * 70)
+
+    app = create_db_app(__name__)
+    with app.app_context():
+        forecaster = OccupancyForecaster(horizon_hours=args.hours, half_life_weeks=args.half_life)
+        started = time.perf_counter()
+        forecast = forecaster.forecast()
+        elapsed = time.perf_counter() - started
+
+    print(f"\n⏱️  Loaded and fitted in {elapsed:.2f}s ({len(forecaster.flows)} hours of history)")
+    if not forecast['available']:
+        print(f"⚠️  {forecast['reason']}")
+    else:
+        print(f"🅿️  Occupied now: {forecast['occupied']} / {forecast['capacity']} "
+              f"({forecast['model']} model, {forecast['samples']} samples)")
+        for hour in forecast['hours']:
+            print(f"   {hour['time']}  {hour['demand']:7.1f}  [{hour['low']:.1f} – {hour['high']:.1f}]"
+                  f"  +{hour['entries']:.1f} / -{hour['exits']:.1f}")
+        if forecast['time_to_full_minutes'] is not None:
+            print(f"\n🚨 Expected full in {forecast['time_to_full_minutes']} min ({forecast['full_at']})")
+        elif forecast['time_to_full_minutes_high'] is not None:
+            print(f"\n⚠️  May fill in {forecast['time_to_full_minutes_high']} min on a busy day")
+        else:
+            print("\n✅ Not expected to fill")
@@ -0,0 +1,190 @@
+"""
+Overlay Renderer
+Frame annotation that blends only the panel rectangles and reuses cached text and track layers
+"""
+
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+class TextSprite:
+    """
+    Text rendered once into a coverage mask and blended onto frames
+
+    The mask is the text drawn in white on black, so blending the text colour
+    by its coverage reproduces what cv2.putText draws (to within rounding).
+    """
+
+    def __init__(self, text, scale, color, thickness):
+        """
+        Render text
+
+        Args:
+            text: Text to draw
+            scale: Font scale
+            color: BGR colour
+            thickness: Stroke thickness
+        """
+        (width, height), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = 2 * thickness + 2
+        self.origin = (pad, height + pad)
+        mask = np.zeros((height + baseline + 2 * pad, width + 2 * pad), dtype=np.uint8)
+        cv2.putText(mask, text, self.origin, FONT, scale, 255, thickness)
+
+        # Trim to the pixels actually drawn
+        rows = np.flatnonzero(mask.any(axis=1))
+        cols = np.flatnonzero(mask.any(axis=0))
+        if len(rows):
+            mask = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+            self.origin = (self.origin[0] - cols[0], self.origin[1] - rows[0])
+        self.alpha = mask.astype(np.float32) / 255.0
+        self.background = 1.0 - self.alpha
+        self.fill = np.empty(mask.shape + (3,), dtype=np.uint8)
+        self.fill[:] = color
+
+    def draw(self, frame, org):
+        """
+        Stamp the text with its baseline origin at org (clipped to the frame)
+
+        Args:
+            frame: BGR frame (modified in place)
+            org: (x, y) text origin, as for cv2.putText
+        """
+        x = int(org[0]) - self.origin[0]
+        y = int(org[1]) - self.origin[1]
+        height, width = self.alpha.shape
+        frame_height, frame_width = frame.shape[:2]
+
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame_width), min(y + height, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        window = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+        region = frame[y0:y1, x0:x1]
+        region[:] = cv2.blendLinear(region, self.fill[window], self.background[window], self.alpha[window])
+
+class _TrackLayer:
+    """Cached drawing inputs of one track (rebuilt only when the track changes)"""
+
+    __slots__ = ('key', 'color', 'box', 'label', 'label_org', 'points')
+
+class OverlayRenderer:
+    """
+    Draws count panels, labels and tracks onto frames
+
+    Panels are darkened by blending only their rectangle instead of copying and
+    blending the whole frame; text is rendered once per distinct string and
+    stamped; per-track boxes, labels and trajectory arrays are rebuilt only for
+    tracks that moved or changed state since the previous frame.
+    """
+
+    def __init__(self, max_sprites=1024):
+        """
+        Initialize renderer
+
+        Args:
+            max_sprites: Distinct text strings kept rendered (least recently used evicted)
+        """
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self.tracks = {}
+
+    def sprite(self, text, scale, color, thickness=2):
+        """Get the cached sprite for a text style, rendering it on first use"""
+        key = (text, scale, tuple(color), thickness)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = TextSprite(text, scale, color, thickness)
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        else:
+            self.sprites.move_to_end(key)
+        return sprite
+
+    def put_text(self, frame, text, org, scale, color, thickness=2):
+        """Drop-in replacement for cv2.putText(frame, text, org, FONT_HERSHEY_SIMPLEX, ...)"""
+        self.sprite(text, scale, color, thickness).draw(frame, org)
+
+    def shade_rect(self, frame, top_left, bottom_right, alpha=0.7):
+        """
+        Darken a filled rectangle as a black overlay blended at alpha would
+
+        Args:
+            frame: BGR frame (modified in place)
+            top_left: (x, y) inclusive
+            bottom_right: (x, y) inclusive, as for cv2.rectangle
+            alpha: Overlay opacity
+        """
+        frame_height, frame_width = frame.shape[:2]
+        x0, y0 = max(top_left[0], 0), max(top_left[1], 0)
+        x1, y1 = min(bottom_right[0] + 1, frame_width), min(bottom_right[1] + 1, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        roi = frame[y0:y1, x0:x1]
+        roi[:] = cv2.addWeighted(roi, 1.0 - alpha, roi, 0.0, 0)
+
+    def draw_panel(self, frame, x, y, title, title_color, rows, size=(230, 150)):
+        """
+        Draw a shaded statistics panel
+
+        Args:
+            frame: BGR frame (modified in place)
+            x, y: Panel top-left corner
+            title: Panel heading
+            title_color: BGR heading colour
+            rows: Lines of white text below the heading
+            size: (width, height) of the shaded box
+        """
+        self.shade_rect(frame, (x, y), (x + size[0], y + size[1]))
+        self.put_text(frame, title, (x + 10, y + 30), 0.8, title_color)
+
+        y_offset = y + 60
+        for row in rows:
+            self.put_text(frame, row, (x + 10, y_offset), 0.6, (255, 255, 255))
+            y_offset += 25
+
+    def draw_tracks(self, frame, trackers, color_for, label_for):
+        """
+        Draw boxes, labels and trajectories for all tracks
+
+        Args:
+            frame: BGR frame (modified in place)
+            trackers: Dict track_id -> VehicleTracker
+            color_for: Function(tracker) -> BGR colour
+            label_for: Function(track_id, tracker) -> label text
+        """
+        polylines = {}
+        seen = set()
+        for track_id, tracker in list(trackers.items()):
+            seen.add(track_id)
+            key = (tracker.version, tracker.counted, tracker.direction, tracker.category)
+            layer = self.tracks.get(track_id)
+            if layer is None or layer.key != key:
+                layer = self._build_track(track_id, tracker, key, color_for, label_for)
+                self.tracks[track_id] = layer
+
+            cv2.rectangle(frame, layer.box[0], layer.box[1], layer.color, 2)
+            layer.label.draw(frame, layer.label_org)
+            if layer.points is not None:
+                polylines.setdefault(layer.color, []).append(layer.points)
+
+        # One polylines call per colour instead of one per track
+        for color, points in polylines.items():
+            cv2.polylines(frame, points, False, color, 2)
+
+        for track_id in self.tracks.keys() - seen:
+            del self.tracks[track_id]
+
+    def _build_track(self, track_id, tracker, key, color_for, label_for):
+        layer = _TrackLayer()
+        layer.key = key
+        layer.color = tuple(color_for(tracker))
+        x1, y1, x2, y2 = map(int, tracker.bbox)
+        layer.box = ((x1, y1), (x2, y2))
+        layer.label = self.sprite(label_for(track_id, tracker), 0.6, layer.color)
+        layer.label_org = (x1, y1 - 10)
+        layer.points = (np.array(tracker.positions, dtype=np.int32)
+                        if len(tracker.positions) > 1 else None)
+        return layer
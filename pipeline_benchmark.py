@@ -0,0 +1,490 @@
+"""
+Pipeline Benchmark
+Headless replay of recorded or synthetic video through the full counting pipeline
+
+CameraManager -> VehicleDetectionService -> VehicleCounter -> DB logging,
+reporting per-stage latency percentiles, FPS, memory and count accuracy.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import cv2
+import numpy as np
+from flask import Flask
+from camera_manager import CameraManager
+from database import db, VehicleCategory, VehicleEntry
+from vehicle_counter import VehicleCounter
+from counting_zones import parse_zones
+from structured_logging import setup_logging
+
+# Synthetic vehicle colors (BGR) per category, also used by the color detector
+CATEGORY_COLORS = {
+    'Car': (0, 200, 0),
+    '2-Wheeler': (255, 0, 0),
+    'Bus': (0, 200, 200),
+    'Truck': (0, 120, 255)
+}
+
+# Synthetic vehicle sizes (width, height) per category
+CATEGORY_SIZES = {
+    'Car': (110, 60),
+    '2-Wheeler': (60, 35),
+    'Bus': (200, 80),
+    'Truck': (170, 75)
+}
+
+CATEGORY_CLASSES = {
+    'Car': 'car',
+    '2-Wheeler': 'motorbike',
+    'Bus': 'bus',
+    'Truck': 'truck'
+}
+
+class SyntheticVideoSource:
+    """
+    cv2.VideoCapture-compatible generator of vehicles crossing the frame
+
+    Vehicles drive horizontally in separate lanes and cross the center line
+    exactly once, so the expected IN/OUT counts are known.
+    """
+
+    def __init__(self, frames=900, vehicles=20, width=1280, height=720, seed=42):
+        """
+        Initialize source
+
+        Args:
+            frames: Number of frames before end of stream
+            vehicles: Number of vehicles to spawn
+            width: Frame width
+            height: Frame height
+            seed: Random seed (runs are reproducible)
+        """
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.position = 0
+        self.opened = True
+
+        rng = np.random.default_rng(seed)
+        noise = rng.integers(40, 80, size=(height, width, 1), dtype=np.uint8)
+        self.background = np.repeat(noise, 3, axis=2)
+
+        lanes = max(1, (height - 100) // 100)
+        categories = list(CATEGORY_COLORS)
+
+        self.vehicles = []
+        spawn_window = max(1, frames - 200)
+        for i in range(vehicles):
+            category = categories[rng.integers(len(categories))]
+            lane = i % lanes
+            direction = 1 if lane % 2 == 0 else -1  # one direction per lane, no head-on overlaps
+            speed = float(rng.uniform(8, 18))
+            width_px, height_px = CATEGORY_SIZES[category]
+            self.vehicles.append({
+                'category': category,
+                'direction': direction,
+                'speed': speed,
+                'size': (width_px, height_px),
+                'lane_y': 80 + lane * 100,
+                'start_frame': int(i * spawn_window / max(1, vehicles)),
+                'start_x': -width_px if direction > 0 else width
+            })
+
+    def ground_truth(self):
+        """
+        Expected counts for vehicles that fully cross the center line in time
+
+        Returns:
+            dict: {'IN': {category: n}, 'OUT': {category: n}} (RIGHT = IN)
+        """
+        truth = {'IN': defaultdict(int), 'OUT': defaultdict(int)}
+        center = self.width / 2
+        for v in self.vehicles:
+            frames_to_clear = (abs(center - v['start_x']) + v['size'][0]) / v['speed']
+            if v['start_frame'] + frames_to_clear + 10 < self.frames:
+                truth['IN' if v['direction'] > 0 else 'OUT'][v['category']] += 1
+        return {key: dict(values) for key, values in truth.items()}
+
+    def isOpened(self):
+        return self.opened
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames
+        if prop == cv2.CAP_PROP_FPS:
+            return 30
+        return 0
+
+    def release(self):
+        self.opened = False
+
+    def read(self):
+        """Render the next frame"""
+        if self.position >= self.frames:
+            return False, None
+
+        frame = self.background.copy()
+        t = self.position
+        for v in self.vehicles:
+            if t < v['start_frame']:
+                continue
+            x = int(v['start_x'] + v['direction'] * v['speed'] * (t - v['start_frame']))
+            w, h = v['size']
+            if x + w < 0 or x > self.width:
+                continue
+            y = v['lane_y']
+            cv2.rectangle(frame, (x, y), (x + w, y + h), CATEGORY_COLORS[v['category']], -1)
+
+        self.position += 1
+        return True, frame
+
+class TimedCapture:
+    """Capture wrapper that records read() latency and end of stream"""
+
+    def __init__(self, capture, latencies):
+        self.capture = capture
+        self.latencies = latencies
+        self.exhausted = False
+
+    def read(self):
+        start = time.perf_counter()
+        ret, frame = self.capture.read()
+        if ret:
+            self.latencies.append(time.perf_counter() - start)
+        else:
+            self.exhausted = True
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self.capture, name)
+
+class ColorBlobDetector:
+    """
+    Model-free detector for synthetic frames (finds the category colors)
+
+    Returns detections in the same format as VehicleDetectionService, so the
+    tracker, counter and DB stages can be benchmarked without a model.
+    """
+
+    def __init__(self, min_area=800):
+        self.min_area = min_area
+
+    def detect_vehicles(self, image):
+        detections = []
+        for category, color in CATEGORY_COLORS.items():
+            lower = np.clip(np.array(color, dtype=np.int16) - 20, 0, 255).astype(np.uint8)
+            upper = np.clip(np.array(color, dtype=np.int16) + 20, 0, 255).astype(np.uint8)
+            mask = cv2.inRange(image, lower, upper)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                x, y, w, h = cv2.boundingRect(contour)
+                if w * h < self.min_area:
+                    continue
+                original_class = CATEGORY_CLASSES[category]
+                detections.append({
+                    'class_id': 0,
+                    'original_class': original_class,
+                    'display_category': category,
+                    'confidence': 1.0,
+                    'bbox': [float(x), float(y), float(x + w), float(y + h)],
+                    'parking_applicable': original_class == 'car'
+                })
+        return detections
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None if unavailable)"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        return None
+
+def summarize_latencies(samples):
+    """Percentiles (ms) for a list of durations in seconds"""
+    if not samples:
+        return None
+    values = np.array(samples) * 1000
+    return {
+        'count': int(values.size),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max())
+    }
+
+def count_accuracy(counts, truth):
+    """
+    Compare counter output against ground truth
+
+    Returns:
+        dict: Per-direction/category errors and overall accuracy
+    """
+    errors = {}
+    total_truth = total_error = 0
+    for direction in ('IN', 'OUT'):
+        predicted = counts.get(direction, {})
+        expected = truth.get(direction, {})
+        for category in set(predicted) | set(expected):
+            error = predicted.get(category, 0) - expected.get(category, 0)
+            errors[f"{direction}/{category}"] = {
+                'expected': expected.get(category, 0),
+                'counted': predicted.get(category, 0),
+                'error': error
+            }
+            total_truth += expected.get(category, 0)
+            total_error += abs(error)
+
+    return {
+        'by_class': errors,
+        'expected_total': total_truth,
+        'absolute_error': total_error,
+        'accuracy': 1 - total_error / total_truth if total_truth else None
+    }
+
+def create_benchmark_db(path):
+    """Flask app with a scratch database for the DB logging stage"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for original_class, display in (('car', 'Car'), ('motorbike', '2-Wheeler'),
+                                        ('bus', 'Bus'), ('truck', 'Truck')):
+            db.session.add(VehicleCategory(original_class=original_class, display_category=display,
+                                           parking_applicable=original_class == 'car'))
+        db.session.commit()
+    return app
+
+def run_benchmark(source_factory, detector, truth=None, max_frames=None, realtime=False,
+                  encode=True, log_to_db=True, zones=None):
+    """
+    Replay a source through the full pipeline
+
+    Args:
+        source_factory: Callable returning a cv2.VideoCapture-like object
+        detector: Object with detect_vehicles(frame)
+        truth: Expected counts for accuracy ({'IN': {...}, 'OUT': {...}})
+        max_frames: Stop after this many frames
+        realtime: Pace capture at ~30 FPS instead of as fast as possible
+        encode: Include JPEG encoding (MJPEG preview) stage
+        log_to_db: Include DB logging stage
+        zones: Counting lines / polygon zones (None = centre line)
+
+    Returns:
+        dict: Benchmark report
+    """
+    stages = defaultdict(list)
+    timed_capture = {}
+
+    def factory(url):
+        timed_capture['capture'] = TimedCapture(source_factory(), stages['capture'])
+        return timed_capture['capture']
+
+    camera = CameraManager('benchmark', 'BENCHMARK', capture_factory=factory,
+                           frame_interval=0.033 if realtime else 0, drop_frames=realtime,
+                           auto_reconnect=False)
+    counter = VehicleCounter(line_position=0.5, direction_mapping={'LEFT': 'OUT', 'RIGHT': 'IN'},
+                             camera_id='BENCHMARK', zones=zones)
+
+    crossings = []
+    counter.add_listener(lambda event: crossings.append(event) if event['type'] == 'crossing' else None)
+
+    db_dir = tempfile.mkdtemp(prefix='parking_benchmark_')
+    db_app = create_benchmark_db(os.path.join(db_dir, 'benchmark.db')) if log_to_db else None
+    categories = {}
+    if db_app:
+        with db_app.app_context():
+            categories = {c.display_category: c.id for c in VehicleCategory.query.all()}
+
+    if not camera.connect():
+        raise RuntimeError("Failed to open benchmark source")
+
+    rss_start = current_rss_mb()
+    rss_peak = rss_start or 0
+    frames = 0
+    idle_polls = 0
+    camera.start_capture()
+    started = time.perf_counter()
+
+    try:
+        while max_frames is None or frames < max_frames:
+            wait_start = time.perf_counter()
+            frame = camera.get_frame()
+            if frame is None:
+                if timed_capture['capture'].exhausted and camera.frame_queue.empty():
+                    break
+                idle_polls += 1
+                continue
+            stages['queue_wait'].append(time.perf_counter() - wait_start)
+            frame_start = time.perf_counter()
+
+            t = time.perf_counter()
+            detections = detector.detect_vehicles(frame)
+            stages['inference'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            counter.update(detections, frame.shape)
+            stages['tracking'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            annotated = counter.draw_on_frame(frame)
+            stages['drawing'].append(time.perf_counter() - t)
+
+            if encode:
+                t = time.perf_counter()
+                cv2.imencode('.jpg', annotated)
+                stages['encoding'].append(time.perf_counter() - t)
+
+            if db_app and crossings:
+                t = time.perf_counter()
+                with db_app.app_context():
+                    for event in crossings:
+                        entry = VehicleEntry(
+                            category_id=categories.get(event['category'], 1),
+                            original_class=CATEGORY_CLASSES.get(event['category'], 'car'),
+                            display_category=event['category'],
+                            entry_datetime=event['timestamp'],
+                            gate_id='BENCHMARK',
+                            status=event['count_type']
+                        )
+                        db.session.add(entry)
+                    db.session.commit()
+                stages['db_commit'].append(time.perf_counter() - t)
+                crossings.clear()
+
+            stages['frame_total'].append(time.perf_counter() - frame_start)
+            frames += 1
+
+            if frames % 100 == 0:
+                rss = current_rss_mb()
+                if rss:
+                    rss_peak = max(rss_peak, rss)
+    finally:
+        camera.stop_capture()
+        camera.disconnect()
+
+    elapsed = time.perf_counter() - started
+    rss_end = current_rss_mb()
+    if rss_end:
+        rss_peak = max(rss_peak, rss_end)
+
+    counts = counter.get_counts()
+    report = {
+        'frames': frames,
+        'elapsed_seconds': elapsed,
+        'fps': frames / elapsed if elapsed else 0.0,
+        'stages': {name: summarize_latencies(samples) for name, samples in stages.items()},
+        'memory_mb': {'start': rss_start, 'end': rss_end, 'peak': rss_peak or None},
+        'counts': {'IN': counts['in_counts'], 'OUT': counts['out_counts']},
+        'zones': counts['zones']
+    }
+    if truth is not None:
+        report['accuracy'] = count_accuracy(report['counts'], truth)
+
+    return report
+
+def print_report(report):
+    """Print a benchmark report"""
+    print(f"\n📊 {report['frames']} frames in {report['elapsed_seconds']:.2f}s → {report['fps']:.1f} FPS")
+    print(f"\n{'stage':14} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8}   (ms)")
+    for name, stats in report['stages'].items():
+        if stats:
+            print(f"{name:14} {stats['mean_ms']:8.2f} {stats['p50_ms']:8.2f} "
+                  f"{stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f}")
+
+    memory = report['memory_mb']
+    if memory['peak']:
+        print(f"\n🧠 RSS: start {memory['start']:.0f} MB, peak {memory['peak']:.0f} MB")
+
+    print(f"\n🚦 Counts: IN {report['counts']['IN']}  OUT {report['counts']['OUT']}")
+    if len(report['zones']) > 1 or any(zone['type'] == 'polygon' for zone in report['zones'].values()):
+        for name, zone in report['zones'].items():
+            print(f"   {name:12} IN {zone['total_in']:4}  OUT {zone['total_out']:4}")
+    accuracy = report.get('accuracy')
+    if accuracy and accuracy['accuracy'] is not None:
+        print(f"🎯 Count accuracy: {accuracy['accuracy']:.1%} "
+              f"({accuracy['absolute_error']} errors / {accuracy['expected_total']} expected)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the counting pipeline headlessly')
+    parser.add_argument('--video', help='Video file to replay (default: synthetic traffic)')
+    parser.add_argument('--ground-truth', help="JSON file with {'IN': {category: n}, 'OUT': {...}}")
+    parser.add_argument('--frames', type=int, default=900, help='Synthetic frames / max frames')
+    parser.add_argument('--vehicles', type=int, default=20, help='Synthetic vehicles')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--detector', choices=['model', 'color'], default=None,
+                        help="'model' runs best.pt, 'color' the model-free synthetic detector "
+                             "(default: color for synthetic, model for video)")
+    parser.add_argument('--model', default='best.pt')
+    parser.add_argument('--runtime', default='pytorch')
+    parser.add_argument('--precision', default='fp32')
+    parser.add_argument('--realtime', action='store_true', help='Pace capture at ~30 FPS')
+    parser.add_argument('--no-encode', action='store_true', help='Skip the JPEG encoding stage')
+    parser.add_argument('--no-db', action='store_true', help='Skip the DB logging stage')
+    parser.add_argument('--zones', help='Counting lines/polygons as JSON (see counting_zones.parse_zones)')
+    parser.add_argument('--json', help='Write the report to this file')
+    parser.add_argument('--log-level', default='WARNING', help='Pipeline log level (INFO shows every crossing)')
+    args = parser.parse_args()
+
+    setup_logging(level=args.log_level)
+
+    print("=" * 70)
+    print("PIPELINE BENCHMARK")
+    print("=" * 70)
+
+    truth = None
+    if args.video:
+        if not os.path.exists(args.video):
+            print(f"\n❌ Video not found: {args.video}")
+            sys.exit(1)
+        source_factory = lambda: cv2.VideoCapture(args.video)
+        max_frames = args.frames if args.frames != parser.get_default('frames') else None
+    else:
+        synthetic = dict(frames=args.frames, vehicles=args.vehicles, width=args.width, height=args.height)
+        source_factory = lambda: SyntheticVideoSource(**synthetic)
+        truth = SyntheticVideoSource(**synthetic).ground_truth()
+        max_frames = None
+
+    if args.ground_truth:
+        with open(args.ground_truth) as f:
+            truth = json.load(f)
+
+    detector_kind = args.detector or ('model' if args.video else 'color')
+    if detector_kind == 'model':
+        from detection_service import VehicleDetectionService
+        detector = VehicleDetectionService(args.model, runtime=args.runtime, precision=args.precision)
+        if not detector.load_model():
+            sys.exit(1)
+        detector.warmup()
+    else:
+        detector = ColorBlobDetector()
+
+    print(f"\n▶️  Source: {args.video or 'synthetic'} | detector: {detector_kind}")
+    report = run_benchmark(source_factory, detector, truth=truth, max_frames=max_frames,
+                           realtime=args.realtime, encode=not args.no_encode, log_to_db=not args.no_db,
+                           zones=parse_zones(args.zones) if args.zones else None)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\n💾 Report written to {args.json}")
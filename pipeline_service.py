@@ -0,0 +1,417 @@
+"""
+Pipeline Service
+Owns the cameras, counters and model for a multi-worker web tier; HTTP workers talk to it over a local socket
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+from camera_registry import CameraRegistry, parking_availability
+from frame_ring import FrameRing, ring_name
+from inference_server import QueueFullError, ServiceClient, parse_address, recv_message, send_message
+from pipeline_workers import RingJpegEncoder, fit_frame
+from structured_logging import log_event
+
+logger = logging.getLogger('pipeline_service')
+
+DEFAULT_ADDRESS = '127.0.0.1:8766'
+
+# Longest a client's change watch is held open (the client re-polls)
+WATCH_TIMEOUT = 10.0
+
+class _PipelineRequestHandler(socketserver.BaseRequestHandler):
+    """Serve requests on one persistent client connection"""
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                response = service.handle(header, payload)
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            try:
+                send_message(self.request, response)
+            except OSError:
+                return
+
+class PipelineService:
+    """
+    Socket server exposing the site's camera pipelines to HTTP workers
+
+    The service is the only process that opens cameras, loads the model and
+    owns counters (thread or process pipelines, as PIPELINE_MODE says).
+    HTTP workers stay stateless: they query counts and health, send resets
+    and detection requests, watch for count changes and read annotated
+    frames from the cameras' shared frame rings.
+    """
+
+    def __init__(self, registry, detect=None, address=DEFAULT_ADDRESS):
+        """
+        Initialize service
+
+        Args:
+            registry: CameraRegistry of local pipelines (started on serve_forever)
+            detect: Function(image, similar) -> detections for HTTP detection requests (may raise QueueFullError)
+            address: 'host:port' or 'unix:/path/to.sock'
+        """
+        self.registry = registry
+        self.detect = detect
+        self.address = address
+        self.server = None
+        self.rings = []
+
+        # Count changes: global version and the version each camera last changed at
+        self.condition = threading.Condition()
+        self.version = 0
+        self.changed = {}
+
+    def serve_forever(self):
+        """Start the pipelines and serve until interrupted"""
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_address):
+                os.unlink(bind_address)
+            server_class = socketserver.ThreadingUnixStreamServer
+        else:
+            server_class = socketserver.ThreadingTCPServer
+
+        server_class.allow_reuse_address = True
+        server_class.daemon_threads = True
+        self.server = server_class(bind_address, _PipelineRequestHandler)
+        self.server.service = self
+
+        # Bound first: a second service on the same address fails before touching cameras or frame rings
+        self._share_annotated_frames()
+        self.registry.add_listener(self._on_event)
+        self.registry.start()
+
+        print(f"✅ Pipeline service listening on {self.address} "
+              f"(cameras: {', '.join(self.registry.camera_ids())})")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.registry.stop()
+            for ring in self.rings:
+                ring.close()
+
+    def shutdown(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+
+    def _share_annotated_frames(self):
+        """Publish thread pipelines' annotated frames to their shared frame rings too"""
+        for camera_id in self.registry.camera_ids():
+            pipeline = self.registry.get(camera_id)
+            if getattr(pipeline, 'frames', None) is not None:
+                continue  # worker process pipelines already publish to the ring
+
+            ring = FrameRing(ring_name(camera_id, 'annotated'), create=True)
+            self.rings.append(ring)
+            publish_local = pipeline.publish_frame
+
+            def publish_frame(frame, publish_local=publish_local, ring=ring):
+                publish_local(frame)
+                ring.write(fit_frame(frame, ring.slot_size))
+
+            pipeline.publish_frame = publish_frame
+
+    def _on_event(self, camera_id, event):
+        with self.condition:
+            self.version += 1
+            self.changed[camera_id] = self.version
+            self.condition.notify_all()
+
+    def handle(self, header, payload=b''):
+        """
+        Handle one request
+
+        Args:
+            header: Request header with 'op' and its arguments
+            payload: Raw image bytes ('detect')
+
+        Returns:
+            dict: Response header
+        """
+        op = header.get('op')
+        camera_id = header.get('camera_id')
+        if camera_id is not None and self.registry.get(camera_id) is None:
+            return {'ok': False, 'error': f'Unknown camera: {camera_id}', 'not_found': True}
+        camera_ids = [camera_id] if camera_id else self.registry.camera_ids()
+
+        if op == 'cameras':
+            return {'ok': True, 'cameras': self.registry.camera_ids(),
+                    'default_camera': self.registry.default_camera_id}
+        if op == 'watch':
+            return self._watch(header.get('after', -1), min(header.get('timeout', WATCH_TIMEOUT), WATCH_TIMEOUT))
+        if op == 'counts':
+            return {'ok': True, 'counts': self.registry.get(camera_id).get_counts()}
+        if op == 'health':
+            health = self.registry.get(camera_id).get_health() if camera_id else self.registry.get_health()
+            return {'ok': True, 'health': health}
+        if op == 'reset':
+            for target_id in camera_ids:
+                self.registry.get(target_id).reset_counts()
+            return {'ok': True}
+        if op == 'detect':
+            # Same wire format as the inference server (see RemoteDetectionService)
+            if self.detect is None:
+                return {'ok': False, 'error': 'Detection model not loaded'}
+            image = np.frombuffer(payload, dtype=np.uint8).reshape(header['shape'])
+            try:
+                return {'ok': True, 'detections': self.detect(image, header.get('similar', False))}
+            except QueueFullError as e:
+                return {'ok': False, 'error': str(e), 'busy': True}
+        return {'ok': False, 'error': f'Unknown op: {op}'}
+
+    def _watch(self, after, timeout):
+        """
+        Wait until counts change after version `after` (-1 = send everything now)
+
+        Returns every changed camera's contribution to the site totals, so
+        clients replace rather than increment and can never double count.
+        """
+        with self.condition:
+            if after >= 0:
+                self.condition.wait_for(lambda: self.version != after, timeout)
+            version = self.version
+            if after < 0 or after > version:  # new client, or the service restarted
+                changed = self.registry.camera_ids()
+            else:
+                changed = [camera_id for camera_id, changed_at in self.changed.items() if changed_at > after]
+        return {'ok': True, 'version': version,
+                'counts': {camera_id: self.registry.site.get_camera_counts(camera_id) for camera_id in changed}}
+
+class RemoteCameraPipeline:
+    """
+    HTTP-worker handle of a camera pipeline hosted by the pipeline service
+
+    Same interface as camera_registry.CameraPipeline. Counts and health are
+    fetched from the service; frames are read from the camera's shared frame
+    ring; site totals are kept current by the client's change watch.
+    """
+
+    counter = None  # the counter lives in the pipeline service
+
+    def __init__(self, camera_id, client):
+        """
+        Initialize handle
+
+        Args:
+            camera_id: Camera ID
+            client: PipelineServiceClient shared by this worker's cameras
+        """
+        self.camera_id = camera_id
+        self.client = client
+        self.listeners = []
+        self.encoder = RingJpegEncoder(camera_id)
+        self.attach_lock = threading.Lock()
+
+    def start(self):
+        self.client.start_watch()
+
+    def stop(self):
+        self.client.stop_watch()
+        if self.encoder.frames is not None:
+            self.encoder.frames.close()
+
+    def add_listener(self, callback):
+        """Register a callback for this camera's counter events"""
+        self.listeners.append(callback)
+
+    def notify(self, event):
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'pipeline.listener_error', f"❌ Pipeline listener error: {e}",
+                          rate_limit=10, rate_key=self.camera_id, camera=self.camera_id)
+
+    def get_state(self):
+        """Counts as of the first change watch (the watch keeps site totals current)"""
+        return {'counts': {'IN': {}, 'OUT': {}}}
+
+    def get_counts(self):
+        return self.client.call({'op': 'counts', 'camera_id': self.camera_id})['counts']
+
+    def get_parking_availability(self, total_capacity):
+        """Parking availability from this camera's car counts"""
+        counts = self.get_counts()
+        return parking_availability(counts['in_counts'].get('Car', 0),
+                                    counts['out_counts'].get('Car', 0), total_capacity)
+
+    def reset_counts(self):
+        self.client.call({'op': 'reset', 'camera_id': self.camera_id})
+
+    def get_health(self):
+        return self.client.call({'op': 'health', 'camera_id': self.camera_id})['health']
+
+    def wait_for_jpeg(self, after_seq=0, timeout=1.0):
+        """
+        Wait for a frame newer than after_seq and get it as JPEG
+
+        Returns:
+            tuple: (seq, jpeg bytes) or (after_seq, None) on timeout
+        """
+        with self.attach_lock:
+            encoder = self.encoder
+            if encoder.frames is not None and encoder.frames.closed:
+                # The service restarted: reattach to the ring it recreated
+                encoder.frames.close()
+                encoder = self.encoder = RingJpegEncoder(self.camera_id)
+            if encoder.frames is None:
+                try:
+                    encoder.frames = FrameRing(ring_name(self.camera_id, 'annotated'))
+                except FileNotFoundError:
+                    encoder = None
+
+        if encoder is None:
+            time.sleep(timeout)  # the service has not published this camera yet
+            return after_seq, None
+        return encoder.wait_for_jpeg(after_seq, timeout)
+
+class PipelineServiceClient:
+    """Connection from an HTTP worker to the pipeline service"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=30):
+        """
+        Initialize client
+
+        Args:
+            address: Pipeline service address
+            timeout: Socket timeout in seconds (must exceed WATCH_TIMEOUT)
+        """
+        self.address = address
+        self.connection = ServiceClient(address, timeout)
+        self.pipelines = {}
+        self.version = -1  # last count version seen (-1 = resync)
+        self.watch_thread = None
+        self.is_watching = False
+        self.lock = threading.Lock()
+
+    def call(self, header):
+        """
+        Send a request to the service
+
+        Returns:
+            dict: Response header
+
+        Raises:
+            KeyError: For an unknown camera
+            RuntimeError: If the service reports an error
+        """
+        response = self.connection.request(header)
+        if not response.get('ok'):
+            if response.get('not_found'):
+                raise KeyError(response['error'])
+            raise RuntimeError(response.get('error'))
+        return response
+
+    def create_registry(self):
+        """
+        Build a CameraRegistry of remote pipelines, in the service's camera order
+
+        Raises:
+            OSError: If the service is unreachable
+        """
+        cameras = self.call({'op': 'cameras'})['cameras']
+        self.pipelines = {camera_id: RemoteCameraPipeline(camera_id, self) for camera_id in cameras}
+        return CameraRegistry(list(self.pipelines.values()))
+
+    def start_watch(self):
+        """Start following count changes (idempotent)"""
+        with self.lock:
+            if self.is_watching:
+                return
+            self.is_watching = True
+            self.watch_thread = threading.Thread(target=self._watch_loop, daemon=True, name='pipeline-watch')
+            self.watch_thread.start()
+
+    def stop_watch(self):
+        self.is_watching = False
+
+    def _watch_loop(self):
+        """Long-poll count changes and replay them to the pipelines as restores"""
+        backoff = 1.0
+        while self.is_watching:
+            try:
+                response = self.call({'op': 'watch', 'after': self.version, 'timeout': WATCH_TIMEOUT})
+            except (OSError, RuntimeError) as e:
+                log_event(logger, logging.WARNING, 'pipeline.service_unavailable',
+                          f"⚠️  Pipeline service at {self.address} unavailable: {e}",
+                          rate_limit=30, address=self.address)
+                self.version = -1  # full resync once it is back
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            self.version = response['version']
+            for camera_id, counts in response['counts'].items():
+                pipeline = self.pipelines.get(camera_id)
+                if pipeline is not None:
+                    pipeline.notify({'type': 'restore', 'counts': counts})
+
+def wait_until_ready(address, timeout=60.0):
+    """
+    Wait for a pipeline service to accept requests
+
+    Returns:
+        bool: True once it answers, False on timeout
+    """
+    deadline = time.monotonic() + timeout
+    client = ServiceClient(address, timeout=5)
+    while time.monotonic() < deadline:
+        try:
+            if client.request({'op': 'cameras'}).get('ok'):
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Camera pipeline service for multi-worker serving')
+    parser.add_argument('--address', default=None,
+                        help=f"'host:port' or 'unix:/path.sock' (default: PIPELINE_SERVICE or {DEFAULT_ADDRESS})")
+    args = parser.parse_args()
+
+    from app import (get_config_cache, create_camera_registry, create_frame_detector, create_inference_backend,
+                     load_detection_service)
+    from structured_logging import setup_logging_from_config
+
+    print("=" * 70)
+    print("PIPELINE SERVICE")
+    print("=" * 70)
+
+    config = get_config_cache()
+    setup_logging_from_config(config)
+    address = args.address or config.get('PIPELINE_SERVICE', '') or DEFAULT_ADDRESS
+
+    # Camera frames and HTTP workers' uploads share one inference queue
+    backend = create_inference_backend(load_detection_service(config))
+    registry = create_camera_registry(config, create_frame_detector(backend))
+    detect = ((lambda image, similar=False: backend.submit(image, similar).result(timeout=30))
+              if backend is not None else None)
+    service = PipelineService(registry, detect, address)
+
+    # Stop cleanly (flushing counter state) when the launcher terminates us
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Pipeline service stopped")
@@ -0,0 +1,349 @@
+"""
+Pipeline Workers
+Runs each camera pipeline in its own process; frames come back through a shared frame ring, results over a queue
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+import multiprocessing
+import cv2
+from camera_registry import parking_availability
+from counter_state import empty_state
+from frame_ring import FrameRing, ring_name
+from metrics import registry as metrics_registry, stage_timer
+from structured_logging import log_event
+
+logger = logging.getLogger('pipeline_workers')
+
+# Largest preview frame a worker publishes (bigger frames are downscaled)
+MAX_FRAME_SHAPE = (1080, 1920, 3)
+
+# Seconds between counts/health snapshots sent by a worker
+SNAPSHOT_INTERVAL = 1.0
+
+def fit_frame(frame, max_bytes):
+    """Downscale a frame (keeping its aspect ratio) until it fits in max_bytes"""
+    if frame.nbytes <= max_bytes:
+        return frame
+    scale = (max_bytes / frame.nbytes) ** 0.5
+    return cv2.resize(frame, (int(frame.shape[1] * scale), int(frame.shape[0] * scale)))
+
+class RingJpegEncoder:
+    """
+    JPEG frames for MJPEG viewers, read from a camera's frame ring
+
+    Encodes straight from the shared buffer, at most once per frame for all
+    viewers in this process. If the writer lapped the ring while a frame was
+    being encoded the pixels may be torn, so the result is discarded and a
+    newer frame taken.
+    """
+
+    def __init__(self, camera_id, frames=None):
+        """
+        Initialize encoder
+
+        Args:
+            camera_id: Camera ID (metrics label)
+            frames: FrameRing to read (may be attached later)
+        """
+        self.frames = frames
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.lock = threading.Lock()
+        self.encoding_seconds = stage_timer('encoding', camera_id)
+
+    def wait_for_jpeg(self, after_seq=0, timeout=1.0, is_running=lambda: True):
+        """
+        Wait for a frame newer than after_seq and get it as JPEG
+
+        Returns:
+            tuple: (seq, jpeg bytes) or (after_seq, None) on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while is_running() and self.frames is not None:
+            with self.lock:
+                if self.jpeg_seq > after_seq and self.jpeg_seq == self.frames.head:
+                    return self.jpeg_seq, self.jpeg
+
+                view = self.frames.latest(max(after_seq, self.jpeg_seq))
+                if view is not None:
+                    with self.encoding_seconds.time():
+                        ok, buffer = cv2.imencode('.jpg', view.frame)
+                    if ok and self.frames.valid(view.seq):
+                        self.jpeg, self.jpeg_seq = buffer.tobytes(), view.seq
+                        return self.jpeg_seq, self.jpeg
+
+                if self.jpeg_seq > after_seq:
+                    return self.jpeg_seq, self.jpeg
+
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.005)
+        return after_seq, None
+
+def run_camera_worker(camera, model_path, frame_ring_name, results, commands):
+    """
+    Worker process entry point: one camera's full pipeline
+
+    Loads its own config, counter (with persisted state) and detection
+    service (in-process model, or the shared inference server when
+    INFERENCE_SERVER is set), then streams annotated frames into the shared
+    frame ring and counter events, counts, health and metrics to the results
+    queue (the worker's registry is never scraped itself). Cameras with share_frames also publish their raw frames to
+    ring_name(camera_id) for other local consumers.
+
+    Args:
+        camera: Camera spec from camera_registry.parse_cameras
+        model_path: Path to the .pt model
+        frame_ring_name: FrameRing to publish annotated frames to
+        results: multiprocessing queue to the web tier
+        commands: multiprocessing queue from the web tier ('reset', 'stop')
+    """
+    from camera_registry import CameraPipeline
+    from config_manager import ConfigCache
+    from counter_state import CounterStateStore
+    from counting_zones import parse_zones
+    from database import create_db_app
+    from inference_scheduler import create_inference_scheduler, lane_limits
+    from inference_server import create_detection_service
+    from structured_logging import setup_logging_from_config
+    from vehicle_counter import VehicleCounter
+
+    camera_id = camera['id']
+    db_app = create_db_app(f'camera_worker_{camera_id}')
+    config = ConfigCache(db_app)
+    config.start()
+    setup_logging_from_config(config)
+
+    zones = camera['zones']
+    if not zones:
+        try:
+            zones = parse_zones(config.get('COUNTING_ZONES', '')) or None
+        except ValueError as e:
+            log_event(logger, logging.ERROR, 'counter.invalid_zones', f"❌ Invalid COUNTING_ZONES: {e}",
+                      camera=camera_id)
+
+    counter = VehicleCounter(line_position=camera['line_position'], camera_id=camera_id, zones=zones)
+    store = CounterStateStore(
+        db_app, counter,
+        flush_interval=config.get_float('COUNTER_FLUSH_INTERVAL', 1.0),
+        checkpoint_interval=config.get_float('COUNTER_CHECKPOINT_INTERVAL', 30.0)
+    )
+    store.start()
+
+    detect = None
+    if config.get('INFERENCE_SERVER', '') or os.path.exists(model_path):
+        detection_service = create_detection_service(model_path, config, metrics_source=camera_id)
+        if detection_service.load_model():
+            detect = detection_service.detect_vehicles
+
+    frames = FrameRing(frame_ring_name)
+    pipeline = CameraPipeline(
+        camera_id, camera['source'], counter, detect=detect,
+        stall_timeout=config.get_float('CAMERA_STALL_TIMEOUT', 5.0),
+        max_backoff=config.get_float('CAMERA_RECONNECT_MAX_BACKOFF', 30.0),
+        frame_ring=FrameRing(ring_name(camera_id), create=True) if camera['share_frames'] else None,
+        # The worker has its own model: no shared budget, but idle lanes still drop to their minimum
+        lane=create_inference_scheduler(config, budget_fps=float('inf')).add_lane(
+            camera_id, *lane_limits(config, camera))
+    )
+    # Frames go to the web tier, not to local viewers
+    pipeline.publish_frame = lambda frame: frames.write(fit_frame(frame, frames.slot_size))
+
+    dropped = [0]
+
+    def send(kind, value):
+        try:
+            results.put_nowait((kind, value))
+        except queue.Full:
+            dropped[0] += 1  # the next snapshot tells the web tier to resync
+
+    counter.add_listener(lambda event: send('event', event))
+    send('ready', {'state': counter.get_state(), 'counts': counter.get_counts(), 'pid': os.getpid()})
+    pipeline.start()
+
+    try:
+        while True:
+            try:
+                command = commands.get(timeout=SNAPSHOT_INTERVAL)
+            except queue.Empty:
+                command = None
+
+            if command == 'stop':
+                break
+            if command == 'reset':
+                counter.reset_counts()
+
+            send('snapshot', {'counts': counter.get_counts(), 'health': pipeline.get_health(),
+                              'dropped': dropped[0], 'metrics': metrics_registry.snapshot()})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        store.stop()
+        frames.close()
+
+class ProcessCameraPipeline:
+    """
+    Web-tier handle of a camera pipeline running in a worker process
+
+    Same interface as camera_registry.CameraPipeline. Counts and health are
+    the latest snapshot from the worker; counter events are forwarded to
+    listeners as they arrive. The worker's metrics (stage timings, frames,
+    detections) are merged into this process's registry for /metrics.
+    A worker that dies is restarted with backoff.
+    """
+
+    def __init__(self, camera, model_path, context=None, max_frame_shape=MAX_FRAME_SHAPE):
+        """
+        Initialize handle (the worker starts with start())
+
+        Args:
+            camera: Camera spec from camera_registry.parse_cameras
+            model_path: Path to the .pt model
+            context: multiprocessing context (default 'spawn': workers never
+                     inherit the web server's threads or sockets)
+            max_frame_shape: Largest preview frame passed back
+        """
+        self.camera = camera
+        self.camera_id = camera['id']
+        self.model_path = model_path
+        self.context = context or multiprocessing.get_context('spawn')
+        self.frames = FrameRing(ring_name(self.camera_id, 'annotated'), create=True, max_shape=max_frame_shape)
+        self.results = self.context.Queue(maxsize=1000)
+        self.commands = self.context.Queue()
+        self.process = None
+        self.reader_thread = None
+        self.is_running = False
+        self.restarts = 0
+        self.metrics_origin = f'camera-{self.camera_id}'
+        self.dropped = 0  # worker messages lost on a full queue (as last reported)
+
+        self.state = empty_state()
+        self.counts = {'in_counts': {}, 'out_counts': {}, 'total_in': 0, 'total_out': 0,
+                       'net_count': 0, 'counting_line': None, 'zones': {}}
+        self.health = {'camera_id': self.camera_id, 'state': 'stopped'}
+        self.listeners = []
+        self.encoder = RingJpegEncoder(self.camera_id, self.frames)
+
+    def start(self):
+        """Start the worker process and the result reader"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._spawn()
+        self.reader_thread = threading.Thread(target=self._read_loop, daemon=True,
+                                              name=f'pipeline-results-{self.camera_id}')
+        self.reader_thread.start()
+
+    def _spawn(self):
+        self.process = self.context.Process(
+            target=run_camera_worker,
+            args=(self.camera, self.model_path, self.frames.name, self.results, self.commands),
+            name=f'camera-{self.camera_id}',
+            daemon=True
+        )
+        self.process.start()
+        log_event(logger, logging.INFO, 'pipeline.worker_started',
+                  f"▶️  Camera {self.camera_id} worker started (pid {self.process.pid})",
+                  camera=self.camera_id, pid=self.process.pid)
+
+    def stop(self):
+        """Stop the worker (gracefully, then forcibly) and free the frame ring"""
+        self.is_running = False
+        if self.process is not None:
+            self.commands.put('stop')
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=5)
+        if self.reader_thread:
+            self.reader_thread.join(timeout=2)
+        metrics_registry.forget_remote(self.metrics_origin)
+        self.frames.close()
+
+    def _read_loop(self):
+        """Apply worker messages; restart the worker if it exits unexpectedly"""
+        backoff = 1.0
+        while self.is_running:
+            try:
+                kind, value = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if self.is_running and not self.process.is_alive():
+                    self.restarts += 1
+                    log_event(logger, logging.ERROR, 'pipeline.worker_died',
+                              f"❌ Camera {self.camera_id} worker exited ({self.process.exitcode}), "
+                              f"restarting in {backoff:.0f}s",
+                              camera=self.camera_id, exitcode=self.process.exitcode, restarts=self.restarts)
+                    self.health = dict(self.health, state='restarting')
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    if self.is_running:
+                        self._spawn()
+                continue
+            except (EOFError, OSError):
+                break
+
+            if kind == 'event':
+                self._notify(value)
+            elif kind == 'snapshot':
+                self.counts = value['counts']
+                self.health = value['health']
+                metrics_registry.merge_remote(self.metrics_origin, value['metrics'])
+                backoff = 1.0
+                if value['dropped'] != self.dropped:
+                    # Events were lost on a full queue: resync totals from the snapshot
+                    self.dropped = value['dropped']
+                    self._notify({'type': 'restore', 'counts': {'IN': self.counts['in_counts'],
+                                                                'OUT': self.counts['out_counts']}})
+            elif kind == 'ready':
+                self.state = value['state']
+                self.counts = value['counts']
+                self.dropped = 0
+                self._notify({'type': 'restore', 'counts': value['state']['counts']})
+
+    def _notify(self, event):
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'pipeline.listener_error', f"❌ Pipeline listener error: {e}",
+                          rate_limit=10, rate_key=self.camera_id, camera=self.camera_id)
+
+    def add_listener(self, callback):
+        """Register a callback for this camera's counter events"""
+        self.listeners.append(callback)
+
+    def get_state(self):
+        """Counts restored by the worker (empty until it is ready)"""
+        return self.state
+
+    def get_counts(self):
+        """Latest counts reported by the worker"""
+        return self.counts
+
+    def get_parking_availability(self, total_capacity):
+        """Parking availability from this camera's car counts"""
+        return parking_availability(self.counts['in_counts'].get('Car', 0),
+                                    self.counts['out_counts'].get('Car', 0), total_capacity)
+
+    def reset_counts(self):
+        self.commands.put('reset')
+
+    def get_health(self):
+        """Latest camera health reported by the worker, with the worker's status"""
+        alive = self.process is not None and self.process.is_alive()
+        return dict(self.health, worker_pid=self.process.pid if self.process else None,
+                    worker_alive=alive, worker_restarts=self.restarts)
+
+    def wait_for_jpeg(self, after_seq=0, timeout=1.0):
+        """
+        Wait for a frame newer than after_seq and get it as JPEG
+
+        Returns:
+            tuple: (seq, jpeg bytes) or (after_seq, None) on timeout
+        """
+        return self.encoder.wait_for_jpeg(after_seq, timeout, lambda: self.is_running)
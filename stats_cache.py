@@ -0,0 +1,159 @@
+"""
+Stats Cache
+Versioned dashboard snapshot shared by the dashboard and /api/stats
+"""
+
+import hashlib
+import threading
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from database import db, VehicleEntry, VehicleExit, ParkingSlot
+
+class DashboardSnapshotCache:
+    """
+    Cache of dashboard aggregates, rebuilt only when the logs change
+
+    A change is detected two ways:
+      - in-process: committing writes to VehicleEntry/VehicleExit/ParkingSlot
+        marks the snapshot dirty immediately
+      - cross-process (gate services write from their own processes): a cheap
+        fingerprint of MAX(id) per log table and the parking row timestamp,
+        checked at most once per check_interval
+    """
+
+    WATCHED_MODELS = (VehicleEntry, VehicleExit, ParkingSlot)
+
+    def __init__(self, check_interval=0.5, recent_limit=10):
+        """
+        Initialize cache
+
+        Args:
+            check_interval: Minimum seconds between fingerprint checks
+            recent_limit: Number of recent entries kept in the snapshot
+        """
+        self.check_interval = check_interval
+        self.recent_limit = recent_limit
+        self.snapshot = None
+        self.fingerprint = None
+        self.last_check = 0.0
+        self.dirty = True
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """Force a rebuild on the next read"""
+        self.dirty = True
+
+    def get(self):
+        """
+        Get the current snapshot, rebuilding it if the data changed
+
+        Returns:
+            SimpleNamespace: Snapshot with aggregates and an 'etag'
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not self.dirty and self.snapshot is not None and now - self.last_check < self.check_interval:
+                return self.snapshot
+
+            fingerprint = self._fingerprint()
+            self.last_check = now
+
+            if self.dirty or fingerprint != self.fingerprint or self.snapshot is None:
+                self.dirty = False
+                self.fingerprint = fingerprint
+                self.snapshot = self._build(fingerprint)
+
+            return self.snapshot
+
+    def _fingerprint(self):
+        """Cheap version of the underlying data (index-only lookups)"""
+        row = db.session.execute(select(
+            select(func.max(VehicleEntry.id)).scalar_subquery(),
+            select(func.max(VehicleExit.id)).scalar_subquery(),
+            select(func.max(ParkingSlot.last_updated)).scalar_subquery(),
+            select(func.sum(ParkingSlot.total_capacity)).scalar_subquery()
+        )).one()
+        return (date.today(),) + tuple(row)
+
+    def _build(self, fingerprint):
+        """Run the dashboard aggregate queries once"""
+        today = fingerprint[0]
+        day_start = datetime.combine(today, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+
+        entries_today = db.session.query(
+            VehicleEntry.display_category,
+            func.count(VehicleEntry.id).label('count')
+        ).filter(
+            VehicleEntry.entry_datetime >= day_start,
+            VehicleEntry.entry_datetime < day_end
+        ).group_by(VehicleEntry.display_category).all()
+
+        currently_in = db.session.query(
+            VehicleEntry.display_category,
+            func.count(VehicleEntry.id).label('count')
+        ).filter(
+            VehicleEntry.status == 'IN'
+        ).group_by(VehicleEntry.display_category).all()
+
+        total_exits_today = db.session.query(func.count(VehicleExit.id)).filter(
+            VehicleExit.exit_datetime >= day_start,
+            VehicleExit.exit_datetime < day_end
+        ).scalar()
+
+        recent_entries = VehicleEntry.query.order_by(
+            VehicleEntry.entry_datetime.desc()
+        ).limit(self.recent_limit).all()
+
+        parking = ParkingSlot.query.first()
+
+        entries_by_category = {cat: count for cat, count in entries_today}
+        currently_in_by_category = {cat: count for cat, count in currently_in}
+
+        etag = hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:16]
+
+        # Plain copies, so cached values never depend on a (closed) session
+        return SimpleNamespace(
+            etag=etag,
+            today=today,
+            generated_at=datetime.now(),
+            entries_by_category=entries_by_category,
+            currently_in_by_category=currently_in_by_category,
+            total_entries_today=sum(entries_by_category.values()),
+            total_exits_today=total_exits_today or 0,
+            currently_in=sum(currently_in_by_category.values()),
+            recent_entries=[_copy_columns(entry) for entry in recent_entries],
+            parking=_copy_columns(parking) if parking else None
+        )
+
+def _copy_columns(instance):
+    """Copy an ORM instance's column values into a detached namespace"""
+    return SimpleNamespace(**{
+        column.key: getattr(instance, column.key)
+        for column in instance.__table__.columns
+    })
+
+dashboard_cache = DashboardSnapshotCache()
+
+@event.listens_for(Session, 'after_flush')
+def _track_watched_writes(session, flush_context):
+    """Remember that watched rows were written in this transaction"""
+    watched = DashboardSnapshotCache.WATCHED_MODELS
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, watched):
+            session.info['dashboard_dirty'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    """Mark the snapshot dirty once watched writes are committed"""
+    if session.info.pop('dashboard_dirty', False):
+        dashboard_cache.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    """Discard the marker when the transaction is rolled back"""
+    session.info.pop('dashboard_dirty', None)
@@ -0,0 +1,257 @@
+"""
+Structured Logging
+Background (queued) structured logging with per-event rate limiting and per-module levels
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Attributes set by logging itself; everything else passed via extra is a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'event', 'fields', 'suppressed'
+}
+
+class RateLimiter:
+    """Allow one occurrence per interval per key, counting what was suppressed"""
+
+    def __init__(self):
+        self.last_emitted = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key, interval):
+        """
+        Check whether an occurrence may be emitted
+
+        Returns:
+            int or None: None if suppressed, otherwise how many were suppressed since the last one
+        """
+        now = time.monotonic()
+        with self.lock:
+            last, suppressed = self.last_emitted.get(key, (None, 0))
+            if last is not None and now - last < interval:
+                self.last_emitted[key] = (last, suppressed + 1)
+                return None
+            self.last_emitted[key] = (now, 0)
+        return suppressed
+
+_rate_limiter = RateLimiter()
+
+def log_event(logger, level, event, message, rate_limit=None, rate_key=None, **fields):
+    """
+    Log a structured event
+
+    Cheap when the level is disabled; with rate_limit set, at most one record
+    per rate_limit seconds is emitted for (logger, event, rate_key) and the
+    next emitted record reports how many were suppressed. Suppressed calls
+    return before a LogRecord is built.
+
+    Args:
+        logger: logging.Logger
+        level: logging level (e.g. logging.INFO)
+        event: Event name (e.g. 'camera.read_failed')
+        message: Human-readable message
+        rate_limit: Minimum seconds between records for this event
+        rate_key: Distinguishes rate-limited streams of the same event (e.g. camera id)
+        **fields: Structured fields
+    """
+    if not logger.isEnabledFor(level):
+        return
+
+    suppressed = 0
+    if rate_limit:
+        suppressed = _rate_limiter.allow((logger.name, event, rate_key), rate_limit)
+        if suppressed is None:
+            return
+
+    logger.log(level, message, extra={'event': event, 'fields': fields, 'suppressed': suppressed})
+
+class StructuredFormatter(logging.Formatter):
+    """Render records as 'time level logger message key=value ...' or JSON lines"""
+
+    def __init__(self, json_format=False):
+        super().__init__()
+        self.json_format = json_format
+
+    def _fields(self, record):
+        fields = dict(getattr(record, 'fields', None) or {})
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                fields[key] = value
+        return fields
+
+    def format(self, record):
+        message = record.getMessage()
+        fields = self._fields(record)
+        event = getattr(record, 'event', None)
+        suppressed = getattr(record, 'suppressed', 0)
+
+        if self.json_format:
+            entry = {
+                'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': message
+            }
+            if event:
+                entry['event'] = event
+            entry.update(fields)
+            if suppressed:
+                entry['suppressed'] = suppressed
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str, ensure_ascii=False)
+
+        timestamp = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')
+        parts = [f"{timestamp} {record.levelname:7} {record.name}: {message}"]
+        if event:
+            parts.append(f"event={event}")
+        parts.extend(f"{key}={value}" for key, value in fields.items())
+        if suppressed:
+            parts.append(f"(+{suppressed} suppressed)")
+        text = ' '.join(parts)
+        if record.exc_info:
+            text += '\n' + self.formatException(record.exc_info)
+        return text
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records (and counts them) instead of blocking when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Keep the record's extra fields; only make args/exc_info picklable-safe
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.msg = f"{record.message}\n{record.exc_text}"
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener = None
+_handler = None
+_module_loggers = set()  # loggers given a level by the last set_levels call
+
+def parse_module_levels(spec):
+    """
+    Parse 'module=LEVEL,module=LEVEL'
+
+    Returns:
+        dict: Logger name -> level name (invalid entries skipped)
+    """
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, level = (part.strip() for part in item.split('=', 1))
+        if name and isinstance(logging.getLevelName(level.upper()), int):
+            levels[name] = level.upper()
+    return levels
+
+def set_levels(level='INFO', module_levels=None):
+    """
+    Apply the root level and per-module overrides
+
+    Loggers dropped from module_levels since the last call go back to
+    NOTSET (inheriting the root level) instead of keeping their override.
+
+    Args:
+        level: Root level name
+        module_levels: Dict or 'module=LEVEL,...' string
+    """
+    logging.getLogger().setLevel(level.upper() if isinstance(level, str) else level)
+    if isinstance(module_levels, str):
+        module_levels = parse_module_levels(module_levels)
+    module_levels = module_levels or {}
+    for name in _module_loggers - set(module_levels):
+        logging.getLogger(name).setLevel(logging.NOTSET)
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+    _module_loggers.clear()
+    _module_loggers.update(module_levels)
+
+def setup_logging(level='INFO', module_levels=None, log_format='text', stream=None, max_queue=10000):
+    """
+    Route all logging through a background writer thread
+
+    Callers only enqueue records; formatting and writing to the console or
+    journal happen on the listener thread. Safe to call again to change the
+    format or levels.
+
+    Args:
+        level: Root level name
+        module_levels: Dict or 'module=LEVEL,...' string of per-module levels
+        log_format: 'text' or 'json'
+        stream: Output stream (default stdout, like the existing prints)
+        max_queue: Records buffered before new ones are dropped
+
+    Returns:
+        logging.handlers.QueueListener
+    """
+    global _listener, _handler
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        root.removeHandler(_handler)
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    _handler = DroppingQueueHandler(log_queue)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(StructuredFormatter(json_format=log_format == 'json'))
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root.addHandler(_handler)
+    set_levels(level, module_levels)
+    return _listener
+
+def setup_logging_from_config(config):
+    """
+    Configure logging from LOG_LEVEL, LOG_LEVELS and LOG_FORMAT and follow changes
+
+    Args:
+        config: ConfigCache
+    """
+    def apply():
+        setup_logging(
+            level=config.get('LOG_LEVEL', 'INFO') or 'INFO',
+            module_levels=config.get('LOG_LEVELS', ''),
+            log_format=config.get('LOG_FORMAT', 'text')
+        )
+
+    def on_change(key, old_value, new_value):
+        if key == 'LOG_FORMAT':
+            apply()
+        else:
+            set_levels(config.get('LOG_LEVEL', 'INFO') or 'INFO', config.get('LOG_LEVELS', ''))
+
+    apply()
+    config.subscribe(on_change, keys=['LOG_LEVEL', 'LOG_LEVELS', 'LOG_FORMAT'])
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -7,7 +7,16 @@ import cv2
 import numpy as np
 from collections import deque, defaultdict
 from datetime import datetime
+import logging
 import math
+import threading
+import time
+from metrics import stage_timer, CROSSINGS_TOTAL, ACTIVE_TRACKS
+from structured_logging import log_event
+from counting_zones import CountingLine, segment_crossings, normal_displacement, points_in_polygon
+from overlay_renderer import OverlayRenderer
+
+logger = logging.getLogger('vehicle_counter')
 
 class VehicleTracker:
     """Track individual vehicles across frames"""
@@ -21,7 +30,10 @@ class VehicleTracker:
         self.counted = False
         self.direction = None  # 'IN' or 'OUT'
         self.crossed_line = False
+        self.counted_lines = set()  # names of lines this track has been counted on
+        self.inside_zones = set()   # names of polygon zones the track is currently in
         self.last_seen = datetime.now()
+        self.version = 0  # bumped on every update (overlay cache key)
         
         # Store initial position
         center = self.get_center(bbox)
@@ -38,23 +50,7 @@ class VehicleTracker:
         center = self.get_center(bbox)
         self.positions.append(center)
         self.last_seen = datetime.now()
-    
-    def get_trajectory_direction(self):
-        """Determine movement direction from trajectory"""
-        if len(self.positions) < 5:
-            return None
-        
-        # Compare first and last positions
-        start_x = np.mean([p[0] for p in list(self.positions)[:5]])
-        end_x = np.mean([p[0] for p in list(self.positions)[-5:]])
-        
-        displacement = end_x - start_x
-        
-        # Threshold for significant movement
-        if abs(displacement) > 30:
-            return 'RIGHT' if displacement > 0 else 'LEFT'
-        
-        return None
+        self.version += 1
     
     def is_stale(self, max_age_seconds=2):
         """Check if tracker is too old"""
@@ -62,22 +58,27 @@ class VehicleTracker:
         return age > max_age_seconds
 
 class VehicleCounter:
-    """Count vehicles crossing a virtual line"""
+    """Count vehicles crossing counting lines and entering/leaving polygon zones"""
     
-    def __init__(self, line_position=0.5, direction_mapping={'LEFT': 'OUT', 'RIGHT': 'IN'}):
+    def __init__(self, line_position=0.5, direction_mapping={'LEFT': 'OUT', 'RIGHT': 'IN'},
+                 camera_id='CAMERA_1', zones=None):
         """
         Initialize vehicle counter
         
         Args:
-            line_position: Position of counting line (0-1, fraction of frame width)
-            direction_mapping: Map movement direction to count type
+            line_position: Position of the default vertical counting line (0-1, fraction of frame width)
+            direction_mapping: Map movement direction to count type (default line)
+            camera_id: Camera this counter belongs to (metrics source label)
+            zones: CountingLine / CountingZone list (None = single vertical line at line_position)
         """
+        self.camera_id = camera_id
         self.line_position = line_position
         self.direction_mapping = direction_mapping
         self.trackers = {}
         self.next_track_id = 1
         
-        # Counting statistics
+        # Counting statistics (crossings of the counting line only, so a vehicle
+        # that crosses several lines is counted once; other lines count per zone)
         self.counts = {
             'IN': defaultdict(int),
             'OUT': defaultdict(int)
@@ -88,9 +89,84 @@ class VehicleCounter:
             'OUT': 0
         }
         
+        # Per-zone statistics
+        self.zone_counts = {}
+        self.zone_occupancy = {}
+        self.zones_lock = threading.RLock()  # zones may be replaced by a config reload
+        self.set_zones(zones)
+        
         # Tracking parameters
         self.max_distance = 100  # Maximum distance for matching detections
         self.max_age = 2  # Maximum age in seconds before removing tracker
+        
+        # Callbacks notified of crossings and resets
+        self.listeners = []
+        
+        # Metrics
+        self.tracking_seconds = stage_timer('tracking', camera_id)
+        self.drawing_seconds = stage_timer('drawing', camera_id)
+        self.overlay = OverlayRenderer()
+        ACTIVE_TRACKS.labels(source=camera_id).set_function(lambda: len(self.trackers))
+    
+    def add_listener(self, callback):
+        """
+        Register a callback for counting events
+        
+        Args:
+            callback: Function called with an event dict ('type' is 'crossing' or 'reset')
+        """
+        self.listeners.append(callback)
+    
+    def _notify(self, event):
+        """Call listeners without letting them break the counting loop"""
+        for callback in self.listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                log_event(logger, logging.ERROR, 'counter.listener_error', f"❌ Counter listener error: {e}",
+                          rate_limit=10, rate_key=self.camera_id, camera=self.camera_id)
+    
+    def set_zones(self, zones=None):
+        """
+        Replace the counting lines and polygon zones
+        
+        Counts of zones that keep their name are preserved.
+        
+        Args:
+            zones: CountingLine / CountingZone list (None or empty = default vertical line);
+                   the line marked count=True (else the first line) feeds the overall counts
+        """
+        default_line = not zones
+        if default_line:
+            zones = [CountingLine(
+                'line', (self.line_position, 0), (self.line_position, 1),
+                invert=self.direction_mapping.get('RIGHT', 'IN') != 'IN'
+            )]
+        
+        with self.zones_lock:
+            self.default_line = default_line
+            self.lines = [zone for zone in zones if zone.kind == 'line']
+            self.polygons = [zone for zone in zones if zone.kind == 'polygon']
+            self.counting_line = next((line.name for line in self.lines if line.count),
+                                      self.lines[0].name if self.lines else None)
+            
+            self.zone_counts = {
+                zone.name: self.zone_counts.get(zone.name) or {'IN': defaultdict(int), 'OUT': defaultdict(int)}
+                for zone in zones
+            }
+            self.zone_occupancy = {zone.name: 0 for zone in self.polygons}
+            self._geometry_shape = None
+    
+    def _geometry(self, frame_shape):
+        """Pixel geometry for the current frame size (cached)"""
+        shape = tuple(frame_shape[:2])
+        if self._geometry_shape != shape:
+            points = [line.pixel_points(shape) for line in self.lines]
+            self._line_starts = np.array([start for start, _ in points]).reshape(-1, 2)
+            self._line_ends = np.array([end for _, end in points]).reshape(-1, 2)
+            self._polygon_points = [zone.pixel_points(shape) for zone in self.polygons]
+            self._geometry_shape = shape
+        return self._line_starts, self._line_ends, self._polygon_points
     
     def reset_counts(self):
         """Reset all counts"""
@@ -99,6 +175,47 @@ class VehicleCounter:
             'OUT': defaultdict(int)
         }
         self.total_counts = {'IN': 0, 'OUT': 0}
+        for name in self.zone_counts:
+            self.zone_counts[name] = {'IN': defaultdict(int), 'OUT': defaultdict(int)}
+        self._notify({'type': 'reset', 'timestamp': datetime.now()})
+    
+    def get_state(self):
+        """
+        Get line and zone counts as plain dicts (persisted by counter_state)
+        
+        Returns:
+            dict: {'counts': {'IN': {category: n}, 'OUT': {...}}, 'zones': {name: {'IN': {...}, 'OUT': {...}}}}
+        """
+        with self.zones_lock:
+            return {
+                'counts': {count_type: dict(self.counts[count_type]) for count_type in ('IN', 'OUT')},
+                'zones': {
+                    name: {count_type: dict(counts[count_type]) for count_type in ('IN', 'OUT')}
+                    for name, counts in self.zone_counts.items()
+                }
+            }
+    
+    def restore_state(self, state):
+        """
+        Restore counts saved with get_state (e.g. after a restart)
+        
+        Counts of zones that are no longer configured are ignored.
+        
+        Args:
+            state: Dict as returned by get_state
+        """
+        with self.zones_lock:
+            self.counts = {
+                count_type: defaultdict(int, state['counts'].get(count_type, {}))
+                for count_type in ('IN', 'OUT')
+            }
+            self.total_counts = {count_type: sum(self.counts[count_type].values()) for count_type in ('IN', 'OUT')}
+            for name, counts in state.get('zones', {}).items():
+                if name in self.zone_counts:
+                    self.zone_counts[name] = {
+                        count_type: defaultdict(int, counts.get(count_type, {}))
+                        for count_type in ('IN', 'OUT')
+                    }
     
     def calculate_iou(self, box1, box2):
         """Calculate Intersection over Union for two bounding boxes"""
@@ -166,24 +283,9 @@ class VehicleCounter:
         
         return matched, unmatched_detections
     
-    def check_line_crossing(self, tracker, line_x):
-        """Check if tracker has crossed the counting line"""
-        if len(tracker.positions) < 2:
-            return False
-        
-        # Check last two positions
-        prev_pos = tracker.positions[-2]
-        curr_pos = tracker.positions[-1]
-        
-        # Check if line is crossed
-        crossed = (prev_pos[0] < line_x <= curr_pos[0]) or (prev_pos[0] > line_x >= curr_pos[0])
-        
-        return crossed
-    
     def update(self, detections, frame_shape):
         """Update tracker with new detections"""
-        height, width = frame_shape[:2]
-        line_x = int(width * self.line_position)
+        start = time.perf_counter()
         
         # Match detections to trackers
         matched, unmatched_detections = self.match_detections_to_trackers(detections)
@@ -208,129 +310,224 @@ class VehicleCounter:
             )
             self.trackers[track_id] = tracker
         
-        # Check for line crossings and count
-        trackers_to_remove = []
+        # Remove stale trackers
+        stale = [track_id for track_id, tracker in self.trackers.items() if tracker.is_stale(self.max_age)]
+        for track_id in stale:
+            del self.trackers[track_id]
         
-        for track_id, tracker in list(self.trackers.items()):
-            # Remove stale trackers
-            if tracker.is_stale(self.max_age):
-                trackers_to_remove.append(track_id)
+        # Check line crossings and zone transitions for all tracks at once
+        active = list(self.trackers.items())
+        with self.zones_lock:
+            if active:
+                line_starts, line_ends, polygon_points = self._geometry(frame_shape)
+                self._count_line_crossings(active, line_starts, line_ends)
+                self._count_zone_transitions(active, polygon_points)
+            else:
+                for name in self.zone_occupancy:
+                    self.zone_occupancy[name] = 0
+        
+        self.tracking_seconds.observe(time.perf_counter() - start)
+    
+    def _count_line_crossings(self, active, line_starts, line_ends):
+        """Count tracks whose last step crossed a line (vectorized over tracks x lines)"""
+        moving = [(track_id, tracker) for track_id, tracker in active if len(tracker.positions) >= 2]
+        if not moving or not self.lines:
+            return
+        
+        previous = np.array([tracker.positions[-2] for _, tracker in moving], dtype=np.float64)
+        current = np.array([tracker.positions[-1] for _, tracker in moving], dtype=np.float64)
+        crossings = segment_crossings(previous, current, line_starts, line_ends)
+        
+        for track_index, line_index in np.argwhere(crossings):
+            track_id, tracker = moving[track_index]
+            line = self.lines[line_index]
+            if line.name in tracker.counted_lines or len(tracker.positions) < 5:
                 continue
             
-            # Check if crossed line and not yet counted
-            if not tracker.counted and self.check_line_crossing(tracker, line_x):
-                direction = tracker.get_trajectory_direction()
-                
-                if direction in self.direction_mapping:
-                    count_type = self.direction_mapping[direction]
-                    tracker.direction = count_type
-                    tracker.counted = True
-                    tracker.crossed_line = True
-                    
-                    # Increment count
-                    self.counts[count_type][tracker.category] += 1
-                    self.total_counts[count_type] += 1
-                    
-                    print(f"✅ {tracker.category} crossed line {direction} → {count_type}")
+            # Jitter guard: the trajectory (not just the last step) must cross the line
+            positions = np.array(tracker.positions, dtype=np.float64)
+            displacement = normal_displacement(
+                positions[:5].mean(axis=0, keepdims=True), positions[-5:].mean(axis=0, keepdims=True),
+                line_starts[line_index:line_index + 1], line_ends[line_index:line_index + 1]
+            )[0, 0]
+            sign = crossings[track_index, line_index]
+            if abs(displacement) <= line.min_displacement or np.sign(displacement) != sign:
+                continue
+            
+            count_type = 'IN' if (sign > 0) != line.invert else 'OUT'
+            tracker.counted_lines.add(line.name)
+            tracker.counted = True
+            tracker.crossed_line = True
+            tracker.direction = count_type
+            
+            # Only the counting line feeds the overall counts; other lines are per-zone ('line' events)
+            event_type = 'line'
+            if line.name == self.counting_line:
+                event_type = 'crossing'
+                self.counts[count_type][tracker.category] += 1
+                self.total_counts[count_type] += 1
+            self._record(track_id, tracker, line.name, count_type, event_type, self._motion_direction(positions))
+    
+    def _count_zone_transitions(self, active, polygon_points):
+        """Count tracks entering (IN) or leaving (OUT) polygon zones"""
+        if not self.polygons:
+            return
         
-        # Remove stale trackers
-        for track_id in trackers_to_remove:
-            del self.trackers[track_id]
+        centres = np.array([tracker.positions[-1] for _, tracker in active], dtype=np.float64)
+        
+        for zone, polygon in zip(self.polygons, polygon_points):
+            inside = points_in_polygon(centres, polygon)
+            was_inside = np.array([zone.name in tracker.inside_zones for _, tracker in active])
+            self.zone_occupancy[zone.name] = int(np.count_nonzero(inside))
+            
+            for index in np.flatnonzero(inside != was_inside):
+                track_id, tracker = active[index]
+                if inside[index]:
+                    tracker.inside_zones.add(zone.name)
+                else:
+                    tracker.inside_zones.discard(zone.name)
+                
+                # A track first seen inside a zone did not enter it
+                if len(tracker.positions) < 2:
+                    continue
+                
+                count_type = 'IN' if inside[index] else 'OUT'
+                positions = np.array(tracker.positions, dtype=np.float64)
+                self._record(track_id, tracker, zone.name, count_type, 'zone', self._motion_direction(positions))
+    
+    def _motion_direction(self, positions):
+        """Dominant screen direction of a trajectory ('LEFT', 'RIGHT', 'UP' or 'DOWN')"""
+        dx, dy = positions[-1] - positions[0]
+        if abs(dx) >= abs(dy):
+            return 'RIGHT' if dx > 0 else 'LEFT'
+        return 'DOWN' if dy > 0 else 'UP'
+    
+    def _record(self, track_id, tracker, zone_name, count_type, event_type, direction):
+        """Update per-zone counts, metrics and listeners for one counted event"""
+        self.zone_counts[zone_name][count_type][tracker.category] += 1
+        CROSSINGS_TOTAL.labels(source=self.camera_id, zone=zone_name, direction=count_type,
+                               category=tracker.category).inc()
+        
+        verb = 'crossed' if event_type != 'zone' else ('entered' if count_type == 'IN' else 'left')
+        log_event(logger, logging.INFO, f'counter.{event_type}',
+                  f"✅ {tracker.category} {verb} {zone_name} {direction} → {count_type}",
+                  camera=self.camera_id, zone=zone_name, track_id=track_id, category=tracker.category,
+                  count_type=count_type)
+        
+        self._notify({
+            'type': event_type,
+            'zone': zone_name,
+            'track_id': track_id,
+            'category': tracker.category,
+            'direction': direction,
+            'count_type': count_type,
+            'timestamp': datetime.now()
+        })
     
     def draw_on_frame(self, frame):
         """Draw tracking information on frame"""
+        start = time.perf_counter()
         height, width = frame.shape[:2]
-        line_x = int(width * self.line_position)
-        
-        # Draw counting line
-        cv2.line(frame, (line_x, 0), (line_x, height), (0, 255, 255), 3)
-        
-        # Draw line labels
-        cv2.putText(frame, "OUT ←", (line_x - 150, 40), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-        cv2.putText(frame, "→ IN", (line_x + 50, 40), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
         
-        # Draw trackers
-        for track_id, tracker in self.trackers.items():
-            bbox = tracker.bbox
-            x1, y1, x2, y2 = map(int, bbox)
-            
-            # Color based on counting status
-            if tracker.counted:
-                color = (0, 255, 0) if tracker.direction == 'IN' else (0, 0, 255)
-            else:
-                color = (255, 255, 0)  # Yellow for unco unted
+        if self.default_line:
+            line_x = int(width * self.line_position)
             
-            # Draw bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            # Draw counting line
+            cv2.line(frame, (line_x, 0), (line_x, height), (0, 255, 255), 3)
             
-            # Draw track ID and category
-            label = f"ID:{track_id} {tracker.category}"
-            if tracker.counted:
-                label += f" [{tracker.direction}]"
-            
-            cv2.putText(frame, label, (x1, y1 - 10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            
-            # Draw trajectory
-            if len(tracker.positions) > 1:
-                points = np.array(tracker.positions, dtype=np.int32)
-                cv2.polylines(frame, [points], False, color, 2)
+            # Draw line labels
+            self.overlay.put_text(frame, "OUT ←", (line_x - 150, 40), 1, (0, 0, 255))
+            self.overlay.put_text(frame, "→ IN", (line_x + 50, 40), 1, (0, 255, 0))
+        else:
+            with self.zones_lock:
+                self.draw_zones(frame)
+        
+        # Draw trackers (cached per track, rebuilt only when a track changed)
+        self.overlay.draw_tracks(frame, self.trackers, self._track_color, self._track_label)
         
         # Draw count display
         self.draw_count_display(frame)
         
+        self.drawing_seconds.observe(time.perf_counter() - start)
         return frame
     
+    def _track_color(self, tracker):
+        """Color based on counting status"""
+        if tracker.counted:
+            return (0, 255, 0) if tracker.direction == 'IN' else (0, 0, 255)
+        return (255, 255, 0)  # Yellow for uncounted
+    
+    def _track_label(self, track_id, tracker):
+        """Track ID and category"""
+        label = f"ID:{track_id} {tracker.category}"
+        if tracker.counted:
+            label += f" [{tracker.direction}]"
+        return label
+    
+    def draw_zones(self, frame):
+        """Draw configured lines and polygon zones with their counts"""
+        line_starts, line_ends, polygon_points = self._geometry(frame.shape)
+        
+        for line, start, end in zip(self.lines, line_starts.astype(int), line_ends.astype(int)):
+            cv2.line(frame, tuple(start), tuple(end), (0, 255, 255), 3)
+            counts = self.zone_counts[line.name]
+            label = f"{line.name} IN:{sum(counts['IN'].values())} OUT:{sum(counts['OUT'].values())}"
+            self.overlay.put_text(frame, label, (int(start[0]) + 5, int(start[1]) + 25), 0.6, (0, 255, 255))
+        
+        for zone, polygon in zip(self.polygons, polygon_points):
+            points = polygon.astype(np.int32)
+            cv2.polylines(frame, [points], True, (255, 0, 255), 2)
+            label = f"{zone.name}: {self.zone_occupancy.get(zone.name, 0)}"
+            self.overlay.put_text(frame, label, (int(points[0][0]) + 5, int(points[0][1]) + 25),
+                                  0.6, (255, 0, 255))
+    
     def draw_count_display(self, frame):
-        """Draw count statistics on frame"""
+        """Draw count statistics on frame (only the two panels are blended)"""
         height, width = frame.shape[:2]
-        
-        # Create semi-transparent overlay
-        overlay = frame.copy()
+        categories = ['Car', '2-Wheeler', 'Bus', 'Truck']
         
         # IN counts (top-right)
-        in_x, in_y = width - 250, 80
-        cv2.rectangle(overlay, (in_x, in_y), (in_x + 230, in_y + 150), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-        
-        cv2.putText(frame, "IN →", (in_x + 10, in_y + 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        
-        y_offset = in_y + 60
-        for category in ['Car', '2-Wheeler', 'Bus', 'Truck']:
-            count = self.counts['IN'][category]
-            cv2.putText(frame, f"{category}: {count}", (in_x + 10, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            y_offset += 25
+        self.overlay.draw_panel(frame, width - 250, 80, "IN →", (0, 255, 0),
+                                [f"{category}: {self.counts['IN'][category]}" for category in categories])
         
         # OUT counts (top-left)
-        out_x, out_y = 20, 80
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (out_x, out_y), (out_x + 230, out_y + 150), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
-        
-        cv2.putText(frame, "← OUT", (out_x + 10, out_y + 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-        
-        y_offset = out_y + 60
-        for category in ['Car', '2-Wheeler', 'Bus', 'Truck']:
-            count = self.counts['OUT'][category]
-            cv2.putText(frame, f"{category}: {count}", (out_x + 10, y_offset),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            y_offset += 25
+        self.overlay.draw_panel(frame, 20, 80, "← OUT", (0, 0, 255),
+                                [f"{category}: {self.counts['OUT'][category]}" for category in categories])
     
     def get_counts(self):
-        """Get current counts"""
+        """Get current counts (overall counts come from the counting line, per-line/zone counts are under 'zones')"""
         return {
             'in_counts': dict(self.counts['IN']),
             'out_counts': dict(self.counts['OUT']),
             'total_in': self.total_counts['IN'],
             'total_out': self.total_counts['OUT'],
-            'net_count': self.total_counts['IN'] - self.total_counts['OUT']
+            'net_count': self.total_counts['IN'] - self.total_counts['OUT'],
+            'counting_line': self.counting_line,
+            'zones': self.get_zone_counts()
         }
     
+    def get_zone_counts(self):
+        """
+        Get counts per line / polygon zone
+        
+        Returns:
+            dict: Zone name -> type, IN/OUT counts by category, totals (and occupancy for polygons)
+        """
+        zones = {}
+        with self.zones_lock:
+            for zone in self.lines + self.polygons:
+                counts = self.zone_counts[zone.name]
+                zones[zone.name] = {
+                    'type': zone.kind,
+                    'in_counts': dict(counts['IN']),
+                    'out_counts': dict(counts['OUT']),
+                    'total_in': sum(counts['IN'].values()),
+                    'total_out': sum(counts['OUT'].values())
+                }
+                if zone.kind == 'polygon':
+                    zones[zone.name]['occupancy'] = self.zone_occupancy.get(zone.name, 0)
+        return zones
+    
     def get_parking_availability(self, total_capacity):
         """Calculate parking availability based on car counts"""
         cars_in = self.counts['IN']['Car']
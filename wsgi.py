@@ -0,0 +1,117 @@
+"""
+WSGI Entry Point
+Production serving: one pipeline service process owns cameras, counters and the model; multi-worker gunicorn serves HTTP
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from app import app
+from config_manager import ConfigCache
+from database import db
+from pipeline_service import DEFAULT_ADDRESS as PIPELINE_ADDRESS, wait_until_ready
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = object
+
+# For external servers (e.g. `gunicorn -k gthread --threads 32 wsgi:application`):
+# start pipeline_service.py separately and set PIPELINE_SERVICE in system_config
+application = app
+
+class ParkingServer(BaseApplication):
+    """Gunicorn application serving the Flask app with threaded workers"""
+
+    def __init__(self, options):
+        """
+        Initialize server
+
+        Args:
+            options: Gunicorn settings (bind, workers, threads, ...)
+        """
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return application
+
+def post_fork(server, worker):
+    """Gunicorn hook: give each HTTP worker its own database connections and logging"""
+    from app import get_config_cache
+    from structured_logging import setup_logging_from_config
+
+    with app.app_context():
+        db.engine.dispose()  # never share the master's SQLite connections across processes
+    setup_logging_from_config(get_config_cache())
+
+def start_pipeline_service(address):
+    """
+    Start pipeline_service.py and wait until it serves requests
+
+    Returns:
+        subprocess.Popen: The service process
+    """
+    service = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             'pipeline_service.py'), '--address', address])
+    if not wait_until_ready(address):
+        service.terminate()
+        raise RuntimeError(f"Pipeline service did not start on {address}")
+    return service
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the parking system with a multi-worker server')
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 8),
+                        help='HTTP worker processes')
+    parser.add_argument('--threads', type=int, default=32,
+                        help='Threads per worker (each MJPEG or live-update viewer holds one)')
+    parser.add_argument('--pipeline-address', default=None,
+                        help=f"Pipeline service address (default: PIPELINE_SERVICE or {PIPELINE_ADDRESS})")
+    parser.add_argument('--external-pipeline', action='store_true',
+                        help='Use an already running pipeline service instead of starting one')
+    args = parser.parse_args()
+
+    if BaseApplication is object:
+        print("❌ gunicorn is not installed (pip install gunicorn)")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("VEHICLE PARKING MANAGEMENT SYSTEM - PRODUCTION SERVER")
+    print("=" * 70)
+
+    # Read settings without starting the hot-reload thread (threads do not survive fork)
+    settings = ConfigCache(app)
+    settings.load()
+    address = args.pipeline_address or settings.get('PIPELINE_SERVICE', '') or PIPELINE_ADDRESS
+    app.config['PIPELINE_SERVICE'] = address
+
+    pipeline_service = None
+    if not args.external_pipeline:
+        print(f"\n🚀 Starting pipeline service on {address}...")
+        pipeline_service = start_pipeline_service(address)
+
+    print(f"🌐 Serving on http://{args.bind} ({args.workers} workers × {args.threads} threads)")
+    try:
+        ParkingServer({
+            'bind': args.bind,
+            'workers': args.workers,
+            'worker_class': 'gthread',
+            'threads': args.threads,
+            'timeout': 120,
+            'graceful_timeout': 10,
+            'post_fork': post_fork,
+        }).run()
+    finally:
+        if pipeline_service is not None:
+            pipeline_service.terminate()
+            try:
+                pipeline_service.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                pipeline_service.kill()